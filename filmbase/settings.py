@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -61,7 +62,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -69,6 +69,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Скомпилированные шаблоны держатся в памяти процесса
+            # (при DEBUG кэш сбрасывается автоперезагрузкой).
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -87,6 +95,38 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# {% cache %} uses the template_fragments alias (film and person cards).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# Сессии хранятся в базе. С SESSION_CACHE_ALIAS они читаются из этого
+# кэша, а база — только при промахе и записи. Только общий для всех
+# процессов кэш (Redis, Memcached): в locmem другие процессы не видят
+# выхода из системы и отдают сессию до её истечения (SESSION_COOKIE_AGE).
+SESSION_CACHE_ALIAS = os.environ.get('SESSION_CACHE_ALIAS') or 'default'
+if os.environ.get('SESSION_CACHE_ALIAS'):
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# Пользователь для request.user может браться из кэша (signup/backends.py).
+# Только общий для всех процессов кэш (Redis, Memcached): в locmem другие
+# процессы не видят сброса и держат отключённого пользователя до USER_TIMEOUT.
+# None — пользователь читается из базы на каждом запросе.
+AUTHENTICATION_BACKENDS = ['signup.backends.CachedModelBackend']
+AUTH_USER_CACHE = os.environ.get('AUTH_USER_CACHE') or None
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -126,6 +166,17 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Хэшированные имена и .gz/.br копии создаются при collectstatic
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'films.staticfiles.PrecompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -138,3 +189,35 @@ MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 SECURE_REFERRER_POLICY = "no-referrer-when-downgrade"
+
+# Импорт каталога (get_films / import_films)
+POISKKINO_API_URL = os.environ.get('POISKKINO_API_URL',
+                                   'https://api.poiskkino.dev')
+FILMS_JSON_PATH = 'films/data/films.json'
+
+# Лимиты поиска и автодополнения (films.ratelimit): группа ->
+# (токенов в секунду, размер ведра, одновременных запросов в процессе)
+FILMS_RATE_LIMITS = {
+    'search': (1.0, 20, 4),
+    'autocomplete': (5.0, 30, 4),
+}
+FILMS_RATE_LIMIT_CACHE = 'default'
+
+# Тесты: снимок заполненного каталога для SnapshotTestCase (films.testing)
+TEST_RUNNER = 'films.testing.SnapshotRunner'
+TEST_SNAPSHOT_DIR = BASE_DIR / '.test_snapshots'
+
+# Сводки приложения (доля 304 у условных GET и т.п.) — в консоль
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'films': {
+            'handlers': ['console'],
+            'level': os.environ.get('FILMS_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
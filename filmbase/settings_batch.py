@@ -0,0 +1,29 @@
+"""
+Облегчённые настройки для пакетных команд (import_vtt, import_films,
+shift_subtitles, run_worker ...):
+
+    DJANGO_SETTINGS_MODULE=filmbase.settings_batch \\
+        python manage.py import_vtt ...
+
+Без админки, автокомплита, bootstrap и статики команда стартует быстрее:
+не импортируются формы, виджеты и admin.py приложений. Рассчитаны на
+команды приложения films; веб-сервер, migrate, collectstatic,
+vendor_assets и benchmark запускаются с обычными настройками.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS
+
+WEB_ONLY_APPS = {
+    'dal',
+    'dal_select2',
+    'django_bootstrap5',
+    'django.contrib.admin',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+}
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in WEB_ONLY_APPS]
+
+# Системные проверки импортируют urls.py, а с ним представления и формы
+# (dal). Команды films (InstrumentedCommand) их пропускают
+SKIP_COMMAND_CHECKS = True
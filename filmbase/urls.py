@@ -16,14 +16,18 @@ Including another URLconf
 """
 from django.conf import settings
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf.urls.static import static
+from films.staticfiles import serve as serve_static
 
 urlpatterns = [
     path("", include("films.urls")),
     path("signup/", include("signup.urls")),
     path('auth/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
+    # Собранная статика (в DEBUG её перехватывает runserver)
+    re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'),
+            serve_static),
 ]
 
 
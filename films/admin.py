@@ -1,39 +1,216 @@
-from django.contrib import admin
-from .models import Country, Film, Person, Genre, SubtitleSet, SubtitleLine
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.forms import modelformset_factory
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
+from .models import (Country, Film, Person, Genre, SubtitleSet, SubtitleLine,
+                     Task)
+from . import deletion
+from .subtitles import parse_anchors
 
 
-# 1. Inline для строк субтитров
-class SubtitleLineInline(admin.TabularInline):
-    model = SubtitleLine
-    # Поля, доступные для редактирования. Сортировка по времени
-    fields = ('start_time', 'end_time', 'text', 'name', 'style_classes')
-    ordering = ('start_time',)
-    extra = 0 # Не добавлять пустые формы по умолчанию
-    can_delete = True
+class BulkDeleteMixin:
+    """
+    Удаление через deletion.bulk_delete(): страница подтверждения показывает
+    число строк по таблицам, а не загружает все зависимые объекты.
+    """
 
-# 2. Inline для набора субтитров (чтобы видеть их прямо в фильме)
-class SubtitleSetInline(admin.StackedInline):
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        model_count, perms_needed = {}, set()
+        for model, count in deletion.preview(self.model,
+                                             [obj.pk for obj in objs]):
+            if not count:
+                continue
+            model_count[deletion.label(model)] = count
+            opts = model._meta
+            if not opts.auto_created and not request.user.has_perm(
+                    f"{opts.app_label}.delete_{opts.model_name}"):
+                perms_needed.add(opts.verbose_name)
+        return [str(obj) for obj in objs], model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        deletion.bulk_delete(self.model, [obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        deletion.bulk_delete(self.model,
+                             list(queryset.values_list('pk', flat=True)))
+
+
+# 1. Inline для набора субтитров (чтобы видеть их прямо в фильме).
+# Строки субтитров здесь не выводятся: их может быть тысячи,
+# для них есть постраничный редактор в SubtitleSetAdmin.
+class SubtitleSetInline(admin.TabularInline):
     model = SubtitleSet
-    inlines = [SubtitleLineInline] # Здесь вложены строки
     fields = ('language',)
     extra = 0
-    # Поле 'language' должно быть уникальным,
-    # а SubtitleLineInline позволит редактировать сами строки
+    show_change_link = True
+
 
 @admin.register(Film)
-class FilmAdmin(admin.ModelAdmin):
+class FilmAdmin(BulkDeleteMixin, admin.ModelAdmin):
     list_display = ('name', 'year', 'director', 'kinopoisk_id')
-    inlines = [SubtitleSetInline] # Добавляем возможность видеть и редактировать наборы субтитров
+    list_select_related = ('director',)
+    search_fields = ('name', 'origin_name')
+    # Вместо <select> со всеми персонами и странами — поиск через AJAX
+    autocomplete_fields = ('director', 'people', 'country')
+    inlines = [SubtitleSetInline]
+
+
+class RetimeActionForm(ActionForm):
+    offset = forms.FloatField(label='Сдвиг (с)', required=False)
+    factor = forms.FloatField(label='Коэффициент', required=False)
+    anchors = forms.CharField(label='Опорные точки', required=False,
+                              help_text='старое=новое, через запятую')
 
-# Отдельно регистрируем SubtitleSet (если нужно)
+
+# 2. Набор субтитров с постраничным редактором строк
 @admin.register(SubtitleSet)
-class SubtitleSetAdmin(admin.ModelAdmin):
-    list_display = ('film', 'language')
+class SubtitleSetAdmin(BulkDeleteMixin, admin.ModelAdmin):
+    action_form = RetimeActionForm
+    actions = ('shift_lines', 'stretch_lines', 'resync_lines')
+    list_display = ('film', 'language', 'cue_count', 'duration')
     list_filter = ('language',)
+    list_select_related = ('film',)
     search_fields = ('film__name',)
-    inlines = [SubtitleLineInline] # Добавляем возможность редактировать строки
+    autocomplete_fields = ('film',)
+    readonly_fields = ('cue_editor_link', 'cue_count', 'duration',
+                       'content_hash')
+    cues_per_page = 100
+    cue_fields = ('start_time', 'end_time', 'text', 'name', 'style_classes')
+
+    def retime(self, request, queryset, field, operation):
+        value = request.POST.get(field)
+        try:
+            value = parse_anchors(value) if field == 'anchors' \
+                else float(value)
+            count = sum(operation(subtitle_set, value)
+                        for subtitle_set in queryset)
+        except (TypeError, ValueError) as e:
+            self.message_user(request, f'Ошибка: {e}', messages.ERROR)
+            return
+        self.message_user(request, f'Изменено строк: {count}',
+                          messages.SUCCESS)
+
+    @admin.action(description='Сдвинуть строки на «Сдвиг»')
+    def shift_lines(self, request, queryset):
+        self.retime(request, queryset, 'offset', SubtitleSet.shift)
+
+    @admin.action(description='Растянуть строки на «Коэффициент»')
+    def stretch_lines(self, request, queryset):
+        self.retime(request, queryset, 'factor', SubtitleSet.stretch)
+
+    @admin.action(description='Пересинхронизировать по опорным точкам')
+    def resync_lines(self, request, queryset):
+        self.retime(request, queryset, 'anchors', SubtitleSet.resync)
+
+    def get_urls(self):
+        urls = [
+            path('<path:object_id>/cues/',
+                 self.admin_site.admin_view(self.cue_editor_view),
+                 name='films_subtitleset_cues'),
+        ]
+        return urls + super().get_urls()
+
+    @admin.display(description='Строки субтитров')
+    def cue_editor_link(self, obj):
+        if not obj.pk:
+            return '—'
+        url = reverse('admin:films_subtitleset_cues', args=[obj.pk])
+        return format_html('<a href="{}">Редактировать строки</a>', url)
+
+    def cue_editor_view(self, request, object_id):
+        """
+        Постраничный редактор строк: на странице cues_per_page форм,
+        при сохранении записываются только изменённые строки.
+        """
+        subtitle_set = get_object_or_404(
+            SubtitleSet.objects.select_related('film'), pk=object_id)
+        if not self.has_change_permission(request, subtitle_set):
+            raise PermissionDenied
+
+        lines = subtitle_set.lines.order_by('start_time', 'end_time', 'pk')
+        paginator = Paginator(lines.values_list('pk', flat=True),
+                              self.cues_per_page)
+        page = paginator.get_page(request.GET.get('p'))
+        queryset = SubtitleLine.objects.filter(pk__in=list(page)) \
+            .order_by('start_time', 'end_time', 'pk')
+
+        CueFormSet = modelformset_factory(
+            SubtitleLine, fields=self.cue_fields, extra=0, can_delete=True)
+        formset = CueFormSet(request.POST or None, queryset=queryset)
+
+        if request.method == 'POST' and formset.is_valid():
+            changed, deleted = self.save_cues(formset, subtitle_set)
+            self.message_user(
+                request, f'Изменено строк: {changed}, удалено: {deleted}',
+                messages.SUCCESS)
+            return redirect(f'{request.path}?p={page.number}')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.opts,
+            'title': f'Строки субтитров: {subtitle_set}',
+            'subtitle_set': subtitle_set,
+            'formset': formset,
+            'page': page,
+        }
+        return TemplateResponse(
+            request, 'admin/films/subtitleset/cue_editor.html', context)
+
+    @staticmethod
+    def save_cues(formset, subtitle_set):
+        """Пакетное сохранение: один UPDATE на пачку и один DELETE."""
+        formset.save(commit=False)
+        now = timezone.now()
+        fields = {'updated_at'}
+        changed = []
+        for obj, changed_fields in formset.changed_objects:
+            obj.updated_at = now
+            fields.update(changed_fields)
+            changed.append(obj)
+        if changed:
+            SubtitleLine.objects.bulk_update(changed, sorted(fields),
+                                             batch_size=500)
+        deleted = [obj.pk for obj in formset.deleted_objects]
+        if deleted:
+            SubtitleLine.objects.filter(pk__in=deleted).delete()
+        if changed or deleted:
+            subtitle_set.touch(now)
+        return len(changed), len(deleted)
+
 
 # 3. Регистрация существующих моделей
-admin.site.register(Person)
-admin.site.register(Country)
+@admin.register(Person)
+class PersonAdmin(BulkDeleteMixin, admin.ModelAdmin):
+    list_display = ('name', 'origin_name', 'birthday')
+    search_fields = ('name', 'origin_name')
+
+
+@admin.register(Country)
+class CountryAdmin(BulkDeleteMixin, admin.ModelAdmin):
+    search_fields = ('name',)
+
+
 admin.site.register(Genre)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'progress', 'total', 'attempts',
+                    'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    actions = ('retry',)
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        count = queryset.exclude(status=Task.RUNNING).update(
+            status=Task.PENDING, attempts=0, run_after=timezone.now())
+        self.message_user(request, f'Поставлено в очередь: {count}',
+                          messages.SUCCESS)
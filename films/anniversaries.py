@@ -0,0 +1,102 @@
+"""
+«Родились в этот день» и юбилеи фильмов.
+
+Персоны дня выбираются по индексу Person.birthday_key (месяц * 100 +
+день), а не перебором таблицы с извлечением месяца и дня из даты;
+возраст считается в том же запросе. Ключ заполняет Person.save(), при
+bulk_create его задают через month_day().
+
+Подборка дня кэшируется до полуночи по TIME_ZONE. Ключ кэша содержит
+дату, поэтому с наступлением нового дня строится новая подборка, даже
+если старая запись ещё не истекла.
+
+У фильмов есть только год выпуска, так что «юбилей» — круглая
+годовщина выхода в текущем году.
+"""
+import calendar
+import datetime
+import math
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+from .models import Film, Person, month_day
+
+ANNIVERSARIES = (10, 20, 25, 30, 40, 50, 60, 70, 75, 80, 90, 100)
+PEOPLE_LIMIT = 48
+FILMS_LIMIT = 24
+
+
+def day_keys(day):
+    """Ключи дня; родившиеся 29 февраля в невисокосный год — 28-го."""
+    keys = [month_day(day)]
+    if (day.month, day.day) == (2, 28) and not calendar.isleap(day.year):
+        keys.append(229)
+    return keys
+
+
+def born_on(day):
+    """
+    Родившиеся в этот день; turning — сколько лет им исполняется (не age:
+    аннотация с этим именем закрыла бы метод Person.age()).
+    """
+    return Person.objects.filter(birthday_key__in=day_keys(day)) \
+        .annotate(turning=Value(day.year) - ExtractYear('birthday')) \
+        .order_by('name', 'id')
+
+
+def film_anniversaries(day):
+    """Фильмы с круглой годовщиной в году day (anniversary — сколько лет)."""
+    return Film.objects.filter(
+        year__in=[day.year - years for years in ANNIVERSARIES]) \
+        .annotate(anniversary=Value(day.year) - F('year')) \
+        .order_by('year', 'name', 'id')
+
+
+def cache_key(day):
+    return f"anniversaries:{day.isoformat()}"
+
+
+def seconds_to_midnight(now):
+    """Секунд до следующей полуночи по местному времени (TIME_ZONE)."""
+    midnight = datetime.datetime.combine(
+        now.date() + datetime.timedelta(days=1), datetime.time.min,
+        tzinfo=now.tzinfo)
+    # Через timestamp(): разность datetime с одним tzinfo не видит
+    # перехода на летнее время
+    return max(1, math.ceil(midnight.timestamp() - now.timestamp()))
+
+
+def today(now=None):
+    """
+    Подборка на сегодня: {'day', 'people', 'films'} — списки объектов с
+    turning и anniversary. Строится одним запросом на список раз в сутки.
+    """
+    now = timezone.localtime(now)
+    day = now.date()
+    key = cache_key(day)
+    selection = cache.get(key)
+    if selection is None:
+        selection = {
+            'day': day,
+            'people': list(born_on(day)[:PEOPLE_LIMIT]),
+            'films': list(film_anniversaries(day)[:FILMS_LIMIT]),
+        }
+        cache.set(key, selection, seconds_to_midnight(now))
+    return selection
+
+
+def _delete():
+    cache.delete(cache_key(timezone.localdate()))
+
+
+def invalidate():
+    """
+    Сбрасывает подборку сразу (для запросов в этой же транзакции) и ещё
+    раз после фиксации: собранная до фиксации осталась бы устаревшей.
+    """
+    _delete()
+    transaction.on_commit(_delete)
@@ -0,0 +1,136 @@
+"""
+Пакетная выдача фильмов в JSON для клиентов (мобильное приложение).
+
+Фильмы запрашиваются списком id с выбором полей. Число запросов к базе
+не зависит от размера пакета: один запрос на фильмы (страна и режиссер —
+через JOIN) и по одному на жанры и актёров, если эти поля нужны.
+"""
+import hashlib
+
+from django.core.files.storage import default_storage
+
+from .models import Film
+
+MAX_IDS = 200
+
+# Поле ответа -> поля values() фильма
+SCALAR_FIELDS = {
+    'name': ['name'],
+    'origin_name': ['origin_name'],
+    'slogan': ['slogan'],
+    'year': ['year'],
+    'length': ['length'],
+    'description': ['description'],
+    'trailer_url': ['trailer_url'],
+    'cover': ['cover'],
+    'kinopoisk_id': ['kinopoisk_id'],
+    'updated_at': [],
+    'country': ['country_id', 'country__name', 'country__updated_at'],
+    'director': ['director_id', 'director__name', 'director__updated_at'],
+}
+# Поле ответа -> (промежуточная таблица, связанное поле)
+RELATED_FIELDS = {
+    'genres': (Film.genres.through, 'genre'),
+    'people': (Film.people.through, 'person'),
+}
+FIELDS = list(SCALAR_FIELDS) + list(RELATED_FIELDS)
+DEFAULT_FIELDS = ['name', 'year', 'cover', 'country', 'genres']
+
+
+class APIError(ValueError):
+    pass
+
+
+def parse_ids(value):
+    try:
+        ids = list(dict.fromkeys(int(v) for v in value.split(",") if v))
+    except ValueError:
+        raise APIError("ids: ожидается список целых чисел через запятую")
+    if not ids:
+        raise APIError("ids: не указаны id фильмов")
+    if len(ids) > MAX_IDS:
+        raise APIError(f"ids: не больше {MAX_IDS} id за запрос")
+    return ids
+
+
+def parse_fields(value):
+    if not value:
+        return DEFAULT_FIELDS
+    fields = list(dict.fromkeys(f.strip() for f in value.split(",")
+                                if f.strip()))
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise APIError(f"fields: неизвестные поля {', '.join(unknown)}; "
+                       f"доступны {', '.join(FIELDS)}")
+    return fields
+
+
+class FilmBatch:
+    """
+    Данные пакета и сильный ETag. ETag считается из updated_at всех
+    использованных строк (фильмов и связанных жанров, персон, стран) и
+    списка полей, поэтому меняется при любой правке отданных данных.
+    Связи M2M сдвигают Film.updated_at (см. signals.touch_film).
+    """
+
+    def __init__(self, ids, fields):
+        self.ids = ids
+        self.fields = fields
+        columns = ['id', 'updated_at']
+        for field in fields:
+            columns += SCALAR_FIELDS.get(field, [])
+        self.rows = {row['id']: row for row in
+                     Film.objects.filter(id__in=ids).values(*columns)}
+        self.related = {}
+        for field in fields:
+            if field in RELATED_FIELDS:
+                through, name = RELATED_FIELDS[field]
+                links = {}
+                for film_id, pk, title, updated_at in through.objects \
+                        .filter(film_id__in=self.rows) \
+                        .order_by(f'{name}__name', name) \
+                        .values_list('film_id', name, f'{name}__name',
+                                     f'{name}__updated_at'):
+                    links.setdefault(film_id, []).append(
+                        (pk, title, updated_at))
+                self.related[field] = links
+
+    @property
+    def etag(self):
+        digest = hashlib.sha256(",".join(self.fields).encode())
+        for film_id in self.ids:
+            row = self.rows.get(film_id)
+            if row is None:
+                digest.update(f"{film_id}:-;".encode())
+                continue
+            stamps = [row['updated_at'], row.get('country__updated_at'),
+                      row.get('director__updated_at')]
+            for links in self.related.values():
+                stamps += [updated_at for _, _, updated_at
+                           in links.get(film_id, ())]
+            digest.update(f"{film_id}:{stamps};".encode())
+        return digest.hexdigest()
+
+    def film(self, row):
+        data = {'id': row['id']}
+        for field in self.fields:
+            if field == 'cover':
+                data[field] = default_storage.url(row['cover']) \
+                    if row['cover'] else None
+            elif field in ('country', 'director'):
+                data[field] = {'id': row[f'{field}_id'],
+                               'name': row[f'{field}__name']}
+            elif field in RELATED_FIELDS:
+                data[field] = [{'id': pk, 'name': name} for pk, name, _
+                               in self.related[field].get(row['id'], ())]
+            else:
+                data[field] = row[field]
+        return data
+
+    def as_dict(self):
+        return {
+            'films': [self.film(self.rows[film_id]) for film_id in self.ids
+                      if film_id in self.rows],
+            'missing': [film_id for film_id in self.ids
+                        if film_id not in self.rows],
+        }
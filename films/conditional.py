@@ -0,0 +1,149 @@
+"""
+Условные GET для страниц объектов (If-None-Match / If-Modified-Since).
+
+Валидатор страницы — наибольший updated_at среди объекта и связанных строк,
+которые она показывает, — читается одним агрегатным запросом до основных
+запросов и рендера шаблона. Если клиент прислал совпадающий ETag, ответ —
+304 без тела.
+
+Страницы зависят от пользователя (навбар, кнопки редактирования, CSRF),
+поэтому ETag включает его, а для вошедшего — ключ сессии и CSRF-куку:
+после повторного входа токен в форме выхода другой, и старую страницу
+отдавать нельзя. Last-Modified отдаётся только анонимам.
+"""
+import datetime
+import functools
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Country, Film, Genre, Person
+
+logger = logging.getLogger(__name__)
+
+# Как часто писать в лог сводку попаданий (число запросов на страницу)
+REPORT_EVERY = 100
+
+
+class HitStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, name, hit):
+        with self.lock:
+            hits, total = self.counts.get(name, (0, 0))
+            hits, total = hits + hit, total + 1
+            self.counts[name] = (hits, total)
+        logger.debug("%s: %s", name, "304" if hit else "200")
+        if total % REPORT_EVERY == 0:
+            logger.info("%s: %d of %d conditional requests answered with "
+                        "304 (%.1f%%)", name, hits, total,
+                        hits / total * 100)
+
+
+stats = HitStats()
+
+
+def latest(field, *fields):
+    """Наибольшая дата из полей; NULL (нет связанных строк) пропускается."""
+    return Greatest(Max(field), *[Coalesce(Max(f), Max(field))
+                                  for f in fields])
+
+
+def film_stamp(id):
+    return Film.objects.filter(id=id).aggregate(
+        stamp=latest('updated_at', 'recommendations_updated_at',
+                     'country__updated_at', 'director__updated_at',
+                     'genres__updated_at', 'people__updated_at',
+                     'recommendations__recommended__updated_at'))
+
+
+def person_stamp(id):
+    values = Person.objects.filter(id=id).aggregate(
+        stamp=latest('updated_at', 'filmography__updated_at'))
+    if values['stamp'] is not None:
+        # Страница показывает возраст: она меняется и с датой
+        day = timezone.localdate()
+        midnight = timezone.make_aware(
+            datetime.datetime.combine(day, datetime.time.min))
+        values.update(stamp=max(values['stamp'], midnight), day=day)
+    return values
+
+
+def country_stamp(id):
+    # Карточки фильмов показывают языки субтитров. Числа фильмов и наборов:
+    # удаление не самой новой строки не меняет максимум
+    return Country.objects.filter(id=id).aggregate(
+        stamp=latest('updated_at', 'film__updated_at',
+                     'film__subtitle_sets__updated_at'),
+        count=Count('film', distinct=True),
+        subtitle_sets=Count('film__subtitle_sets', distinct=True))
+
+
+def genre_stamp(id):
+    return Genre.objects.filter(id=id).aggregate(
+        stamp=latest('updated_at', 'film__updated_at',
+                     'film__subtitle_sets__updated_at'),
+        count=Count('film', distinct=True),
+        subtitle_sets=Count('film__subtitle_sets', distinct=True))
+
+
+def user_key(request):
+    user = request.user
+    if not user.is_authenticated:
+        return "anonymous"
+    # Ключ сессии и CSRF-кука меняются при каждом входе
+    return (f"{user.pk}:{user.is_staff:d}{user.is_superuser:d}:"
+            f"{request.session.session_key}:"
+            f"{request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')}")
+
+
+def conditional_page(stamp_func):
+    """
+    Декоратор представления: stamp_func(id) -> {'stamp': datetime, ...}.
+    Страницы с непоказанными сообщениями (messages) всегда рендерятся.
+    """
+    def decorator(view):
+        name = view.__name__
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or \
+                    len(messages.get_messages(request)):
+                return view(request, *args, **kwargs)
+            values = stamp_func(*args, **kwargs)
+            if values['stamp'] is None:
+                # Объекта нет — пусть представление ответит 404
+                return view(request, *args, **kwargs)
+            stamp = values['stamp']
+            digest = hashlib.sha256(
+                f"{sorted(values.items())}|{user_key(request)}".encode()
+            ).hexdigest()[:32]
+            etag = quote_etag(digest)
+            anonymous = not request.user.is_authenticated
+            last_modified = int(stamp.timestamp()) if anonymous else None
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            stats.add(name, response is not None)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+                # Кэш браузера всегда перепроверяет страницу
+                patch_cache_control(response, no_cache=True,
+                                    private=not anonymous)
+            return response
+        return wrapper
+    return decorator
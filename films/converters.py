@@ -0,0 +1,20 @@
+class LanguageCodeConverter:
+    """Код языка без точек ("ru", "pt-BR"), чтобы отделить его от расширения."""
+    regex = '[A-Za-z0-9_-]+'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+class SubtitleFormatConverter:
+    """Расширение файла субтитров: vtt, srt, json, cues.json."""
+    regex = '[a-z0-9.]+'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
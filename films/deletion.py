@@ -0,0 +1,114 @@
+"""
+Удаление фильмов, персон, стран и наборов субтитров без Collector.
+
+Обычный Model.delete() загружает все зависимые строки (фильмы, наборы и
+строки субтитров) в память и удаляет их пачками по id. Здесь каждая
+таблица очищается одним DELETE ... WHERE ... IN (подзапрос), зависимые
+таблицы — раньше родительских. Сигналы при этом не отправляются, поэтому
+их работу (фильмографии, рекомендации, фасеты) bulk_delete() делает сам.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import anniversaries, facets
+from .filmography import schedule_refresh
+from .models import (Country, Film, FilmRecommendation, Person,
+                     PersonFilmography, SubtitleLine, SubtitleSet)
+
+FilmGenre = Film.genres.through
+FilmPerson = Film.people.through
+
+MODELS = {model._meta.model_name: model
+          for model in (Film, Person, Country, SubtitleSet)}
+
+# У автоматических промежуточных таблиц нет русских названий
+LABELS = {FilmGenre: "Связи фильмов с жанрами",
+          FilmPerson: "Связи фильмов с актерами"}
+
+
+def label(model):
+    return LABELS.get(model, model._meta.verbose_name_plural)
+
+
+def deleted_films(model, ids):
+    """Фильмы, которые удаляются вместе с объектами (CASCADE)."""
+    if model is Film:
+        return Film.objects.filter(id__in=ids)
+    if model is Person:
+        return Film.objects.filter(director_id__in=ids)
+    if model is Country:
+        return Film.objects.filter(country_id__in=ids)
+    return Film.objects.none()
+
+
+def plan(model, ids):
+    """[(модель, queryset)] в порядке удаления: сначала зависимые строки."""
+    if model not in MODELS.values():
+        raise ValueError(f"Массовое удаление не поддерживается: {model}")
+    ids = list(ids)
+    if model is SubtitleSet:
+        sets = SubtitleSet.objects.filter(id__in=ids)
+        return [
+            (SubtitleLine, SubtitleLine.objects.filter(
+                subtitle_set_id__in=sets.values('id'))),
+            (SubtitleSet, sets),
+        ]
+    film_ids = deleted_films(model, ids).values('id')
+    sets = SubtitleSet.objects.filter(film_id__in=film_ids)
+    links = Q(film_id__in=film_ids)
+    if model is Person:
+        links |= Q(person_id__in=ids)
+    steps = [
+        (SubtitleLine, SubtitleLine.objects.filter(
+            subtitle_set_id__in=sets.values('id'))),
+        (SubtitleSet, sets),
+        (FilmRecommendation, FilmRecommendation.objects.filter(
+            Q(film_id__in=film_ids) | Q(recommended_id__in=film_ids))),
+        (FilmGenre, FilmGenre.objects.filter(film_id__in=film_ids)),
+        (FilmPerson, FilmPerson.objects.filter(links)),
+        (Film, Film.objects.filter(id__in=film_ids)),
+    ]
+    if model is Person:
+        steps.append((PersonFilmography, PersonFilmography.objects.filter(
+            person_id__in=ids)))
+    if model is not Film:
+        steps.append((model, model.objects.filter(id__in=ids)))
+    return steps
+
+
+def preview(model, ids):
+    """Сколько строк удалится: [(модель, число)] — по COUNT на таблицу."""
+    return [(step_model, queryset.count())
+            for step_model, queryset in plan(model, ids)]
+
+
+def bulk_delete(model, ids):
+    """Удаляет объекты со всеми зависимыми строками; {модель: число}."""
+    ids = list(ids)
+    steps = plan(model, ids)
+    films = deleted_films(model, ids)
+    film_ids = films.values('id')
+    with transaction.atomic():
+        # Персоны, в фильмографии которых есть удаляемые фильмы
+        people = set(FilmPerson.objects.filter(film_id__in=film_ids)
+                     .values_list('person_id', flat=True))
+        people |= set(films.values_list('director_id', flat=True))
+        # Оставшимся фильмам, которым рекомендован удаляемый, — пересчёт
+        Film.objects.filter(id__in=FilmRecommendation.objects.filter(
+            recommended_id__in=film_ids).values('film_id')) \
+            .exclude(id__in=film_ids).update(recommendations_updated_at=None)
+        if model is Person:
+            # Как touch_film: у фильмов, где играла персона, меняется состав
+            Film.objects.filter(id__in=FilmPerson.objects.filter(
+                person_id__in=ids).values('film_id')) \
+                .exclude(id__in=film_ids).update(updated_at=timezone.now())
+
+        counts = {}
+        for step_model, queryset in steps:
+            counts[step_model] = queryset._raw_delete(queryset.db)
+    schedule_refresh(people - set(ids) if model is Person else people)
+    if model is not SubtitleSet:
+        facets.invalidate()
+        anniversaries.invalidate()
+    return counts
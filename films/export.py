@@ -0,0 +1,134 @@
+"""
+Потоковая выгрузка каталога в CSV, JSONL и колоночный формат.
+
+Строки читаются через ``QuerySet.iterator()`` (server-side cursor там, где
+он есть) пачками по ``chunk_size``, поэтому потребление памяти не зависит от
+размера таблицы.
+"""
+import csv
+import datetime
+import io
+import json
+import logging
+import time
+from itertools import islice
+
+from .models import Country, Film, Genre, Person, SubtitleLine, SubtitleSet
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MODELS = {
+    'film': Film,
+    'person': Person,
+    'country': Country,
+    'genre': Genre,
+    'film_genres': Film.genres.through,
+    'film_people': Film.people.through,
+    'subtitleset': SubtitleSet,
+    'subtitleline': SubtitleLine,
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'columns': 'application/x-ndjson; charset=utf-8',
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def to_json(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+class ExportStats:
+    def __init__(self):
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.rows} rows in {self.seconds:.2f} s"
+                f" ({self.rows_per_second:,.0f} rows/s)")
+
+
+def iter_chunks(model, fields, chunk_size):
+    rows = model._default_manager.order_by('pk').values_list(*fields) \
+        .iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_csv(fields, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_jsonl(fields, chunks):
+    for chunk in chunks:
+        yield "".join(
+            json.dumps(dict(zip(fields, row)), ensure_ascii=False,
+                       default=to_json) + "\n"
+            for row in chunk)
+
+
+def write_columns(fields, chunks):
+    """
+    Колоночный формат: первая строка — схема, далее по строке на каждую
+    пачку (row group) с массивами значений по столбцам.
+    """
+    yield json.dumps({"columns": fields}) + "\n"
+    for chunk in chunks:
+        yield json.dumps({"rows": len(chunk), "data": list(zip(*chunk))},
+                         ensure_ascii=False, default=to_json) + "\n"
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'columns': write_columns,
+}
+
+
+def export(name, fmt, chunk_size=DEFAULT_CHUNK_SIZE, stats=None):
+    """
+    Генератор строковых фрагментов выгрузки модели ``name`` в формате ``fmt``.
+    По окончании пишет в лог пропускную способность (строк в секунду).
+    """
+    model = EXPORT_MODELS[name]
+    fields = columns(model)
+    stats = stats or ExportStats()
+
+    def counted(chunks):
+        for chunk in chunks:
+            stats.rows += len(chunk)
+            yield chunk
+
+    yield from WRITERS[fmt](fields, counted(
+        iter_chunks(model, fields, chunk_size)))
+    stats.finished = time.perf_counter()
+    logger.info("Export %s.%s: %s", name, fmt, stats)
@@ -0,0 +1,304 @@
+"""
+Фасетный поиск по фильмам: жанр, страна, год выпуска и продолжительность.
+
+Индекс строится одним проходом по фильмам и связям с жанрами и хранится в
+памяти процесса. Каждое значение фасета — битовая маска (int), где бит i
+означает i-й фильм в порядке списка (название, id). Фильтр — пересечение
+масок, счётчики — bit_count() пересечений, страница — установленные биты с
+нужного номера. На запрос не выполняется ни GROUP BY, ни COUNT: в базу идёт
+только выборка фильмов текущей страницы.
+
+Индекс сбрасывается сигналами (см. signals.py) через версию в базе
+(DataVersion): её видят все процессы, и каждый запрос сверяет с ней свой
+индекс одним запросом по первичному ключу. Версия меняется в транзакции
+изменения, поэтому другие процессы увидят её вместе с новыми данными.
+"""
+import threading
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from .models import Country, DataVersion, Film, Genre
+
+VERSION_KEY = 'facets'
+
+# (ключ, подпись, от, до) — границы в минутах включительно
+LENGTH_BUCKETS = [
+    ('short', 'До 90 минут', 0, 89),
+    ('medium', '90–120 минут', 90, 120),
+    ('long', '121–150 минут', 121, 150),
+    ('epic', 'Больше 150 минут', 151, None),
+]
+
+BLOCK_BITS = 1 << 16
+BLOCK_MASK = (1 << BLOCK_BITS) - 1
+SUB_BLOCK_BITS = 1 << 10
+SUB_BLOCK_MASK = (1 << SUB_BLOCK_BITS) - 1
+
+_lock = threading.Lock()
+_index = None
+
+
+def to_bits(positions, size):
+    """Номера битов -> маска; через bytearray, без квадратичных |= над int."""
+    buf = bytearray((size + 7) // 8)
+    for position in positions:
+        buf[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def iter_positions(bits, start=0, stop=None):
+    """
+    Номера установленных битов со start-го по stop-й (не включая) по
+    возрастанию. Блоки, целиком лежащие до start, пропускаются по bit_count()
+    (сначала крупные, затем мелкие внутри блока), поэтому дальние страницы
+    не требуют перебора всех предыдущих битов.
+    """
+    seen = offset = 0
+    while bits and (stop is None or seen < stop):
+        block = bits & BLOCK_MASK
+        count = block.bit_count()
+        if seen + count <= start:
+            seen += count
+        else:
+            for sub_offset in range(0, BLOCK_BITS, SUB_BLOCK_BITS):
+                if stop is not None and seen >= stop:
+                    break
+                sub = (block >> sub_offset) & SUB_BLOCK_MASK
+                count = sub.bit_count()
+                if seen + count <= start:
+                    seen += count
+                    continue
+                while sub and (stop is None or seen < stop):
+                    low = sub & -sub
+                    if seen >= start:
+                        yield offset + sub_offset + low.bit_length() - 1
+                    seen += 1
+                    sub ^= low
+        bits >>= BLOCK_BITS
+        offset += BLOCK_BITS
+
+
+class FacetIndex:
+    def __init__(self):
+        self.ids = array('q')
+        years, lengths = defaultdict(list), defaultdict(list)
+        countries = defaultdict(list)
+        for position, (film_id, country_id, year, length) in enumerate(
+                Film.objects.order_by('name', 'id')
+                .values_list('id', 'country_id', 'year', 'length')
+                .iterator(chunk_size=10000)):
+            self.ids.append(film_id)
+            countries[country_id].append(position)
+            if year is not None:
+                years[year].append(position)
+            if length is not None:
+                lengths[self.length_bucket(length)].append(position)
+        self.size = size = len(self.ids)
+
+        # Обратное отображение id -> позиция: два массива и bisect вместо
+        # словаря на миллион ключей
+        order = sorted(range(size), key=self.ids.__getitem__)
+        self.sorted_ids = array('q', (self.ids[i] for i in order))
+        self.sorted_positions = array('q', order)
+
+        genres = defaultdict(list)
+        for film_id, genre_id in Film.genres.through.objects \
+                .values_list('film_id', 'genre_id').iterator(chunk_size=10000):
+            position = self.position(film_id)
+            if position is not None:
+                genres[genre_id].append(position)
+
+        self.all = (1 << size) - 1
+        self.genres = {k: to_bits(v, size) for k, v in genres.items()}
+        self.countries = {k: to_bits(v, size) for k, v in countries.items()}
+        self.years = {k: to_bits(v, size) for k, v in years.items()}
+        self.lengths = {k: to_bits(v, size) for k, v in lengths.items()}
+        self.genre_names = dict(Genre.objects.values_list('id', 'name'))
+        self.country_names = dict(Country.objects.values_list('id', 'name'))
+
+    @staticmethod
+    def length_bucket(length):
+        for key, _, low, high in LENGTH_BUCKETS:
+            if length >= low and (high is None or length <= high):
+                return key
+
+    def position(self, film_id):
+        i = bisect_left(self.sorted_ids, film_id)
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == film_id:
+            return self.sorted_positions[i]
+        return None
+
+    def bits_for_ids(self, film_ids):
+        positions = (self.position(film_id) for film_id in film_ids)
+        return to_bits([p for p in positions if p is not None], self.size)
+
+    def union(self, masks, keys):
+        bits = 0
+        for key in keys:
+            bits |= masks.get(key, 0)
+        return bits
+
+    def filters(self, selection):
+        """Маска каждого выбранного фасета; значения внутри фасета — ИЛИ."""
+        filters = {}
+        if selection['genre']:
+            filters['genre'] = self.union(self.genres, selection['genre'])
+        if selection['country']:
+            filters['country'] = self.union(self.countries,
+                                            selection['country'])
+        if selection['length']:
+            filters['length'] = self.union(self.lengths, selection['length'])
+        year_from, year_to = selection['year_from'], selection['year_to']
+        if year_from is not None or year_to is not None:
+            filters['year'] = self.union(self.years, [
+                year for year in self.years
+                if (year_from is None or year >= year_from)
+                and (year_to is None or year <= year_to)])
+        return filters
+
+    def search(self, selection, base=None):
+        base = self.all if base is None else base
+        filters = self.filters(selection)
+
+        def others(facet):
+            # Счётчики фасета учитывают все остальные фасеты, но не его
+            # самого: выбор одного жанра не обнуляет соседние.
+            bits = base
+            for name, mask in filters.items():
+                if name != facet:
+                    bits &= mask
+            return bits
+
+        bits = others(None)
+
+        genre_base = others('genre')
+        genres = [(genre_id, name, (self.genres.get(genre_id, 0)
+                                    & genre_base).bit_count(),
+                   genre_id in selection['genre'])
+                  for genre_id, name in sorted(self.genre_names.items(),
+                                               key=lambda item: item[1])]
+        country_base = others('country')
+        countries = sorted(
+            ((country_id, name,
+              (self.countries.get(country_id, 0) & country_base).bit_count(),
+              country_id in selection['country'])
+             for country_id, name in self.country_names.items()),
+            key=lambda item: (-item[2], item[1]))
+        length_base = others('length')
+        lengths = [(key, label,
+                    (self.lengths.get(key, 0) & length_base).bit_count(),
+                    key in selection['length'])
+                   for key, label, _, _ in LENGTH_BUCKETS]
+
+        return FacetResult(
+            films=FilmSequence(self, bits),
+            genres=[g for g in genres if g[2] or g[3]],
+            countries=[c for c in countries if c[2] or c[3]],
+            lengths=lengths,
+            year_min=min(self.years, default=None),
+            year_max=max(self.years, default=None),
+        )
+
+
+class FacetResult:
+    def __init__(self, films, genres, countries, lengths, year_min,
+                 year_max):
+        self.films = films
+        self.genres = genres
+        self.countries = countries
+        self.lengths = lengths
+        self.year_min = year_min
+        self.year_max = year_max
+
+
+class FilmSequence:
+    """
+    Результат фильтра для Paginator: длина — число битов, срез загружает из
+    базы только фильмы страницы.
+    """
+
+    def __init__(self, index, bits):
+        self.index = index
+        self.bits = bits
+        self.length = bits.bit_count()
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop, _ = key.indices(self.length)
+        ids = [self.index.ids[p]
+               for p in iter_positions(self.bits, start, stop)]
+        films = Film.objects.in_bulk(ids)
+        return [films[film_id] for film_id in ids if film_id in films]
+
+
+def parse_selection(params):
+    """Выбранные значения из GET; некорректные значения игнорируются."""
+    def ints(values):
+        result = set()
+        for value in values:
+            try:
+                result.add(int(value))
+            except ValueError:
+                pass
+        return result
+
+    def year(name):
+        try:
+            return int(params.get(name, ''))
+        except ValueError:
+            return None
+
+    buckets = {key for key, _, _, _ in LENGTH_BUCKETS}
+    return {
+        'genre': ints(params.getlist('genre')),
+        'country': ints(params.getlist('country')),
+        'length': {v for v in params.getlist('length') if v in buckets},
+        'year_from': year('year_from'),
+        'year_to': year('year_to'),
+    }
+
+
+def current_version():
+    # Пока изменений не было, строки нет: версия — пустая строка
+    return DataVersion.objects.filter(key=VERSION_KEY) \
+        .values_list('version', flat=True).first() or ''
+
+
+def get_index():
+    """Индекс текущей версии; строится заново, если версия сменилась."""
+    global _index
+    version = current_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        if _index is None or _index.version != version:
+            index = FacetIndex()
+            index.version = version
+            _index = index
+        return _index
+
+
+def invalidate():
+    """
+    Сбрасывает индекс во всех процессах. Случайная версия, а не счётчик:
+    после отката транзакции или подмены базы (снимок в тестах) старое
+    значение не совпадёт с версией уже построенного индекса.
+    """
+    DataVersion.objects.update_or_create(
+        key=VERSION_KEY, defaults={'version': uuid.uuid4().hex})
+
+
+def search(selection, query=''):
+    index = get_index()
+    base = None
+    if query:
+        base = index.bits_for_ids(Film.objects.filter(
+            name__icontains=query).values_list('id', flat=True).iterator())
+    return index.search(selection, base)
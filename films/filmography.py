@@ -0,0 +1,75 @@
+"""
+Пересчёт денормализованных фильмографий (PersonFilmography).
+
+Фильмография любого числа персон собирается за постоянное число запросов:
+два чтения (актёрские работы и режиссура) и удаление/вставка строк.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Film, Person, PersonFilmography
+
+
+def film_sort_key(film):
+    film_id, name, year = film
+    return (year is None, year or 0, name, film_id)
+
+
+def refresh_filmographies(person_ids):
+    # Персона могла быть удалена в той же транзакции
+    person_ids = set(Person.objects.filter(id__in=[
+        pk for pk in person_ids if pk is not None
+    ]).values_list('id', flat=True))
+    if not person_ids:
+        return
+    acted, directed = defaultdict(list), defaultdict(list)
+    for person_id, film_id, name, year in Film.people.through.objects \
+            .filter(person_id__in=person_ids) \
+            .values_list('person_id', 'film_id', 'film__name', 'film__year'):
+        acted[person_id].append([film_id, name, year])
+    for person_id, film_id, name, year in Film.objects \
+            .filter(director_id__in=person_ids) \
+            .values_list('director_id', 'id', 'name', 'year'):
+        directed[person_id].append([film_id, name, year])
+
+    rows = []
+    for person_id in person_ids:
+        films = sorted(acted[person_id], key=film_sort_key)
+        directed_films = sorted(directed[person_id], key=film_sort_key)
+        years = [year for _, _, year in films + directed_films if year]
+        rows.append(PersonFilmography(
+            person_id=person_id, acted_count=len(films),
+            directed_count=len(directed_films),
+            first_year=min(years, default=None),
+            last_year=max(years, default=None),
+            acted_films=films, directed_films=directed_films))
+    with transaction.atomic():
+        PersonFilmography.objects.filter(person_id__in=person_ids).delete()
+        PersonFilmography.objects.bulk_create(rows)
+
+
+def schedule_refresh(person_ids):
+    """
+    Откладывает пересчёт до фиксации транзакции: к этому моменту каскадное
+    удаление и изменения связей уже завершены.
+    """
+    person_ids = set(person_ids)
+    if person_ids:
+        transaction.on_commit(lambda: refresh_filmographies(person_ids))
+
+
+def rebuild_all(batch_size=500):
+    ids = list(Person.objects.values_list('id', flat=True))
+    for start in range(0, len(ids), batch_size):
+        refresh_filmographies(ids[start:start + batch_size])
+    return len(ids)
+
+
+def film_person_ids(film_id):
+    """Режиссер и актёры фильма."""
+    ids = set(Film.people.through.objects.filter(film_id=film_id)
+              .values_list('person_id', flat=True))
+    ids.update(Film.objects.filter(id=film_id)
+               .values_list('director_id', flat=True))
+    return ids
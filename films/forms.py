@@ -2,6 +2,10 @@ from django import forms
 from dal import autocomplete
 from .models import Country, Genre, Film, Person
 
+# Короче — автодополнение не ищет (ни виджет, ни представление)
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_ATTRS = {'data-minimum-input-length': AUTOCOMPLETE_MIN_LENGTH}
+
 
 class CountryForm(forms.ModelForm):
     class Meta:
@@ -23,11 +27,11 @@ class FilmForm(forms.ModelForm):
                   "director", 'people']
         widgets = {
             'people': autocomplete.ModelSelect2Multiple(
-                url='films:person_autocomplete'),
+                url='films:person_autocomplete', attrs=AUTOCOMPLETE_ATTRS),
             'director': autocomplete.ModelSelect2(
-                url='films:person_autocomplete'),
+                url='films:person_autocomplete', attrs=AUTOCOMPLETE_ATTRS),
             'country': autocomplete.ModelSelect2(
-                url='films:country_autocomplete'),
+                url='films:country_autocomplete', attrs=AUTOCOMPLETE_ATTRS),
         }
 
 
@@ -1,5 +1,7 @@
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
+from .models import SubtitleSet
+
 
 def paginate(request, collection, per=12):
     paginator = Paginator(collection, per)
@@ -11,3 +13,14 @@ def paginate(request, collection, per=12):
     except EmptyPage:
         collection = paginator.page(paginator.num_pages)
     return collection
+
+
+def add_subtitle_languages(films):
+    """
+    film.subtitle_languages для карточек (films/film.html) — одним
+    запросом на страницу.
+    """
+    languages = SubtitleSet.languages_by_film([film.id for film in films])
+    for film in films:
+        film.subtitle_languages = languages.get(film.id, [])
+    return films
@@ -0,0 +1,551 @@
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from films.profiling import InstrumentedCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.core.paginator import Paginator
+from django.http import QueryDict
+from django.template.backends.django import DjangoTemplates
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from films import anniversaries, facets, profiling, ratelimit
+from films.deletion import bulk_delete
+from films.models import (Country, Genre, Person, Film, SubtitleLine,
+                          SubtitleSet)
+from films.staticfiles import compress
+from films.subtitles import SERIALIZERS, align, iter_cues, serialize
+from .import_films import Command as ImportFilmsCommand
+from .import_vtt import Command as ImportVttCommand
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import tempfile
+import time
+
+import django
+
+
+class Rollback(Exception):
+    """Откатывает транзакцию с синтетическим каталогом после замеров."""
+
+
+class Command(InstrumentedCommand):
+    help = 'Benchmark key views, subtitles and imports on synthetic catalogs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='100,1000',
+                            help='Comma separated catalog sizes (films).')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--cues', type=int, default=2000,
+                            help='Cues per subtitle set.')
+        parser.add_argument('--only', default='',
+                            help='Comma separated suites to run.')
+        parser.add_argument('--output', default='bench_output.json',
+                            help='Where to write machine-readable results.')
+        parser.add_argument('--compare',
+                            help='Previous results file to compare against.')
+
+    def suites(self):
+        return sorted(name[len('bench_'):] for name in dir(self)
+                      if name.startswith('bench_'))
+
+    # Лимиты поиска замеряются отдельно (bench_ratelimit)
+    @override_settings(ALLOWED_HOSTS=['testserver'], FILMS_RATE_LIMITS={})
+    def handle(self, *args, **options):
+        only = [s for s in options['only'].split(",") if s]
+        unknown = set(only) - set(self.suites())
+        if unknown:
+            raise CommandError(f"Unknown suites: {', '.join(sorted(unknown))}."
+                               f" Available: {', '.join(self.suites())}.")
+        self.repeat = options['repeat']
+        self.cue_count = options['cues']
+        self.results = []
+
+        for scale in [int(s) for s in options['scales'].split(",") if s]:
+            self.stdout.write(f"Scale {scale}: seeding...")
+            try:
+                with transaction.atomic():
+                    self.seed(scale)
+                    for suite in only or self.suites():
+                        self.scale = scale
+                        getattr(self, f'bench_{suite}')()
+                    raise Rollback
+            except Rollback:
+                pass
+
+        report = {
+            "created_at": datetime.datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "repeat": self.repeat,
+            "results": self.results,
+        }
+        with open(options['output'], "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(self.results)} results written to {options['output']}"))
+
+        if options['compare']:
+            self.compare(options['compare'])
+
+    def seed(self, scale):
+        call_command('seed_catalog', films=scale, people=scale * 2,
+                     genres=20, countries=30, subtitle_sets=2,
+                     cues=self.cue_count, languages='ru',
+                     stdout=io.StringIO())
+
+    def record(self, name, func, repeat=None, **extra):
+        """Замеряет func несколько раз и сохраняет статистику в миллисекундах."""
+        timings = []
+        cpu = []
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        query_count = len(queries)
+        for _ in range(repeat or self.repeat):
+            started, cpu_started = time.perf_counter(), time.process_time()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+            cpu.append((time.process_time() - cpu_started) * 1000)
+        result = {"scale": self.scale, "name": name,
+                  "min_ms": round(min(timings), 3),
+                  "median_ms": round(statistics.median(timings), 3),
+                  "mean_ms": round(statistics.mean(timings), 3),
+                  "cpu_ms": round(statistics.median(cpu), 3),
+                  "runs": len(timings), "queries": query_count, **extra}
+        self.results.append(result)
+        self.stdout.write(f"  {name:<40} {result['median_ms']:>10.3f} ms"
+                          f" {query_count:>4} q")
+        return result
+
+    def record_value(self, name, **values):
+        result = {"scale": self.scale, "name": name, **values}
+        self.results.append(result)
+        self.stdout.write(f"  {name:<40} " + " ".join(
+            f"{k}={v}" for k, v in values.items()))
+        return result
+
+    # ------------------------------------------------------------------ suites
+
+    def bench_views(self):
+        client = Client()
+        film = Film.objects.first()
+        person = Film.objects.values_list('director', flat=True).first()
+        country = Country.objects.first()
+        genre = Genre.objects.first()
+        urls = {
+            "film_list": reverse('films:film_list'),
+            "film_list_deep_page": reverse('films:film_list') + '?page=9999',
+            "film_list_search": reverse('films:film_list') + '?query=ноч',
+            "film_detail": reverse('films:film_detail', args=[film.id]),
+            "person_list": reverse('films:person_list'),
+            "person_detail": reverse('films:person_detail', args=[person]),
+            "country_detail": reverse('films:country_detail',
+                                      args=[country.id]),
+            "genre_detail": reverse('films:genre_detail', args=[genre.id]),
+            "film_batch": reverse('films:film_batch') + '?ids=' + ",".join(
+                str(pk) for pk in Film.objects.values_list(
+                    'id', flat=True)[:100]) + '&fields=name,genres,people',
+        }
+        for name, url in urls.items():
+            def get(url=url):
+                response = client.get(url)
+                assert response.status_code == 200, (url, response)
+            self.record(f"view.{name}", get)
+
+    def bench_facets(self):
+        self.record("facets.build_index", facets.FacetIndex, repeat=1)
+        facets.get_index()
+        genres = list(Genre.objects.values_list('id', flat=True)[:2])
+        country = Country.objects.values_list('id', flat=True).first()
+        selections = {
+            "none": {},
+            "genre": {'genre': genres[:1]},
+            "genre_country_year": {'genre': genres, 'country': [country],
+                                   'year_from': 1980, 'year_to': 2010},
+            "all_facets": {'genre': genres, 'country': [country],
+                           'year_from': 1950, 'length': ['medium', 'long']},
+        }
+        for name, values in selections.items():
+            params = QueryDict(mutable=True)
+            for key, value in values.items():
+                params.setlist(key, value if isinstance(value, list)
+                               else [value])
+            selection = facets.parse_selection(params)
+
+            def first_page(selection=selection):
+                result = facets.search(selection)
+                list(result.films[:12])
+            self.record(f"facets.search.{name}", first_page)
+
+    def bench_templates(self):
+        """
+        Карточки: 12 фильмов (страница списка) и 1000 персон. Для сравнения
+        «до» — движок без кэширующего загрузчика и с пустым кэшем фрагментов.
+        """
+        factory = RequestFactory()
+        pages = {
+            "film_cards_12": ("films/films.html", "films",
+                              list(Film.objects.all()[:12])),
+            "people_1000": ("films/people.html", "people",
+                            list(Person.objects.all()[:1000])),
+        }
+        config = settings.TEMPLATES[0]
+        options = {**config['OPTIONS'],
+                   'loaders': config['OPTIONS']['loaders'][0][1]}
+        uncached = DjangoTemplates({'NAME': 'uncached', 'DIRS': config['DIRS'],
+                                    'APP_DIRS': False, 'OPTIONS': options})
+        fragments = caches['template_fragments']
+        for name, (template_name, var, objects) in pages.items():
+            page = Paginator(objects, len(objects) or 1).page(1)
+            request = factory.get('/')
+            context = {var: page, 'request': request}
+
+            def before():
+                fragments.clear()
+                uncached.get_template(template_name).render(context)
+
+            def after():
+                render_to_string(template_name, context)
+            self.record(f"templates.{name}.uncached", before,
+                        objects=len(objects))
+            fragments.clear()
+            self.record(f"templates.{name}.cached", after,
+                        objects=len(objects))
+
+    def bench_deletes(self):
+        """Удаление через Collector и набором DELETE (deletion.py)."""
+        def rolled_back(func):
+            def run():
+                try:
+                    with transaction.atomic():
+                        func()
+                        raise Rollback
+                except Rollback:
+                    pass
+            return run
+
+        country = Country.objects.annotate(films=Count('film')) \
+            .order_by('-films').first()
+        film = SubtitleSet.objects.first().film
+        cases = {
+            "country": (Country, country.pk, country.films),
+            "film": (Film, film.pk, 1),
+        }
+        for name, (model, pk, films) in cases.items():
+            self.record(f"delete.{name}.collector", rolled_back(
+                lambda: model.objects.get(pk=pk).delete()),
+                repeat=3, films=films)
+            self.record(f"delete.{name}.bulk", rolled_back(
+                lambda: bulk_delete(model, [pk])), repeat=3, films=films)
+
+    def bench_anniversaries(self):
+        """
+        «Родились сегодня»: фильтр по месяцу и дню даты с Person.age() на
+        каждой строке («до») против индекса birthday_key с возрастом в
+        запросе и подборки дня из кэша.
+        """
+        day = timezone.localdate()
+
+        def scan():
+            return [(person.id, person.age()) for person in
+                    Person.objects.filter(birthday__month=day.month,
+                                          birthday__day=day.day)]
+
+        def indexed():
+            return list(anniversaries.born_on(day)
+                        .values_list('id', 'turning'))
+
+        def cached():
+            return anniversaries.today()
+
+        self.record("anniversaries.born_today.scan", scan)
+        self.record("anniversaries.born_today.indexed", indexed)
+        anniversaries.invalidate()
+        self.record("anniversaries.today.build", lambda: (
+            anniversaries.invalidate(), anniversaries.today()))
+        self.record("anniversaries.today.cached", cached)
+
+    def bench_auth(self):
+        """
+        Страница списка для анонима и для вошедшего пользователя: сессии в
+        базе и ModelBackend («до») против сессий и пользователей в кэше
+        (cached_db и CachedModelBackend; в работе их включают только на
+        общем кэше, здесь — 'default'). Плюс цена одного хеша пароля,
+        которую регистрация больше не платит дважды.
+        """
+        url = reverse('films:film_list')
+        user = User.objects.create_user('bench-auth')
+        configs = {
+            "db": {'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+                   'AUTHENTICATION_BACKENDS': [
+                       'django.contrib.auth.backends.ModelBackend']},
+            "cached": {
+                'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+                'SESSION_CACHE_ALIAS': 'default',
+                'AUTH_USER_CACHE': 'default'},
+        }
+        for name, config in configs.items():
+            with override_settings(**config):
+                client = Client()
+                # Первый запрос прогревает кэши (индекс фасетов, сессию)
+                client.get(url)
+                self.record(f"auth.anonymous.{name}",
+                            lambda: client.get(url))
+                client.force_login(user)
+                client.get(url)
+                self.record(f"auth.logged_in.{name}",
+                            lambda: client.get(url))
+        self.record("auth.password_hash", lambda: make_password("bench"),
+                    repeat=3)
+
+    def bench_ratelimit(self):
+        """
+        Цена токена на запрос и ответ 429 исчерпавшему бюджет клиенту
+        против самого поиска (view.film_list_search).
+        """
+        url = reverse('films:film_list') + '?query=ноч'
+        with override_settings(FILMS_RATE_LIMITS={
+                'search': (1000.0, 10 ** 6, 4)}):
+            self.record("ratelimit.take",
+                        lambda: ratelimit.take('search', 'bench'))
+        with override_settings(FILMS_RATE_LIMITS={'search': (0.001, 1, 4)}):
+            client = Client(REMOTE_ADDR='192.0.2.1')
+            client.get(url)
+
+            def throttled():
+                response = client.get(url)
+                assert response.status_code == 429, response
+            self.record("ratelimit.throttled_search", throttled)
+
+    def bench_startup(self):
+        """
+        Запуск короткой команды (import_vtt без файла) в отдельном процессе
+        с полными и облегчёнными (filmbase.settings_batch) настройками.
+        """
+        argv = ['import_vtt', '1', 'ru', 'missing.vtt']
+        for name in ('settings', 'settings_batch'):
+            runs = [profiling.import_times(argv, f'filmbase.{name}')
+                    for _ in range(self.repeat)]
+            modules = runs[0][0]
+            self.record_value(
+                f"startup.import_vtt.{name}", modules=len(modules),
+                import_ms=round(sum(own for own, _ in modules.values())
+                                / 1000, 3),
+                wall_ms=round(statistics.median(
+                    elapsed for _, elapsed in runs) * 1000, 3))
+
+    def bench_sitemap(self):
+        """
+        Карта сайта против обхода списка фильмов постранично (как делал
+        робот): все страницы film_list и шард films без кэша и из кэша.
+        """
+        client = Client()
+        url = reverse('films:film_list')
+        pages = Paginator(Film.objects.all(), 12).num_pages
+
+        def crawl():
+            for page in range(1, pages + 1):
+                client.get(url, {'page': page})
+        self.record("sitemap.crawl_film_list", crawl, repeat=1, pages=pages)
+        self.record("sitemap.index",
+                    lambda: client.get(reverse('films:sitemap_index')))
+
+        shard = reverse('films:sitemap_shard', args=['films', 0])
+
+        def cold():
+            cache.clear()
+            b"".join(client.get(shard).streaming_content)
+        self.record("sitemap.films_shard.cold", cold)
+        self.record("sitemap.films_shard.cached",
+                    lambda: client.get(shard, HTTP_ACCEPT_ENCODING='gzip'))
+
+    def bench_subtitles(self):
+        subtitle_set = SubtitleSet.objects.first()
+        self.record("subtitles.generate_vtt", subtitle_set.generate_vtt,
+                    cues=self.cue_count)
+        for fmt in SERIALIZERS:
+            result = self.record(f"subtitles.serialize.{fmt}",
+                                 lambda fmt=fmt: serialize(subtitle_set, fmt),
+                                 cues=self.cue_count)
+            result["cues_per_s"] = round(
+                self.cue_count / result["median_ms"] * 1000)
+
+        client = Client()
+        url = reverse('films:get_subtitles', kwargs={
+            'film_id': subtitle_set.film_id,
+            'language_code': subtitle_set.language, 'format': 'vtt'})
+        self.record("view.get_subtitles", lambda: client.get(url),
+                    cues=self.cue_count)
+
+        with self.vtt_file(subtitle_set) as path:
+            parser = ImportVttCommand()
+            self.record("subtitles.parse_vtt",
+                        lambda: parser.parse_vtt(path), cues=self.cue_count)
+
+        # Вторая дорожка — та же, сдвинутая на 0.3 с
+        second = SubtitleSet.objects.create(film_id=subtitle_set.film_id,
+                                            language='dual')
+        SubtitleLine.objects.bulk_create(
+            SubtitleLine(subtitle_set=second, start_time=line.start_time + .3,
+                         end_time=line.end_time + .3, text=line.text)
+            for line in subtitle_set.lines.all())
+        first_cues = list(iter_cues(subtitle_set))
+        second_cues = list(iter_cues(second))
+
+        def pairwise():
+            # Для сравнения: каждая реплика с каждой, O(n * m)
+            return [(a, b) for a in first_cues for b in second_cues
+                    if a[0] < b[1] and b[0] < a[1]]
+        self.record("subtitles.align.pairwise", pairwise, repeat=1,
+                    cues=self.cue_count)
+        self.record("subtitles.align.sweep",
+                    lambda: list(align(first_cues, second_cues)),
+                    cues=self.cue_count)
+        url = reverse('films:get_dual_subtitles', kwargs={
+            'film_id': subtitle_set.film_id,
+            'first': subtitle_set.language, 'second': second.language})
+        self.record("view.get_dual_subtitles.cold",
+                    lambda: cache.clear() or client.get(url),
+                    cues=self.cue_count)
+        self.record("view.get_dual_subtitles.cached",
+                    lambda: client.get(url), cues=self.cue_count)
+
+    def bench_imports(self):
+        subtitle_set = SubtitleSet.objects.select_related('film').first()
+        film = subtitle_set.film
+        Film.objects.filter(id=film.id).update(kinopoisk_id=900000000)
+        with self.vtt_file(subtitle_set) as path:
+            self.record("import.import_vtt", lambda: call_command(
+                'import_vtt', 900000000, 'bench', path,
+                stdout=io.StringIO()), repeat=3, cues=self.cue_count)
+
+        docs = self.film_docs(min(self.scale, 50))
+        command = ImportFilmsCommand()
+
+        def import_films():
+            with contextlib.redirect_stdout(io.StringIO()):
+                for doc in docs:
+                    command.create_film(doc)
+        self.record("import.import_films", import_films, repeat=3,
+                    films=len(docs))
+
+    def bench_wire(self):
+        """Байты, которые передаются при открытии страницы фильма."""
+        subtitle_set = SubtitleSet.objects.first()
+        Film.objects.filter(id=subtitle_set.film_id).update(
+            trailer_url='https://www.youtube.com/embed/bench')
+        client = Client()
+        html = client.get(reverse('films:film_detail',
+                                  args=[subtitle_set.film_id])).content
+        static_raw = static_compressed = external = 0
+        for url in re.findall(r'(?:src|href)="([^"]+)"', html.decode()):
+            if url.startswith(('http://', 'https://')):
+                external += 1
+                continue
+            path = finders.find(url.replace('/static/', '', 1)) \
+                if url.startswith('/static/') else None
+            if not path:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            variants = compress(data)
+            static_raw += len(data)
+            static_compressed += min(
+                (len(blob) for blob in variants.values()), default=len(data))
+
+        subtitles = {}
+        for fmt in ('vtt', 'cues.json'):
+            url = reverse('films:get_subtitles', kwargs={
+                'film_id': subtitle_set.film_id,
+                'language_code': subtitle_set.language, 'format': fmt})
+            subtitles[fmt] = (
+                len(client.get(url).content),
+                len(client.get(url, HTTP_ACCEPT_ENCODING='gzip').content))
+        # Плеер загружает индекс реплик (cues.json), VTT — для сравнения
+        cues_raw, cues_gzip = subtitles['cues.json']
+        self.record_value(
+            "wire.film_page", html_bytes=len(html),
+            static_bytes_raw=static_raw,
+            static_bytes_compressed=static_compressed,
+            vtt_bytes_raw=subtitles['vtt'][0],
+            vtt_bytes_gzip=subtitles['vtt'][1],
+            cues_bytes_raw=cues_raw, cues_bytes_gzip=cues_gzip,
+            external_assets=external,
+            total_bytes_raw=len(html) + static_raw + cues_raw,
+            total_bytes_compressed=len(html) + static_compressed + cues_gzip)
+
+    # ----------------------------------------------------------------- helpers
+
+    @contextlib.contextmanager
+    def vtt_file(self, subtitle_set):
+        fd, path = tempfile.mkstemp(suffix=".vtt")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(subtitle_set.generate_vtt())
+            yield path
+        finally:
+            os.remove(path)
+
+    @staticmethod
+    def film_docs(count):
+        """Документы в формате ответа poiskkino без картинок (без сети)."""
+        people = list(Person.objects.values_list('name', flat=True)[:40])
+        docs = []
+        for i in range(count):
+            persons = [{"id": 800000000 + (i + j) % 40, "name": name,
+                        "enName": name, "profession": "актеры",
+                        "birthday": "1970-01-01T00:00:00.000Z"}
+                       for j, name in enumerate(people[:10])]
+            persons.insert(0, {"id": 800000000 + i % 40, "name": people[0],
+                               "enName": None, "profession": "режиссеры"})
+            docs.append({
+                "id": 700000000 + i, "name": f"Фильм {i}",
+                "enName": f"Film {i}", "slogan": "", "movieLength": 100,
+                "description": "", "year": 2000,
+                "countries": [{"name": "Бенчмарк"}],
+                "genres": [{"name": "драма"}, {"name": "бенчмарк"}],
+                "persons": persons, "videos": {"trailers": []},
+            })
+        return docs
+
+    def compare(self, path):
+        with open(path, encoding="utf-8") as f:
+            before = {(r["scale"], r["name"]): r
+                      for r in json.load(f)["results"]}
+        self.stdout.write(f"\n{'benchmark':<48} {'before':>10} {'after':>10}"
+                          f" {'change':>8}")
+        for result in self.results:
+            old = before.get((result["scale"], result["name"]))
+            if not old:
+                continue
+            if "median_ms" in result:
+                fields = ["median_ms"]
+            else:
+                # Строки record_value(): сравниваются их числовые поля
+                fields = [key for key, value in result.items()
+                          if key not in ("scale", "name")
+                          and isinstance(value, (int, float))
+                          and isinstance(old.get(key), (int, float))]
+            for field in fields:
+                name = result["name"] if field == "median_ms" \
+                    else f"{result['name']}.{field}"
+                change = (result[field] / old[field] - 1) * 100 \
+                    if old[field] else 0.0
+                self.stdout.write(
+                    f"{result['scale']:>7} {name:<40}"
+                    f" {old[field]:>10.3f} {result[field]:>10.3f}"
+                    f" {change:>+7.1f}%")
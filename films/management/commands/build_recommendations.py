@@ -0,0 +1,22 @@
+from films.profiling import InstrumentedCommand
+from films.recommendations import MAX_DF, TOP_K, rebuild
+import time
+
+
+class Command(InstrumentedCommand):
+    help = 'Precompute top-K similar films (only changed films by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute every film.')
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument('--max-df', type=int, default=MAX_DF,
+                            help='Ignore features shared by more films.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild(full=options['full'], top_k=options['top_k'],
+                        max_df=options['max_df'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed {count} films in"
+            f" {time.perf_counter() - started:.2f} s"))
@@ -0,0 +1,22 @@
+from django.core.management.base import CommandError
+from films.profiling import InstrumentedCommand
+from films import tasks
+
+
+class Command(InstrumentedCommand):
+    help = 'Put a background task into the queue (see run_worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(tasks.REGISTRY))
+        parser.add_argument('params', nargs='*', metavar='key=value',
+                            help='Task keyword arguments.')
+
+    def handle(self, *args, **options):
+        kwargs = {}
+        for param in options['params']:
+            key, sep, value = param.partition('=')
+            if not sep:
+                raise CommandError(f"Expected key=value, got {param!r}")
+            kwargs[key] = int(value) if value.isdigit() else value
+        task = tasks.enqueue(options['name'], **kwargs)
+        self.stdout.write(self.style.SUCCESS(f"Queued {task}"))
@@ -0,0 +1,37 @@
+from films.profiling import InstrumentedCommand
+from films.export import (DEFAULT_CHUNK_SIZE, EXPORT_MODELS, WRITERS,
+                          ExportStats, export)
+import os
+
+
+class Command(InstrumentedCommand):
+    help = 'Stream catalog tables to CSV, JSONL or columnar files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='+',
+                            choices=[*EXPORT_MODELS, 'all'])
+        parser.add_argument('--format', default='csv', choices=WRITERS)
+        parser.add_argument('--output-dir', default='.',
+                            help='Directory for the files, "-" for stdout.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        names = list(EXPORT_MODELS) if 'all' in options['models'] \
+            else options['models']
+        fmt = options['format']
+        for name in names:
+            stats = ExportStats()
+            chunks = export(name, fmt, options['chunk_size'], stats)
+            if options['output_dir'] == '-':
+                for chunk in chunks:
+                    self.stdout.write(chunk, ending='')
+                target = 'stdout'
+            else:
+                os.makedirs(options['output_dir'], exist_ok=True)
+                target = os.path.join(options['output_dir'],
+                                      f"{name}.{fmt}")
+                with open(target, "w", encoding="utf-8", newline="") as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+            self.stderr.write(f"{name} -> {target}: {stats}")
@@ -1,28 +1,73 @@
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from films.profiling import InstrumentedCommand
+from django.utils import timezone
+from films import profiling
+from films.sync import last_synced_at, mark_synced
 import os
-import requests
 import json
 
 
-class Command(BaseCommand):
+class Command(InstrumentedCommand):
     help = 'Download json via https://api.poiskkino.dev'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--delta', action='store_true',
+                            help='Only request films updated since the '
+                                 'previous sync and merge them into the file.')
+
     def handle(self, *args, **options):
-        movies = self.get_movies()
-        with open(self.filename(), "w", encoding="utf-8") as f:
+        started = timezone.now()
+        since = last_synced_at() if options['delta'] else None
+        movies = self.get_movies(since)
+        if since is not None:
+            movies = self.merge(movies)
+        with profiling.stage('write json'), \
+                open(self.filename(), "w", encoding="utf-8") as f:
             json.dump(movies, f, ensure_ascii=False, indent=4)
+        mark_synced(started)
         print(self.filename())
 
     @staticmethod
     def filename():
-        return "films/data/films.json"
+        return settings.FILMS_JSON_PATH
+
+    @staticmethod
+    def api_url(path):
+        return settings.POISKKINO_API_URL.rstrip("/") + path
 
     @staticmethod
     def headers():
         return {"X-API-KEY": os.environ.get("POISKKINO_DEV_TOKEN")}
 
+    def request(self, path, params):
+        # requests тянет urllib3, charset-normalizer и idna — импортируем,
+        # только когда действительно идём в API
+        import requests
+
+        with profiling.stage('http'):
+            resp = requests.get(self.api_url(path), headers=self.headers(),
+                                params=params)
+        profiling.add_bytes(len(resp.content))
+        return resp
+
+    def merge(self, delta):
+        """Обновлённые фильмы заменяют старые записи в сохранённом файле."""
+        try:
+            with open(self.filename(), encoding="utf-8") as f:
+                movies = json.load(f)
+        except FileNotFoundError:
+            return delta
+        docs = {doc["id"]: doc for doc in movies["docs"]}
+        for doc in delta["docs"]:
+            docs[doc["id"]] = doc
+        movies["docs"] = list(docs.values())
+        movies["total"] = len(movies["docs"])
+        return movies
+
     def get_birthdays(self, movie_ids):
         res = {}
+        if not movie_ids:
+            return res
         params = {
             "selectFields": ["id", "birthday"],
             "notNullFields": ["birthday"],
@@ -32,9 +77,7 @@ class Command(BaseCommand):
         }
         while True:
             print(params["page"])
-            resp = requests.get(
-                "https://api.poiskkino.dev/v1.4/person",
-                headers=self.headers(), params=params)
+            resp = self.request("/v1.4/person", params)
             json = resp.json()
             for data in json['docs']:
                 res[data['id']] = data['birthday']
@@ -43,7 +86,7 @@ class Command(BaseCommand):
                 break
         return res
 
-    def get_movies(self):
+    def get_movies(self, since=None):
         params = {
             "selectFields": ["id", "name", "enName", "year", "description",
                              "movieLength", "countries",  "genres", "persons",
@@ -53,9 +96,11 @@ class Command(BaseCommand):
             "limit": 250
 
         }
-        resp = requests.get(
-            "https://api.poiskkino.dev/v1.4/movie",
-            headers=self.headers(), params=params)
+        if since is not None:
+            # Диапазон дат обновления в формате API: dd.mm.yyyy-dd.mm.yyyy
+            params["updatedAt"] = \
+                f"{since:%d.%m.%Y}-{timezone.now():%d.%m.%Y}"
+        resp = self.request("/v1.4/movie", params)
         json = resp.json()
         movie_ids = set()
         for film_data in json['docs']:
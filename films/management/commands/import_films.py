@@ -1,33 +1,55 @@
-from django.core.management.base import BaseCommand
+from films.profiling import InstrumentedCommand
 import json
 import os
 from urllib.request import urlopen
 from urllib.error import HTTPError
+from django.conf import settings
 from django.core.files import File
 from django.core.files.temp import NamedTemporaryFile
+from films import profiling
 from films.models import Country, Genre, Person, Film
-from .get_films import Command as GetCommand
+from films.sync import SyncTracker
 
 
-class Command(BaseCommand):
+class Command(InstrumentedCommand):
     help = 'Import films from json file'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--delta', action='store_true',
+                            help='Skip films and people that did not change '
+                                 'since the previous import.')
+
     def handle(self, *args, **options):
+        self.tracker = SyncTracker(delta=options['delta'])
         self.create_films()
+        self.stdout.write(self.tracker.summary())
+
+    @property
+    def sync(self):
+        # create_film() вызывается и напрямую (benchmark, задачи)
+        if not hasattr(self, 'tracker'):
+            self.tracker = SyncTracker(delta=False)
+        return self.tracker
 
     @staticmethod
     def get_image_by_url(url):
         img_tmp = NamedTemporaryFile(delete=True)
         try:
-            with urlopen(url) as uo:
+            with profiling.stage('http'), urlopen(url) as uo:
                 assert uo.status == 200
-                img_tmp.write(uo.read())
-                img_tmp.flush()
+                data = uo.read()
         except HTTPError:
             return None
+        profiling.add_bytes(len(data))
+        img_tmp.write(data)
+        img_tmp.flush()
         return File(img_tmp)
 
     def create_person(self, data):
+        with profiling.stage('sync check'):
+            status, digest = self.sync.check('person', data)
+        if status == 'unchanged':
+            return self.sync.unchanged_instance('person', data)
         print(f"Processing PERSON «{data['name']}»")
         attrs = {"name": data['name'], "origin_name": data['enName']}
         try:
@@ -39,23 +61,33 @@ class Command(BaseCommand):
             photo_url = data['photo']
         except KeyError:
             photo_url = None
-        person = Person.objects.update_or_create(kinopoisk_id=data['id'],
-                                                 defaults=attrs)[0]
-        if photo_url:
+        need_photo = self.sync.need_image('person', data['id'], photo_url)
+        with profiling.stage('db'):
+            person = Person.objects.update_or_create(
+                kinopoisk_id=data['id'], defaults=attrs)[0]
+        if need_photo:
             image_file = self.get_image_by_url(photo_url)
             if image_file:
-                person.photo.save(os.path.basename(photo_url), image_file)
+                with profiling.stage('image save'):
+                    person.photo.save(os.path.basename(photo_url),
+                                      image_file)
+        self.sync.remember('person', person, digest, photo_url)
         return person
 
     def create_film(self, data):
+        with profiling.stage('sync check'):
+            status, digest = self.sync.check('film', data)
+        if status == 'unchanged':
+            return self.sync.unchanged_instance('film', data)
         print(f"Processing FILM «{data['name']}»")
         country_name = data['countries'][0]['name']
-        country = Country.objects.update_or_create(name=country_name)[0]
-        genres = []
-        for genre_data in data['genres']:
-            genre_name = genre_data['name']
-            genre = Genre.objects.update_or_create(name=genre_name)[0]
-            genres.append(genre)
+        with profiling.stage('db'):
+            country = Country.objects.update_or_create(name=country_name)[0]
+            genres = []
+            for genre_data in data['genres']:
+                genre_name = genre_data['name']
+                genre = Genre.objects.update_or_create(name=genre_name)[0]
+                genres.append(genre)
         director = None
         people = []
         for person_data in data['persons']:
@@ -78,20 +110,30 @@ class Command(BaseCommand):
         except (KeyError, IndexError):
             pass
 
-        film = Film.objects.update_or_create(kinopoisk_id=data['id'],
-                                             defaults=attrs)[0]
-        film.people.set(people)
-        film.genres.set(genres)
+        need_cover = self.sync.need_image('film', data['id'], cover_url)
+        with profiling.stage('db'):
+            film = Film.objects.update_or_create(kinopoisk_id=data['id'],
+                                                 defaults=attrs)[0]
+            film.people.set(people)
+            film.genres.set(genres)
 
-        if cover_url:
+        if need_cover:
             image_file = self.get_image_by_url(cover_url)
             if image_file:
-                film.cover.save(os.path.basename(cover_url), image_file)
+                with profiling.stage('image save'):
+                    film.cover.save(os.path.basename(cover_url), image_file)
 
+        self.sync.remember('film', film, digest, cover_url)
         return film
 
+    @staticmethod
+    def load_films():
+        with profiling.stage('load json'), \
+                open(settings.FILMS_JSON_PATH, 'r') as f:
+            return json.load(f)['docs']
+
     def create_films(self):
-        with open(GetCommand.filename(), 'r') as f:
-            films_data = json.load(f)
-            for film_data in films_data['docs']:
-                self.create_film(film_data)
+        for film_data in self.load_films():
+            self.create_film(film_data)
+        with profiling.stage('db'):
+            self.sync.flush()
@@ -1,10 +1,12 @@
-from django.core.management.base import BaseCommand, CommandError
+from django.core.management.base import CommandError
+from films import profiling
+from films.profiling import InstrumentedCommand
 from films.models import Film, SubtitleSet, SubtitleLine
 import re
 import os
 
 
-class Command(BaseCommand):
+class Command(InstrumentedCommand):
     help = 'Imports subtitle lines from a standard WebVTT file and links them to a film.'
 
     def add_arguments(self, parser):
@@ -107,7 +109,8 @@ class Command(BaseCommand):
 
         # 1. Парсинг VTT
         try:
-            subtitles_data = self.parse_vtt(vtt_path)
+            with profiling.stage('parse'):
+                subtitles_data = self.parse_vtt(vtt_path)
         except (ValueError, CommandError) as e:
             raise CommandError(f"Error during VTT parsing: {e}")
 
@@ -130,7 +133,8 @@ class Command(BaseCommand):
         self.stdout.write(f"Processing {film.name} ({lang}): {action} set.")
 
         # 4. Очищаем старые строки
-        subtitle_set.lines.all().delete()
+        with profiling.stage('db'):
+            subtitle_set.lines.all().delete()
 
         # 5. Подготавливаем и сохраняем новые строки (Bulk Create)
         new_lines = []
@@ -146,7 +150,9 @@ class Command(BaseCommand):
             ))
 
         if new_lines:
-            SubtitleLine.objects.bulk_create(new_lines)
+            with profiling.stage('db'):
+                SubtitleLine.objects.bulk_create(new_lines)
+                subtitle_set.touch()
             self.stdout.write(self.style.SUCCESS(f"  -> Imported {len(new_lines)} lines successfully."))
         else:
             self.stdout.write(self.style.WARNING(f"  -> Finished, but found no lines to import."))
\ No newline at end of file
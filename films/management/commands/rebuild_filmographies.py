@@ -0,0 +1,14 @@
+from films.profiling import InstrumentedCommand
+from films.filmography import rebuild_all
+
+
+class Command(InstrumentedCommand):
+    help = 'Rebuild denormalized filmographies for every person'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild_all(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt filmographies for {count} people"))
@@ -0,0 +1,65 @@
+from films.profiling import InstrumentedCommand
+from django.db import close_old_connections, connection
+from films import tasks
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import threading
+import time
+
+
+class Command(InstrumentedCommand):
+    help = 'Run queued background tasks (database-backed queue)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2,
+                            help='Number of worker threads.')
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit when no task is ready.')
+        parser.add_argument('--only', nargs='*',
+                            help='Task names to process.')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Requeue running tasks whose worker has '
+                                 'not sent a heartbeat for N seconds.')
+
+    def handle(self, *args, **options):
+        requeued = tasks.requeue_stale(
+            datetime.timedelta(seconds=options['stale_after']))
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale tasks")
+        self.stop = threading.Event()
+        self.options = options
+        worker = tasks.worker_name()
+        self.stdout.write(f"Worker {worker}: {options['concurrency']} threads")
+        if options['concurrency'] == 1:
+            # Без отдельных потоков: используем текущее соединение
+            return self.loop(f"{worker}/0")
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            futures = [pool.submit(self.thread, f"{worker}/{i}")
+                       for i in range(options['concurrency'])]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                self.stop.set()
+
+    def thread(self, worker):
+        try:
+            self.loop(worker)
+        finally:
+            connection.close()
+
+    def loop(self, worker):
+        while not self.stop.is_set():
+            close_old_connections()
+            task = tasks.claim(worker, self.options['only'])
+            if task is None:
+                if self.options['burst']:
+                    return
+                time.sleep(self.options['poll'])
+                continue
+            self.stdout.write(f"[{worker}] {task}")
+            ok = tasks.run(task)
+            self.stdout.write(f"[{worker}] {task.name} #{task.pk}: "
+                              + ("done" if ok else "failed"))
@@ -0,0 +1,145 @@
+from django.core.management.base import CommandError
+from films.profiling import InstrumentedCommand
+from django.db import transaction
+from films import anniversaries, facets
+from films.models import (Country, Genre, Person, Film, SubtitleSet,
+                          SubtitleLine, month_day)
+import datetime
+import random
+import uuid
+
+
+WORDS = ("ночь", "дракон", "город", "море", "тень", "огонь", "зима", "путь",
+         "дом", "звезда", "лес", "брат", "война", "мир", "сердце", "время")
+STYLES = (None, None, None, "loud", "bold", "italic")
+
+
+class Command(InstrumentedCommand):
+    help = 'Generate a synthetic catalog with bulk inserts (for benchmarks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--films', type=int, default=1000)
+        parser.add_argument('--people', type=int, default=2000)
+        parser.add_argument('--genres', type=int, default=20)
+        parser.add_argument('--countries', type=int, default=30)
+        parser.add_argument('--cast', type=int, default=8,
+                            help='Actors per film.')
+        parser.add_argument('--genres-per-film', type=int, default=2)
+        parser.add_argument('--subtitle-sets', type=int, default=10,
+                            help='Number of films that get subtitles.')
+        parser.add_argument('--languages', default='ru,en',
+                            help='Comma separated subtitle languages.')
+        parser.add_argument('--cues', type=int, default=500,
+                            help='Cues per subtitle set.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete the whole catalog first.')
+
+    def handle(self, *args, **options):
+        if options['films'] and not options['people']:
+            raise CommandError("At least one person is needed as director.")
+        self.rnd = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        with transaction.atomic():
+            if options['clear']:
+                self.clear()
+            counts = self.generate(**options)
+            # bulk_create не отправляет сигналы
+            facets.invalidate()
+            anniversaries.invalidate()
+        self.stdout.write(", ".join(f"{k}: {v}" for k, v in counts.items()))
+
+    @staticmethod
+    def clear():
+        SubtitleLine.objects.all().delete()
+        SubtitleSet.objects.all().delete()
+        Film.objects.all().delete()
+        Person.objects.all().delete()
+        Genre.objects.all().delete()
+        Country.objects.all().delete()
+
+    def title(self, n):
+        return " ".join(self.rnd.choice(WORDS) for _ in range(n)).capitalize()
+
+    def generate(self, films, people, genres, countries, cast,
+                 genres_per_film, subtitle_sets, languages, cues, **options):
+        # Уникальные имена с префиксом, чтобы повторный запуск не падал
+        # на unique-ограничениях справочников.
+        tag = uuid.uuid4().hex[:6]
+        bulk = {"batch_size": self.batch_size}
+
+        countries = Country.objects.bulk_create(
+            [Country(name=f"Страна {tag}-{i}") for i in range(countries)],
+            **bulk)
+        genres = Genre.objects.bulk_create(
+            [Genre(name=f"Жанр {tag}-{i}") for i in range(genres)], **bulk)
+
+        start = datetime.date(1930, 1, 1).toordinal()
+        people = Person.objects.bulk_create([
+            self.person(tag, i, start) for i in range(people)], **bulk)
+
+        films = Film.objects.bulk_create([
+            Film(name=self.title(self.rnd.randint(1, 4)),
+                 origin_name=f"Film {tag}-{i}",
+                 slogan=self.title(5),
+                 description=self.title(30),
+                 country=self.rnd.choice(countries),
+                 director=self.rnd.choice(people),
+                 length=self.rnd.randint(70, 200),
+                 year=self.rnd.randint(1930, 2025))
+            for i in range(films)], **bulk)
+
+        FilmGenre = Film.genres.through
+        FilmPerson = Film.people.through
+        genre_links, people_links = [], []
+        for film in films:
+            for genre in self.rnd.sample(genres,
+                                         min(genres_per_film, len(genres))):
+                genre_links.append(FilmGenre(film_id=film.id,
+                                             genre_id=genre.id))
+            for person in self.rnd.sample(people, min(cast, len(people))):
+                people_links.append(FilmPerson(film_id=film.id,
+                                               person_id=person.id))
+        FilmGenre.objects.bulk_create(genre_links, **bulk)
+        FilmPerson.objects.bulk_create(people_links, **bulk)
+
+        languages = [lang for lang in languages.split(",") if lang]
+        sets = SubtitleSet.objects.bulk_create([
+            SubtitleSet(film=film, language=lang)
+            for film in films[:subtitle_sets] for lang in languages], **bulk)
+        line_count = 0
+        for subtitle_set in sets:
+            lines = self.cues(subtitle_set, cues)
+            SubtitleLine.objects.bulk_create(lines, **bulk)
+            subtitle_set.touch()
+            line_count += len(lines)
+
+        return {"countries": len(countries), "genres": len(genres),
+                "people": len(people), "films": len(films),
+                "film_genres": len(genre_links),
+                "film_people": len(people_links),
+                "subtitle_sets": len(sets), "subtitle_lines": line_count}
+
+    def person(self, tag, i, start):
+        name = f"{self.title(2)} {i}"
+        birthday = datetime.date.fromordinal(
+            start + self.rnd.randrange(25000))
+        # bulk_create минует Person.save(), ключ дня рождения — вручную
+        return Person(name=name, origin_name=f"Person {tag}-{i}",
+                      birthday=birthday, birthday_key=month_day(birthday))
+
+    def cues(self, subtitle_set, count):
+        lines = []
+        time = 1.0
+        for _ in range(count):
+            duration = round(self.rnd.uniform(1.0, 5.0), 3)
+            lines.append(SubtitleLine(
+                subtitle_set=subtitle_set,
+                start_time=round(time, 3),
+                end_time=round(time + duration, 3),
+                text=self.title(self.rnd.randint(2, 10)),
+                name=self.rnd.choice((None, "РАССКАЗЧИК", "ИККИНГ")),
+                style_classes=self.rnd.choice(STYLES)))
+            time += duration + round(self.rnd.uniform(0.1, 2.0), 3)
+        return lines
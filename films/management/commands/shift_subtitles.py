@@ -0,0 +1,45 @@
+from django.core.management.base import CommandError
+from films.profiling import InstrumentedCommand
+from films.models import SubtitleSet
+from films.subtitles import parse_anchors
+
+
+class Command(InstrumentedCommand):
+    help = 'Shift, stretch or resync a subtitle set with a single UPDATE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinopoisk_id', type=int,
+                            help='Kinopoisk ID of the film.')
+        parser.add_argument('language_code', type=str,
+                            help='Language code (e.g., "ru", "en").')
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--offset', type=float,
+                           help='Constant offset in seconds.')
+        group.add_argument('--stretch', type=float,
+                           help='Linear factor, e.g. 1.04271 for 25/23.976.')
+        group.add_argument('--anchors',
+                           help='Piecewise resync points "old=new,old=new".')
+        parser.add_argument('--origin', type=float, default=0.0,
+                            help='Fixed point for --stretch.')
+
+    def handle(self, *args, **options):
+        try:
+            subtitle_set = SubtitleSet.objects.get(
+                film__kinopoisk_id=options['kinopoisk_id'],
+                language=options['language_code'])
+        except SubtitleSet.DoesNotExist:
+            raise CommandError("Subtitle set not found.")
+
+        try:
+            if options['offset'] is not None:
+                count = subtitle_set.shift(options['offset'])
+            elif options['stretch'] is not None:
+                count = subtitle_set.stretch(options['stretch'],
+                                             options['origin'])
+            else:
+                count = subtitle_set.resync(parse_anchors(options['anchors']))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"  -> Retimed {count} lines of {subtitle_set}."))
@@ -0,0 +1,33 @@
+from django.core.management.base import CommandError
+from films.profiling import InstrumentedCommand
+from films.staticfiles import VENDOR_ASSETS, VENDOR_DIR
+from urllib.error import URLError
+from urllib.request import urlopen
+import os
+import re
+
+# Карты исходников не скачиваются, а ссылки на них ломают collectstatic
+SOURCE_MAP = re.compile(rb'\n?/[/*]# sourceMappingURL=[^\n]*')
+
+
+class Command(InstrumentedCommand):
+    help = 'Download third-party CSS/JS/fonts into films/static/films/vendor'
+
+    def handle(self, *args, **options):
+        target_dir = os.path.join(os.path.dirname(__file__), '..', '..',
+                                  'static', VENDOR_DIR)
+        for name, url in VENDOR_ASSETS.items():
+            target = os.path.normpath(os.path.join(target_dir, name))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                with urlopen(url) as uo:
+                    data = uo.read()
+            except URLError as e:
+                raise CommandError(f"Cannot download {url}: {e}")
+            if name.endswith(('.css', '.js')):
+                data = SOURCE_MAP.sub(b'', data)
+            with open(target, 'wb') as f:
+                f.write(data)
+            self.stdout.write(f"{name}: {len(data)} bytes")
+        self.stdout.write(self.style.SUCCESS(
+            "Done. Run collectstatic to fingerprint and compress them."))
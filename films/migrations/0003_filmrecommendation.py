@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 22:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0002_subtitleset_subtitleline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='film',
+            name='recommendations_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Рекомендации пересчитаны'),
+        ),
+        migrations.CreateModel(
+            name='FilmRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('film', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='films.film', verbose_name='Фильм')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='films.film', verbose_name='Похожий фильм')),
+            ],
+            options={
+                'verbose_name': 'Похожий фильм',
+                'verbose_name_plural': 'Похожие фильмы',
+                'ordering': ['film', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('film', 'rank'), name='unique_film_recommendation_rank')],
+            },
+        ),
+    ]
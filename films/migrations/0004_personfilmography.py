@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 22:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0003_filmrecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonFilmography',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('person', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='filmography', serialize=False, to='films.person', verbose_name='Персона')),
+                ('acted_count', models.PositiveIntegerField(default=0, verbose_name='Фильмов с участием')),
+                ('directed_count', models.PositiveIntegerField(default=0, verbose_name='Снято фильмов')),
+                ('first_year', models.PositiveIntegerField(blank=True, null=True, verbose_name='Первый фильм')),
+                ('last_year', models.PositiveIntegerField(blank=True, null=True, verbose_name='Последний фильм')),
+                ('acted_films', models.JSONField(default=list, verbose_name='Фильмы')),
+                ('directed_films', models.JSONField(default=list, verbose_name='Режиссер')),
+            ],
+            options={
+                'verbose_name': 'Фильмография',
+                'verbose_name_plural': 'Фильмографии',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0005_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(max_length=50, unique=True, verbose_name='Источник')),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True, verbose_name='Синхронизировано')),
+            ],
+            options={
+                'verbose_name': 'Состояние синхронизации',
+                'verbose_name_plural': 'Состояния синхронизации',
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('kind', models.CharField(max_length=20, verbose_name='Тип')),
+                ('kinopoisk_id', models.PositiveIntegerField(verbose_name='Kinopoisk ID')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='Хэш')),
+                ('image_url', models.URLField(blank=True, max_length=1024, verbose_name='Изображение')),
+            ],
+            options={
+                'verbose_name': 'Импортированная запись',
+                'verbose_name_plural': 'Импортированные записи',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'kinopoisk_id'), name='unique_sync_record')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0006_syncstate_syncrecord'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['name', 'id'], name='films_film_name_187313_idx'),
+        ),
+    ]
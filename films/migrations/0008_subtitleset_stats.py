@@ -0,0 +1,77 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:24
+
+import hashlib
+
+from django.db import migrations, models
+
+
+# Копия films.subtitles на момент миграции: правки модуля не должны
+# менять то, что записала историческая миграция.
+
+def format_timestamp(seconds):
+    if seconds is None:
+        return "00:00:00.000"
+    ms = int(seconds * 1000)
+    s, ms = divmod(ms, 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return f"{h:02}:{m:02}:{s:02}.{ms:03}"
+
+
+def vtt_markup(text, name, style_classes):
+    if style_classes:
+        text = f"<c.{style_classes}>{text}</c>"
+    if name:
+        return f"<c.speaker>{name}:</c> {text}"
+    return text
+
+
+def cue_stats(cues):
+    count, duration = 0, 0.0
+    digest = hashlib.sha256("WEBVTT\n".encode())
+    for start, end, text, name, style_classes in cues:
+        count += 1
+        duration = max(duration, end or 0.0)
+        digest.update(
+            f"\n{format_timestamp(start)} --> {format_timestamp(end)}\n"
+            f"{vtt_markup(text, name, style_classes)}\n\n".encode())
+    return count, duration, digest.hexdigest()
+
+
+def fill_stats(apps, schema_editor):
+    SubtitleSet = apps.get_model('films', 'SubtitleSet')
+    SubtitleLine = apps.get_model('films', 'SubtitleLine')
+    for subtitle_set in SubtitleSet.objects.all():
+        cues = SubtitleLine.objects.filter(subtitle_set=subtitle_set) \
+            .order_by('start_time', 'end_time') \
+            .values_list('start_time', 'end_time', 'text', 'name',
+                         'style_classes').iterator(chunk_size=2000)
+        count, duration, content_hash = cue_stats(cues)
+        SubtitleSet.objects.filter(pk=subtitle_set.pk).update(
+            cue_count=count, duration=duration, content_hash=content_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0007_film_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subtitleset',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='sha256 файла VTT', max_length=64, verbose_name='Хеш содержимого'),
+        ),
+        migrations.AddField(
+            model_name='subtitleset',
+            name='cue_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число реплик'),
+        ),
+        migrations.AddField(
+            model_name='subtitleset',
+            name='duration',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='Длительность (с)'),
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
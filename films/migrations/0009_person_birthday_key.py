@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:32
+
+from django.db import migrations, models
+from django.db.models.functions import ExtractDay, ExtractMonth
+
+
+def fill_birthday_keys(apps, schema_editor):
+    Person = apps.get_model('films', 'Person')
+    Person.objects.filter(birthday__isnull=False).update(
+        birthday_key=ExtractMonth('birthday') * 100 + ExtractDay('birthday'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0008_subtitleset_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='birthday_key',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Месяц и день рождения'),
+        ),
+        migrations.RunPython(fill_birthday_keys, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,12 @@
 from django.db import models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 import datetime
 
+from .subtitles import cue_stats, format_timestamp, iter_cues, serialize
+
 
 class MyModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -35,6 +40,11 @@ class Genre(MyModel):
         return self.name
 
 
+def month_day(date):
+    """Ключ дня года без года: 1231 для 31 декабря (Person.birthday_key)."""
+    return date.month * 100 + date.day if date else None
+
+
 class Person(MyModel):
     name = models.CharField("Имя", max_length=400)
     origin_name = models.CharField("Имя в оригинале", max_length=400,
@@ -48,6 +58,21 @@ class Person(MyModel):
         "Фото", upload_to='photos/', blank=True, null=True)
     kinopoisk_id = models.PositiveIntegerField(
         "Kinopoisk ID", blank=True, null=True)
+    # Месяц и день рождения для выборки «родились в этот день» по индексу
+    # (см. anniversaries.py); при bulk_create заполняется вручную
+    birthday_key = models.PositiveSmallIntegerField(
+        "Месяц и день рождения", blank=True, null=True, editable=False,
+        db_index=True)
+
+    def save(self, *args, **kwargs):
+        # Импорт присваивает дату строкой ('1970-01-01')
+        self.birthday = self._meta.get_field('birthday').to_python(
+            self.birthday)
+        self.birthday_key = month_day(self.birthday)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'birthday' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'birthday_key'}
+        super().save(*args, **kwargs)
 
     def age(self):
         if not self.birthday:
@@ -89,15 +114,70 @@ class Film(MyModel):
     people = models.ManyToManyField(Person, verbose_name="Актеры")
     kinopoisk_id = models.PositiveIntegerField(
         "Kinopoisk ID", blank=True, null=True)
+    recommendations_updated_at = models.DateTimeField(
+        "Рекомендации пересчитаны", blank=True, null=True, editable=False)
 
     class Meta:
         ordering = ["name"]
+        # Порядок списка фильмов и обход при построении фасетного индекса
+        indexes = [models.Index(fields=["name", "id"])]
         verbose_name = "Фильм"
         verbose_name_plural = "Фильмы"
 
     def __str__(self):
         return self.name
 
+
+class PersonFilmography(MyModel):
+    """
+    Денормализованная фильмография персоны: одна строка на персону,
+    поддерживается сигналами (см. filmography.py).
+    """
+    person = models.OneToOneField(
+        Person, on_delete=models.CASCADE, primary_key=True,
+        related_name="filmography", verbose_name="Персона")
+    acted_count = models.PositiveIntegerField("Фильмов с участием", default=0)
+    directed_count = models.PositiveIntegerField("Снято фильмов", default=0)
+    first_year = models.PositiveIntegerField(
+        "Первый фильм", blank=True, null=True)
+    last_year = models.PositiveIntegerField(
+        "Последний фильм", blank=True, null=True)
+    # Списки [id, название, год], отсортированные по году и названию
+    acted_films = models.JSONField("Фильмы", default=list)
+    directed_films = models.JSONField("Режиссер", default=list)
+
+    class Meta:
+        verbose_name = "Фильмография"
+        verbose_name_plural = "Фильмографии"
+
+    def __str__(self):
+        return str(self.person_id)
+
+
+class FilmRecommendation(MyModel):
+    """Предрассчитанный похожий фильм (top-K соседей, см. recommendations.py)."""
+    film = models.ForeignKey(
+        Film, on_delete=models.CASCADE, related_name="recommendations",
+        verbose_name="Фильм")
+    recommended = models.ForeignKey(
+        Film, on_delete=models.CASCADE, related_name="+",
+        verbose_name="Похожий фильм")
+    score = models.FloatField("Сходство")
+    rank = models.PositiveSmallIntegerField("Место")
+
+    class Meta:
+        ordering = ["film", "rank"]
+        verbose_name = "Похожий фильм"
+        verbose_name_plural = "Похожие фильмы"
+        constraints = [
+            models.UniqueConstraint(fields=["film", "rank"],
+                                    name="unique_film_recommendation_rank"),
+        ]
+
+    def __str__(self):
+        return f"{self.film_id} -> {self.recommended_id} ({self.score:.3f})"
+
+
 class SubtitleSet(MyModel):
     """Контейнер для набора субтитров определенного языка для фильма."""
     film = models.ForeignKey(
@@ -111,6 +191,14 @@ class SubtitleSet(MyModel):
         verbose_name='Язык субтитров',
         help_text='Например, "en", "ru"'
     )
+    # Сводка по строкам для манифеста и бейджей языков (см. touch())
+    cue_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число реплик')
+    duration = models.FloatField(
+        default=0.0, editable=False, verbose_name='Длительность (с)')
+    content_hash = models.CharField(
+        max_length=64, blank=True, editable=False,
+        verbose_name='Хеш содержимого', help_text='sha256 файла VTT')
 
     class Meta:
         verbose_name = 'Набор субтитров'
@@ -122,52 +210,95 @@ class SubtitleSet(MyModel):
 
     def format_time(self, seconds):
         """Конвертирует секунды (float) в формат VTT (00:00:00.000)"""
-        if seconds is None:
-            return "00:00:00.000"
-
-        ms = int(seconds * 1000)
-        h = ms // 3600000
-        ms %= 3600000
-        m = ms // 60000
-        ms %= 60000
-        s = ms // 1000
-        ms %= 1000
-
-        return f"{h:02}:{m:02}:{s:02}.{ms:03}"
+        return format_timestamp(seconds)
 
     def generate_vtt(self):
         """
         Генерирует полный VTT-файл из строк, хранящихся в базе.
         """
-        vtt_lines = ["WEBVTT\n"]
-
-        # Загружаем все строки, отсортированные по времени
-        lines = self.lines.all().order_by('start_time')
-
-        for line in lines:
-            # 1. Тайминги: 00:00:00.000 --> 00:00:00.000
-            start_time = self.format_time(line.start_time)
-            end_time = self.format_time(line.end_time)
-            vtt_lines.append(f"{start_time} --> {end_time}")
+        return serialize(self, 'vtt')
 
-            # 2. Текст с VTT-тегами:
-            text_parts = []
+    # ---- Синхронизация: один UPDATE по всем строкам набора ----
 
-            # Добавляем имя говорящего, если есть (используем тег <c.speaker>)
-            if line.name:
-                text_parts.append(f"<c.speaker>{line.name}:</c>")
-
-            # Добавляем текст, обернутый в стиль, если есть
-            if line.style_classes:
-                # В SubtitleLine.style_classes должно быть имя класса (например, 'loud')
-                text_parts.append(f"<c.{line.style_classes}>{line.text}</c>")
-            else:
-                text_parts.append(line.text)
-
-            vtt_lines.append(" ".join(text_parts))
-            vtt_lines.append("\n") # Пустая строка для разделения блоков VTT
+    def retime(self, mapping):
+        """
+        Применяет mapping(field) -> выражение к start_time и end_time всех
+        строк одним UPDATE. Время не уходит в минус.
+        """
+        now = timezone.now()
+        count = self.lines.update(
+            start_time=Greatest(mapping('start_time'), Value(0.0)),
+            end_time=Greatest(mapping('end_time'), Value(0.0)),
+            updated_at=now)
+        self.touch(now)
+        return count
+
+    def touch(self, now=None):
+        """
+        Отмечает изменение строк набора: обновляет updated_at и сводку
+        (число реплик, длительность, хеш). Строки меняются пакетно (UPDATE,
+        bulk_create), минуя save(), а по updated_at набора сбрасываются
+        кэши (например, двуязычных субтитров).
+        """
+        self.cue_count, self.duration, self.content_hash = \
+            cue_stats(iter_cues(self))
+        self.updated_at = now or timezone.now()
+        SubtitleSet.objects.filter(pk=self.pk).update(
+            updated_at=self.updated_at, cue_count=self.cue_count,
+            duration=self.duration, content_hash=self.content_hash)
+
+    @staticmethod
+    def languages_by_film(film_ids):
+        """{film_id: [(язык, число реплик)]} одним запросом."""
+        languages = {}
+        for film_id, language, cue_count in SubtitleSet.objects.filter(
+                film_id__in=film_ids).order_by('language') \
+                .values_list('film_id', 'language', 'cue_count'):
+            languages.setdefault(film_id, []).append((language, cue_count))
+        return languages
+
+    def shift(self, offset):
+        """Сдвигает все строки на offset секунд."""
+        return self.retime(lambda field: F(field) + offset)
+
+    def stretch(self, factor, origin=0.0):
+        """
+        Растягивает время относительно origin (например, 25/23.976 при
+        неверной частоте кадров).
+        """
+        if factor <= 0:
+            raise ValueError("Коэффициент должен быть положительным.")
+        return self.retime(
+            lambda field: (F(field) - origin) * factor + origin)
 
-        return "\n".join(vtt_lines)
+    def resync(self, anchors):
+        """
+        Кусочно-линейная пересинхронизация по опорным точкам
+        [(старое время, новое время), ...]. За крайними точками действуют
+        крайние отрезки; одна точка — обычный сдвиг.
+        """
+        anchors = sorted(anchors)
+        if not anchors:
+            raise ValueError("Нужна хотя бы одна опорная точка.")
+        if len(anchors) == 1:
+            old, new = anchors[0]
+            return self.shift(new - old)
+        segments = []
+        for (old1, new1), (old2, new2) in zip(anchors, anchors[1:]):
+            if old2 <= old1 or new2 <= new1:
+                raise ValueError("Опорные точки должны возрастать.")
+            segments.append((old1, new1, (new2 - new1) / (old2 - old1)))
+
+        def mapping(field):
+            def segment(old, new, factor):
+                return (F(field) - old) * factor + new
+            return Case(
+                *[When(**{f"{field}__lt": anchors[i + 1][0]},
+                       then=segment(*segments[i]))
+                  for i in range(len(segments) - 1)],
+                default=segment(*segments[-1]),
+                output_field=models.FloatField())
+        return self.retime(mapping)
 
 
 class SubtitleLine(MyModel):
@@ -208,4 +339,111 @@ class SubtitleLine(MyModel):
         ordering = ['start_time', 'end_time']
 
     def __str__(self):
-        return f"[{self.start_time:.2f}] {self.text[:40]}..."
\ No newline at end of file
+        return f"[{self.start_time:.2f}] {self.text[:40]}..."
+
+
+class Task(MyModel):
+    """Фоновая задача в очереди на базе данных (см. tasks.py)."""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Готово"),
+        (FAILED, "Ошибка"),
+    ]
+
+    name = models.CharField("Задача", max_length=100)
+    kwargs = models.JSONField("Параметры", default=dict, blank=True)
+    status = models.CharField("Статус", max_length=10, choices=STATUSES,
+                              default=PENDING)
+    attempts = models.PositiveSmallIntegerField("Попыток", default=0)
+    max_attempts = models.PositiveSmallIntegerField("Максимум попыток",
+                                                    default=3)
+    run_after = models.DateTimeField("Не раньше", default=timezone.now)
+    progress = models.PositiveIntegerField("Выполнено", default=0)
+    total = models.PositiveIntegerField("Всего", blank=True, null=True)
+    message = models.CharField("Сообщение", max_length=255, blank=True)
+    error = models.TextField("Ошибка", blank=True)
+    worker = models.CharField("Обработчик", max_length=100, blank=True)
+    started_at = models.DateTimeField("Начата", blank=True, null=True)
+    finished_at = models.DateTimeField("Завершена", blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Задача"
+        verbose_name_plural = "Задачи"
+        indexes = [
+            models.Index(fields=["status", "run_after"],
+                         name="task_status_run_after_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+
+    def percent(self):
+        if not self.total:
+            return None
+        return min(100, round(self.progress * 100 / self.total))
+
+    def set_progress(self, progress, total=None, message=None):
+        """Сохраняет прогресс, не трогая остальные поля задачи."""
+        fields = {"progress": progress, "updated_at": timezone.now()}
+        if total is not None:
+            fields["total"] = total
+        if message is not None:
+            fields["message"] = message[:255]
+        Task.objects.filter(pk=self.pk).update(**fields)
+        for field, value in fields.items():
+            setattr(self, field, value)
+
+
+class SyncState(MyModel):
+    """Время последней успешной синхронизации с внешним источником."""
+    key = models.CharField("Источник", max_length=50, unique=True)
+    last_synced_at = models.DateTimeField("Синхронизировано", blank=True,
+                                          null=True)
+
+    class Meta:
+        verbose_name = "Состояние синхронизации"
+        verbose_name_plural = "Состояния синхронизации"
+
+    def __str__(self):
+        return self.key
+
+
+class DataVersion(MyModel):
+    """
+    Версия данных, по которой процессы сбрасывают свои кэши в памяти
+    (индекс фасетов): строка в базе видна всем процессам сразу.
+    """
+    key = models.CharField("Ключ", max_length=50, unique=True)
+    version = models.CharField("Версия", max_length=32)
+
+    class Meta:
+        verbose_name = "Версия данных"
+        verbose_name_plural = "Версии данных"
+
+    def __str__(self):
+        return f"{self.key} {self.version}"
+
+
+class SyncRecord(MyModel):
+    """Хэш содержимого импортированной записи для пропуска неизменных."""
+    kind = models.CharField("Тип", max_length=20)
+    kinopoisk_id = models.PositiveIntegerField("Kinopoisk ID")
+    content_hash = models.CharField("Хэш", max_length=64)
+    image_url = models.URLField("Изображение", max_length=1024, blank=True)
+
+    class Meta:
+        verbose_name = "Импортированная запись"
+        verbose_name_plural = "Импортированные записи"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "kinopoisk_id"],
+                                    name="unique_sync_record"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.kinopoisk_id}"
@@ -0,0 +1,217 @@
+"""
+Замеры для management-команд: время по этапам, запросы к базе, скачанные
+байты, пиковая память и (по желанию) cProfile.
+
+Команды приложения наследуют ``InstrumentedCommand`` и получают ключи
+``--stats`` и ``--profile FILE``. Код размечает этапы так::
+
+    with profiling.stage('http'):
+        data = download(url)
+    profiling.add_bytes(len(data))
+
+Без активного замера ``stage()`` и ``add_bytes()`` ничего не делают.
+Учитывается только поток, запустивший команду.
+"""
+import contextlib
+import cProfile
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+OTHER = 'other'
+
+_active = None
+
+
+class Profiler:
+    def __init__(self):
+        self.thread = threading.get_ident()
+        self.times = {}
+        self.calls = {}
+        self.queries = {}
+        self.bytes = 0
+        self.stack = [OTHER]
+        self.switched_at = self.started_at = time.perf_counter()
+
+    def _charge(self):
+        # Время до переключения относится к этапу на вершине стека, поэтому
+        # вложенные этапы не учитываются дважды.
+        now = time.perf_counter()
+        top = self.stack[-1]
+        self.times[top] = self.times.get(top, 0) + now - self.switched_at
+        self.switched_at = now
+
+    def enter(self, name):
+        self._charge()
+        self.stack.append(name)
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def exit(self):
+        self._charge()
+        self.stack.pop()
+
+    def count_query(self, execute, sql, params, many, context):
+        if threading.get_ident() == self.thread:
+            top = self.stack[-1]
+            self.queries[top] = self.queries.get(top, 0) + 1
+        return execute(sql, params, many, context)
+
+    def finish(self):
+        self._charge()
+        self.total = time.perf_counter() - self.started_at
+
+    def rows(self):
+        names = sorted(set(self.times) | set(self.queries),
+                       key=lambda name: -self.times.get(name, 0))
+        return [(name, self.calls.get(name, 1 if name == OTHER else 0),
+                 self.times.get(name, 0), self.queries.get(name, 0))
+                for name in names]
+
+    def report(self):
+        lines = [f"{'stage':<24} {'calls':>8} {'time, s':>10} {'%':>6}"
+                 f" {'queries':>8}"]
+        for name, calls, seconds, queries in self.rows():
+            share = seconds / self.total * 100 if self.total else 0
+            lines.append(f"{name:<24} {calls:>8} {seconds:>10.3f}"
+                         f" {share:>6.1f} {queries:>8}")
+        lines.append(f"{'total':<24} {'':>8} {self.total:>10.3f}"
+                     f" {100:>6.1f} {sum(self.queries.values()):>8}")
+        lines.append(f"downloaded: {format_bytes(self.bytes)}, "
+                     f"peak RSS: {format_bytes(peak_rss())}")
+        return "\n".join(lines)
+
+
+def peak_rss():
+    """Пиковый размер резидентной памяти процесса в байтах (или None)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def format_bytes(value):
+    if value is None:
+        return "n/a"
+    for unit in ("B", "KiB", "MiB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" \
+                else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GiB"
+
+
+def import_times(argv, settings_module=None):
+    """
+    Запускает ``python -X importtime manage.py <argv>`` отдельным процессом.
+    Возвращает {модуль: (своё время, накопленное время) в мкс} и время
+    работы процесса в секундах.
+    """
+    env = dict(os.environ)
+    if settings_module:
+        env['DJANGO_SETTINGS_MODULE'] = settings_module
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime',
+         str(settings.BASE_DIR / 'manage.py'), *argv],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        if own.strip().isdigit():
+            modules[name.strip()] = (int(own), int(cumulative))
+    return modules, elapsed
+
+
+def _current():
+    if _active is not None and threading.get_ident() == _active.thread:
+        return _active
+    return None
+
+
+@contextlib.contextmanager
+def stage(name):
+    profiler = _current()
+    if profiler is None:
+        yield
+        return
+    profiler.enter(name)
+    try:
+        yield
+    finally:
+        profiler.exit()
+
+
+def add_bytes(count):
+    profiler = _current()
+    if profiler is not None:
+        profiler.bytes += count
+
+
+@contextlib.contextmanager
+def session(profile_path=None):
+    """Включает замер на время блока; отдаёт Profiler для отчёта."""
+    global _active
+    profiler = Profiler()
+    _active = profiler
+    cprofile = cProfile.Profile() if profile_path else None
+    with contextlib.ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(
+                connections[alias].execute_wrapper(profiler.count_query))
+        if cprofile:
+            cprofile.enable()
+        try:
+            yield profiler
+        finally:
+            if cprofile:
+                cprofile.disable()
+                cprofile.dump_stats(profile_path)
+            profiler.finish()
+            _active = None
+
+
+class InstrumentedCommand(BaseCommand):
+    """BaseCommand с ключами --stats и --profile для всех команд films."""
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='Print per-stage timings, SQL query counts, downloaded '
+                 'bytes and peak RSS when the command finishes.')
+        parser.add_argument(
+            '--profile', metavar='FILE',
+            help='Write cProfile data to FILE (implies --stats).')
+        return parser
+
+    def execute(self, *args, **options):
+        if getattr(settings, 'SKIP_COMMAND_CHECKS', False):
+            # filmbase.settings_batch: проверки тянут весь веб-стек
+            options['skip_checks'] = True
+        if not (options.get('stats') or options.get('profile')):
+            return super().execute(*args, **options)
+        profiler = None
+        try:
+            with session(options.get('profile')) as profiler:
+                return super().execute(*args, **options)
+        finally:
+            # Отчёт печатается и при ошибке — он тоже полезен
+            if profiler is not None:
+                self.stderr.write(profiler.report())
+                if options.get('profile'):
+                    self.stderr.write(f"cProfile data: {options['profile']}")
@@ -0,0 +1,113 @@
+"""
+Ограничение частоты поиска и автодополнения.
+
+Каждый клиент (пользователь или IP) получает по ведру токенов на группу
+представлений (scope): токены копятся со скоростью rate в секунду до
+burst, каждый запрос тратит один. Пустое ведро — ответ 429 с
+Retry-After, через сколько секунд появится следующий токен. Состояние
+вёдер хранится в кэше FILMS_RATE_LIMIT_CACHE; у locmem оно своё в каждом
+процессе, общий кэш (Redis, Memcached) делает лимит общим.
+
+Кроме того, в процессе одновременно выполняется не больше concurrency
+запросов группы: лишние сразу получают 429, а не ждут в очереди к
+файлу SQLite, пока поиск тормозит у всех.
+"""
+import functools
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+# Группа -> (токенов в секунду, размер ведра, одновременных запросов)
+DEFAULT_LIMITS = {
+    'search': (1.0, 20, 4),
+    'autocomplete': (5.0, 30, 4),
+}
+
+_lock = threading.Lock()
+_semaphores = {}
+
+
+def limits(scope):
+    """Бюджет группы или None, если она не ограничена."""
+    return getattr(settings, 'FILMS_RATE_LIMITS', DEFAULT_LIMITS).get(scope)
+
+
+def client_key(request):
+    user = request.user
+    if user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def take(scope, key, now=None):
+    """
+    Берёт токен из ведра клиента. Возвращает 0, если запрос можно
+    выполнить, иначе число секунд до следующего токена.
+    """
+    rate, burst, _ = limits(scope)
+    now = time.time() if now is None else now
+    cache = caches[getattr(settings, 'FILMS_RATE_LIMIT_CACHE', 'default')]
+    cache_key = f"ratelimit:{scope}:{key}"
+    # Чтение и запись не атомарны между процессами: лимит приблизительный
+    with _lock:
+        tokens, stamp = cache.get(cache_key, (burst, now))
+        tokens = min(burst, tokens + max(0, now - stamp) * rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        if not wait:
+            tokens -= 1
+        # Хранится, пока ведро не наполнится: полное вернёт default
+        cache.set(cache_key, (tokens, now),
+                  timeout=math.ceil((burst - tokens) / rate) + 1)
+    return wait
+
+
+def semaphore(scope, concurrency):
+    with _lock:
+        key = (scope, concurrency)
+        if key not in _semaphores:
+            _semaphores[key] = threading.BoundedSemaphore(concurrency)
+        return _semaphores[key]
+
+
+def too_many_requests(wait):
+    response = HttpResponse("Слишком много запросов, повторите позже.",
+                            status=429,
+                            content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+def rate_limited(scope, when=None):
+    """
+    Декоратор представления. when(request) решает, тратит ли запрос
+    токен (например, только при поисковой строке).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            budget = limits(scope)
+            if budget is None or (when is not None and not when(request)):
+                return view(request, *args, **kwargs)
+            key = client_key(request)
+            wait = take(scope, key)
+            if wait:
+                logger.debug("%s: %s throttled for %.1fs", scope, key, wait)
+                return too_many_requests(wait)
+            gate = semaphore(scope, budget[2])
+            if not gate.acquire(blocking=False):
+                logger.warning("%s: overloaded, request from %s shed",
+                               scope, key)
+                return too_many_requests(1)
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                gate.release()
+        return wrapper
+    return decorator
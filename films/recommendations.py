@@ -0,0 +1,129 @@
+"""
+Оффлайн-расчёт похожих фильмов.
+
+Фильм описывается разреженным вектором признаков: жанры, актёры и режиссёр,
+каждый со своим весом, умноженным на IDF признака. Сходство — косинус между
+векторами. Вместо полного перебора пар используется инвертированный индекс
+(признак -> фильмы), то есть умножение разреженной матрицы фильм×признак на
+её транспонированную только по ненулевым элементам. Признаки, которые есть
+у слишком многих фильмов (``max_df``), в подборе кандидатов не участвуют.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Film, FilmRecommendation
+
+TOP_K = 10
+MAX_DF = 5000
+WEIGHTS = {"genre": 1.0, "actor": 1.5, "director": 2.0}
+
+
+def load_features():
+    """Возвращает {film_id: {(тип, id): вес}} за три запроса."""
+    features = defaultdict(dict)
+    for film_id, genre_id in Film.genres.through.objects.values_list(
+            'film_id', 'genre_id').iterator():
+        features[film_id][("genre", genre_id)] = WEIGHTS["genre"]
+    for film_id, person_id in Film.people.through.objects.values_list(
+            'film_id', 'person_id').iterator():
+        features[film_id][("actor", person_id)] = WEIGHTS["actor"]
+    for film_id, director_id in Film.objects.values_list(
+            'id', 'director_id').iterator():
+        features[film_id][("director", director_id)] = WEIGHTS["director"]
+    return features
+
+
+def build_index(features):
+    index = defaultdict(list)
+    for film_id, film_features in features.items():
+        for feature in film_features:
+            index[feature].append(film_id)
+    return index
+
+
+def weigh(features, index):
+    """Умножает веса на IDF и считает нормы векторов."""
+    total = len(features)
+    norms = {}
+    for film_id, film_features in features.items():
+        for feature, weight in film_features.items():
+            film_features[feature] = weight * math.log(
+                1 + total / len(index[feature]))
+        norms[film_id] = math.sqrt(
+            sum(w * w for w in film_features.values())) or 1.0
+    return norms
+
+
+def neighbours(film_id, features, index, norms, top_k, max_df):
+    scores = defaultdict(float)
+    for feature, weight in features[film_id].items():
+        films = index[feature]
+        if len(films) > max_df:
+            continue
+        for other_id in films:
+            if other_id != film_id:
+                scores[other_id] += weight * features[other_id][feature]
+    norm = norms[film_id]
+    return heapq.nlargest(
+        top_k, ((score / (norm * norms[other_id]), other_id)
+                for other_id, score in scores.items()))
+
+
+def affected_films(features, index, max_df):
+    """
+    Фильмы, чьи рекомендации устарели: изменённые после последнего расчёта,
+    фильмы с общими (не слишком частыми) признаками и фильмы, у которых
+    изменённые стоят в рекомендациях.
+    """
+    stale = set(Film.objects.filter(
+        Q(recommendations_updated_at__isnull=True)
+        | Q(recommendations_updated_at__lt=F('updated_at'))
+    ).values_list('id', flat=True))
+    affected = set(stale)
+    for film_id in stale:
+        for feature in features.get(film_id, ()):
+            if len(index[feature]) <= max_df:
+                affected.update(index[feature])
+    affected.update(FilmRecommendation.objects.filter(
+        recommended_id__in=stale).values_list('film_id', flat=True))
+    return affected
+
+
+def chunked(items, size=900):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def rebuild(full=False, top_k=TOP_K, max_df=MAX_DF):
+    """Пересчитывает рекомендации. Возвращает число обработанных фильмов."""
+    features = load_features()
+    index = build_index(features)
+    film_ids = set(features) if full \
+        else affected_films(features, index, max_df) & set(features)
+    norms = weigh(features, index)
+    now = timezone.now()
+
+    with transaction.atomic():
+        if full:
+            FilmRecommendation.objects.all().delete()
+        for chunk in chunked(sorted(film_ids)):
+            rows = [
+                FilmRecommendation(film_id=film_id, recommended_id=other_id,
+                                   score=score, rank=rank)
+                for film_id in chunk
+                for rank, (score, other_id) in enumerate(neighbours(
+                    film_id, features, index, norms, top_k, max_df), start=1)
+            ]
+            if not full:
+                FilmRecommendation.objects.filter(film_id__in=chunk).delete()
+            FilmRecommendation.objects.bulk_create(rows, batch_size=2000)
+            # update() не трогает auto_now, поэтому updated_at остаётся прежним
+            Film.objects.filter(id__in=chunk).update(
+                recommendations_updated_at=now)
+    return len(film_ids)
@@ -0,0 +1,108 @@
+"""
+Обработчики сигналов, которые поддерживают производные данные в актуальном
+состоянии. Подключаются в FilmsConfig.ready().
+"""
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import anniversaries, facets
+from .filmography import film_person_ids, schedule_refresh
+from .models import Country, Film, FilmRecommendation, Genre, Person
+
+
+@receiver(m2m_changed, sender=Film.genres.through)
+@receiver(m2m_changed, sender=Film.people.through)
+def touch_film(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Изменение жанров и актёров не проходит через Film.save(), поэтому
+    updated_at обновляется вручную: по нему определяются устаревшие
+    рекомендации и кэши.
+    """
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            Film.objects.filter(id=instance.id).update(
+                updated_at=timezone.now())
+        return
+    # instance — жанр или персона, pk_set — идентификаторы фильмов
+    if action in ("post_add", "post_remove"):
+        films = Film.objects.filter(id__in=pk_set)
+    elif action == "pre_clear":
+        films = Film.objects.filter(id__in=sender.objects.filter(
+            **{instance._meta.model_name: instance}).values('film_id'))
+    else:
+        return
+    films.update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Film)
+def invalidate_recommendations(sender, instance, **kwargs):
+    """Фильмы, которым рекомендован удаляемый фильм, пересчитываются заново."""
+    Film.objects.filter(id__in=FilmRecommendation.objects.filter(
+        recommended=instance).values('film_id')).update(
+        recommendations_updated_at=None)
+
+
+@receiver(m2m_changed, sender=Film.people.through)
+def update_cast_filmographies(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    if reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            schedule_refresh([instance.pk])
+    elif action == "pre_clear":
+        schedule_refresh(sender.objects.filter(film_id=instance.pk)
+                         .values_list('person_id', flat=True))
+    elif action in ("post_add", "post_remove"):
+        schedule_refresh(pk_set)
+
+
+@receiver(pre_save, sender=Film)
+def remember_director(sender, instance, raw=False, **kwargs):
+    instance._old_director_id = None
+    if instance.pk and not raw:
+        instance._old_director_id = Film.objects.filter(
+            pk=instance.pk).values_list('director_id', flat=True).first()
+
+
+@receiver(post_save, sender=Film)
+def update_film_filmographies(sender, instance, raw=False, **kwargs):
+    """Название, год и режиссер фильма входят в фильмографии его персон."""
+    if raw:
+        return
+    schedule_refresh(film_person_ids(instance.pk)
+                     | {getattr(instance, '_old_director_id', None)})
+
+
+@receiver(pre_delete, sender=Film)
+def remember_film_people(sender, instance, **kwargs):
+    instance._filmography_people = film_person_ids(instance.pk)
+
+
+@receiver(post_delete, sender=Film)
+def update_deleted_film_filmographies(sender, instance, **kwargs):
+    schedule_refresh(getattr(instance, '_filmography_people', ()))
+
+
+@receiver(post_save, sender=Film)
+@receiver(post_delete, sender=Film)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def invalidate_facets(sender, **kwargs):
+    facets.invalidate()
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+@receiver(post_save, sender=Film)
+@receiver(post_delete, sender=Film)
+def invalidate_anniversaries(sender, **kwargs):
+    anniversaries.invalidate()
+
+
+@receiver(m2m_changed, sender=Film.genres.through)
+def invalidate_genre_facets(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        facets.invalidate()
@@ -0,0 +1,124 @@
+"""
+Карта сайта для поисковых роботов: индекс и шарды до 50 000 адресов.
+
+Шард — диапазон первичных ключей [n * SHARD_SIZE, (n + 1) * SHARD_SIZE)
+одной модели: строки читаются по индексу id без OFFSET, а адресов в шарде
+не больше SHARD_SIZE. Шард отдаётся потоком и по ходу сжимается в кэш.
+Ключ кэша включает наибольший updated_at и число строк диапазона, поэтому
+заново строятся только шарды, в которых что-то изменилось.
+"""
+import hashlib
+import zlib
+
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from django.urls import reverse
+from django.utils.html import escape
+
+from .models import Country, Film, Genre, Person
+
+SHARD_SIZE = 50000
+CHUNK_SIZE = 2000
+CACHE_TIMEOUT = 60 * 60 * 24
+
+CONTENT_TYPE = 'application/xml; charset=utf-8'
+NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+SECTIONS = {
+    'films': (Film, 'films:film_detail'),
+    'people': (Person, 'films:person_detail'),
+    'countries': (Country, 'films:country_detail'),
+    'genres': (Genre, 'films:genre_detail'),
+}
+
+# Заглушка id: адрес объекта собирается один раз, а не reverse() на строку
+PLACEHOLDER = 2147483647
+
+
+def lastmod(value):
+    return value.isoformat(timespec='seconds')
+
+
+def bounds(shard):
+    return shard * SHARD_SIZE, (shard + 1) * SHARD_SIZE
+
+
+def shards(section):
+    """[(номер шарда, наибольший updated_at)] — один GROUP BY по id."""
+    model, _ = SECTIONS[section]
+    return list(model.objects.annotate(shard=F('id') / SHARD_SIZE)
+                .values('shard').annotate(lastmod=Max('updated_at'))
+                .order_by('shard').values_list('shard', 'lastmod'))
+
+
+def shard_stamp(section, shard):
+    """{'lastmod': ..., 'count': ...} строк шарда (диапазон по индексу)."""
+    model, _ = SECTIONS[section]
+    low, high = bounds(shard)
+    return model.objects.filter(id__gte=low, id__lt=high).aggregate(
+        lastmod=Max('updated_at'), count=Count('id'))
+
+
+def render_index(request):
+    entries = []
+    for section in SECTIONS:
+        for shard, updated_at in shards(section):
+            location = request.build_absolute_uri(reverse(
+                'films:sitemap_shard', args=[section, shard]))
+            entries.append(f'<sitemap><loc>{escape(location)}</loc>'
+                           f'<lastmod>{lastmod(updated_at)}</lastmod>'
+                           f'</sitemap>\n')
+    return (f'{HEADER}<sitemapindex xmlns="{NAMESPACE}">\n'
+            + ''.join(entries) + '</sitemapindex>\n')
+
+
+def url_parts(request, section):
+    _, url_name = SECTIONS[section]
+    location = escape(request.build_absolute_uri(
+        reverse(url_name, args=[PLACEHOLDER])))
+    return location.split(str(PLACEHOLDER))
+
+
+def render_shard(section, shard, prefix, suffix):
+    """Генератор XML шарда пачками по CHUNK_SIZE адресов."""
+    model, _ = SECTIONS[section]
+    low, high = bounds(shard)
+    rows = model.objects.filter(id__gte=low, id__lt=high).order_by('id') \
+        .values_list('id', 'updated_at').iterator(chunk_size=CHUNK_SIZE)
+    yield f'{HEADER}<urlset xmlns="{NAMESPACE}">\n'
+    batch = []
+    for pk, updated_at in rows:
+        batch.append(f'<url><loc>{prefix}{pk}{suffix}</loc>'
+                     f'<lastmod>{lastmod(updated_at)}</lastmod></url>\n')
+        if len(batch) == CHUNK_SIZE:
+            yield ''.join(batch)
+            batch = []
+    yield ''.join(batch) + '</urlset>\n'
+
+
+def cache_key(section, shard, prefix, stamp):
+    # Адреса абсолютные, поэтому в ключе и хост со схемой
+    site = hashlib.md5(prefix.encode()).hexdigest()[:12]
+    return (f"sitemap:{section}:{shard}:{site}:"
+            f"{stamp['lastmod'].timestamp()}:{stamp['count']}")
+
+
+def cached_shard(key):
+    """Сжатый gzip шард из кэша или None."""
+    return cache.get(key)
+
+
+def stream_to_cache(chunks, key):
+    """
+    Отдаёт куски дальше и сжимает их в gzip для кэша: в памяти держится
+    только сжатый шард. Если клиент оборвал передачу, кэш не пишется.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    compressed = []
+    for chunk in chunks:
+        data = chunk.encode()
+        compressed.append(compressor.compress(data))
+        yield data
+    compressed.append(compressor.flush())
+    cache.set(key, b''.join(compressed), CACHE_TIMEOUT)
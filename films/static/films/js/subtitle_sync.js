@@ -2,70 +2,68 @@
 
 /**
  * Инициализирует логику синхронизации кастомных субтитров с YouTube-плеером.
- * @param {string} vttUrl - URL для загрузки VTT-файла из Django (который генерируется из БД).
+ * @param {string} cuesUrl - URL индекса реплик (формат cues.json, см. films/subtitles.py).
  * @param {string} playerIframeId - ID элемента iframe YouTube плеера ('youtube-player').
  * @param {string} overlayElementId - ID элемента-контейнера для отображения субтитров ('custom-subtitle-overlay').
  */
-function initializeSubtitleSync(vttUrl, playerIframeId, overlayElementId) {
+function initializeSubtitleSync(cuesUrl, playerIframeId, overlayElementId) {
 
     var player;
-    var subtitles = [];
     var subtitleOverlay = document.getElementById(overlayElementId);
     var currentCueIndex = -1;
-    var updateInterval;
+    var frameRequest = null;
+
+    // Индекс реплик: начало и конец в миллисекундах, отсортированы по началу
+    var starts = new Int32Array(0);
+    var ends = new Int32Array(0);
+    // reach[i] — наибольший конец среди реплик 0..i: по нему поиск назад
+    // останавливается, когда раньше начавшиеся реплики уже закончились
+    var reach = new Int32Array(0);
+    var textIndex = [];
+    var textTable = [];
+    var htmlCache = [];
 
     // ------------------- Вспомогательные функции --------------------
 
     /**
-     * Конвертация VTT времени (00:00:00.000) в секунды (float).
+     * Загружает индекс в типизированные массивы (без разбора текста).
      */
-    function timeToSeconds(timeStr) {
-        var parts = timeStr.split(/[:,.]/);
-        var seconds = 0;
-        if (parts.length === 4) {
-            seconds += parseInt(parts[0]) * 3600; // Часы
-            seconds += parseInt(parts[1]) * 60;   // Минуты
-            seconds += parseInt(parts[2]);        // Секунды
-            seconds += parseInt(parts[3]) / 1000; // Миллисекунды
+    function loadCueIndex(data) {
+        var count = data.start.length;
+        starts = Int32Array.from(data.start);
+        ends = Int32Array.from(data.end);
+        reach = new Int32Array(count);
+        var maxEnd = 0;
+        for (var i = 0; i < count; i++) {
+            maxEnd = Math.max(maxEnd, ends[i]);
+            reach[i] = maxEnd;
         }
-        return seconds;
+        textIndex = data.text;
+        textTable = data.table;
+        htmlCache = new Array(textTable.length);
     }
 
     /**
-     * Парсит VTT данные с помощью RegExp (синхронно).
-     * Работает надежнее, чем нативный парсер, если VTT-формат не идеален.
+     * Номер реплики, которая идет в момент ms, или -1. Двоичный поиск
+     * последней реплики с началом <= ms, затем проверка пересекающихся.
      */
-    function parseVTT(vttData) {
-        var lines = vttData.split('\n');
-        var cues = [];
-        // Простой и надежный RegEx для таймингов
-        var timingRegex = /(\d{2}:\d{2}:\d{2}\.\d{3})\s+-->\s+(\d{2}:\d{2}:\d{2}\.\d{3})\s*(.*)/;
-
-        for (var i = 1; i < lines.length; i++) {
-            var timingMatch = lines[i].match(timingRegex);
-
-            if (timingMatch) {
-                var startTime = timeToSeconds(timingMatch[1]);
-                var endTime = timeToSeconds(timingMatch[2]);
-                var classes = timingMatch[3].trim();
-                var textLine = lines[i + 1] || '';
-
-                // Пропускаем строки до следующего блока
-                while (lines[i] !== undefined && lines[i].trim() !== '' && !lines[i].includes('-->')) {
-                    i++;
-                }
-
-                cues.push({
-                    start: startTime,
-                    end: endTime,
-                    // Текст с VTT-тегами (<c.speaker> и т.д.)
-                    text: textLine.trim(),
-                    classes: classes
-                });
+    function findCue(ms) {
+        var low = 0;
+        var high = starts.length;
+        while (low < high) {
+            var middle = (low + high) >>> 1;
+            if (starts[middle] <= ms) {
+                low = middle + 1;
+            } else {
+                high = middle;
             }
         }
-        console.log("LOG: Синхронный парсер завершен. Найдено строк:", cues.length); // ЛОГ
-        return cues;
+        for (var i = low - 1; i >= 0 && reach[i] > ms; i--) {
+            if (ends[i] > ms) {
+                return i;
+            }
+        }
+        return -1;
     }
 
     /**
@@ -78,8 +76,7 @@ function initializeSubtitleSync(vttUrl, playerIframeId, overlayElementId) {
 
         // 1. Обработка тегов <c.class> -> <span class="class">
         htmlText = htmlText.replace(/<c\.([^>]+)>/g, function(match, classNames) {
-        // Теперь classNames определен и содержит список классов, разделенных пробелами.
-            return '<span class="' + classNames.trim() + '">';
+            return '<span class="' + classNames.split('.').join(' ').trim() + '">';
         });
 
         htmlText = htmlText.replace(/<\/c>/g, '</span>');
@@ -88,6 +85,14 @@ function initializeSubtitleSync(vttUrl, playerIframeId, overlayElementId) {
         return `<span class="subtitle-line-text">${htmlText}</span>`;
     }
 
+    function cueHtml(index) {
+        var textId = textIndex[index];
+        if (htmlCache[textId] === undefined) {
+            htmlCache[textId] = formatTextForOverlay(textTable[textId]);
+        }
+        return htmlCache[textId];
+    }
+
     // ------------------- Логика плеера и синхронизации --------------------
 
     // Вызывается YouTube API, когда оно загружено
@@ -106,56 +111,45 @@ function initializeSubtitleSync(vttUrl, playerIframeId, overlayElementId) {
             }
         });
 
-        // 2. Асинхронная загрузка VTT-данных (получение текста)
-        fetch(vttUrl)
+        fetch(cuesUrl)
             .then(response => {
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
                 }
-                return response.text();
-            })
-            .then(vttData => {
-                console.log("LOG: VTT текст успешно получен. Размер:", vttData.length); // ЛОГ
-                // Синхронный парсинг текста
-                subtitles = parseVTT(vttData);
+                return response.json();
             })
-            .catch(error => console.error('Ошибка загрузки или парсинга субтитров:', error));
+            .then(loadCueIndex)
+            .catch(error => console.error('Ошибка загрузки субтитров:', error));
     }
 
     function onPlayerStateChange(event) {
         if (event.data === YT.PlayerState.PLAYING) {
-            console.log("LOG: Плеер начал воспроизведение. Запуск интервала."); // ЛОГ
-            updateInterval = setInterval(updateSubtitle, 50);
+            if (frameRequest === null) {
+                frameRequest = requestAnimationFrame(tick);
+            }
         } else {
-            clearInterval(updateInterval);
+            cancelAnimationFrame(frameRequest);
+            frameRequest = null;
+            updateSubtitle();
         }
     }
 
-    function updateSubtitle() {
-        var currentTime = player.getCurrentTime();
-        var foundCue = false;
-
-        for (var i = 0; i < subtitles.length; i++) {
-            var cue = subtitles[i];
-
-            if (currentTime >= cue.start && currentTime < cue.end) {
-                if (i !== currentCueIndex) {
-                    currentCueIndex = i;
-
-                    console.log(`LOG: Отображение субтитра #${i}. Время: ${currentTime.toFixed(2)}`); // ЛОГ
-                    subtitleOverlay.innerHTML = formatTextForOverlay(cue.text);
+    function tick() {
+        updateSubtitle();
+        frameRequest = requestAnimationFrame(tick);
+    }
 
-                    subtitleOverlay.className = '';
-                }
-                foundCue = true;
-                break;
-            }
+    function updateSubtitle() {
+        var index = findCue(Math.round(player.getCurrentTime() * 1000));
+        if (index === currentCueIndex) {
+            return;
         }
-
-        if (!foundCue && currentCueIndex !== -1) {
-            currentCueIndex = -1;
+        currentCueIndex = index;
+        subtitleOverlay.className = '';
+        if (index === -1) {
             subtitleOverlay.textContent = '';
-            subtitleOverlay.className = '';
+        } else {
+            subtitleOverlay.innerHTML = cueHtml(index);
         }
     }
 
@@ -164,4 +158,4 @@ function initializeSubtitleSync(vttUrl, playerIframeId, overlayElementId) {
     tag.src = "https://www.youtube.com/iframe_api";
     var firstScriptTag = document.getElementsByTagName('script')[0];
     firstScriptTag.parentNode.insertBefore(tag, firstScriptTag);
-}
\ No newline at end of file
+}
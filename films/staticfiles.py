@@ -0,0 +1,126 @@
+"""
+Статика: локальные копии сторонних библиотек, хэшированные имена файлов,
+предварительное сжатие (gzip/brotli) при collectstatic и отдача с долгим
+кэшированием.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, Http404
+from django.templatetags.static import static
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, без него будет только gzip
+    brotli = None
+
+VENDOR_DIR = 'films/vendor'
+
+# Локальное имя -> адрес на CDN (используется, пока файл не скачан
+# командой vendor_assets)
+VENDOR_ASSETS = {
+    'bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/'
+        'bootstrap.min.css',
+    'bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/'
+        'bootstrap.bundle.min.js',
+    'bootstrap-icons.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/'
+        'bootstrap-icons.min.css',
+    'fonts/bootstrap-icons.woff2':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/fonts/'
+        'bootstrap-icons.woff2',
+    'fonts/bootstrap-icons.woff':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/fonts/'
+        'bootstrap-icons.woff',
+    'jquery.min.js': 'https://code.jquery.com/jquery-3.7.1.min.js',
+}
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.map', '.txt', '.json', '.vtt',
+                '.html', '.ttf', '.eot')
+FAR_FUTURE = 'public, max-age=31536000, immutable'
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+
+@lru_cache(maxsize=None)
+def vendor_url(name):
+    """Локальная копия, если она есть, иначе CDN."""
+    path = f'{VENDOR_DIR}/{name}'
+    if finders.find(path):
+        return static(path)
+    return VENDOR_ASSETS[name]
+
+
+def compress(data):
+    """Возвращает {расширение: сжатые байты}, только если сжатие выгодно."""
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {ext: blob for ext, blob in variants.items()
+            if len(blob) < len(data) * 0.95}
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Хэширует имена файлов (ManifestStaticFilesStorage) и рядом с каждым
+    сжимаемым файлом кладёт .gz и .br версии.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in {*paths, *self.hashed_files.values()}:
+            if not name.endswith(COMPRESSIBLE) or not self.exists(name):
+                continue
+            with self.open(name) as f:
+                data = f.read()
+            for ext, blob in compress(data).items():
+                with open(self.path(name + ext), 'wb') as f:
+                    f.write(blob)
+
+    def stored_name(self, name):
+        # Без collectstatic (разработка, тесты) отдаём исходное имя
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+def serve(request, path):
+    """
+    Отдаёт файлы из STATIC_ROOT: предсжатую версию по Accept-Encoding и
+    Cache-Control на год для файлов с хэшем в имени.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404("Файл не найден.")
+    if not os.path.isfile(full_path):
+        raise Http404("Файл не найден.")
+
+    accept = request.headers.get('Accept-Encoding', '')
+    encoding, served_path = None, full_path
+    for name, ext in (('br', '.br'), ('gzip', '.gz')):
+        if name in accept and os.path.isfile(full_path + ext):
+            encoding, served_path = name, full_path + ext
+            break
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response = FileResponse(open(served_path, 'rb'),
+                            content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['Cache-Control'] = FAR_FUTURE if HASHED_NAME.search(path) \
+        else 'public, max-age=3600'
+    return response
@@ -0,0 +1,206 @@
+"""
+Сериализация субтитров в разные форматы.
+
+Все форматы используют один итератор строк (``iter_cues``): строки читаются
+из базы кортежами через values_list().iterator(), без создания экземпляров
+модели. Новый формат добавляется декоратором ``register``.
+"""
+import hashlib
+import heapq
+import json
+
+from django.core.cache import cache
+
+CUE_FIELDS = ('start_time', 'end_time', 'text', 'name', 'style_classes')
+
+PAIR_CACHE_TIMEOUT = 60 * 60 * 24
+
+SERIALIZERS = {}
+
+
+def register(name, content_type):
+    """Регистрирует генератор, который по кортежам строк выдаёт куски текста."""
+    def decorator(writer):
+        SERIALIZERS[name] = (writer, content_type)
+        return writer
+    return decorator
+
+
+def iter_cues(subtitle_set, chunk_size=2000):
+    """(start, end, text, name, style_classes) в порядке времени начала."""
+    return subtitle_set.lines.order_by('start_time', 'end_time') \
+        .values_list(*CUE_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def format_timestamp(seconds, separator='.'):
+    """Секунды (float) -> 00:00:00.000 (в SRT разделитель — запятая)."""
+    if seconds is None:
+        return f"00:00:00{separator}000"
+    ms = int(seconds * 1000)
+    s, ms = divmod(ms, 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return f"{h:02}:{m:02}:{s:02}{separator}{ms:03}"
+
+
+def vtt_markup(text, name, style_classes):
+    """Текст строки с VTT-тегами говорящего и стиля."""
+    if style_classes:
+        text = f"<c.{style_classes}>{text}</c>"
+    if name:
+        return f"<c.speaker>{name}:</c> {text}"
+    return text
+
+
+@register('vtt', 'text/vtt; charset=utf-8')
+def write_vtt(cues):
+    yield "WEBVTT\n"
+    for start, end, text, name, style_classes in cues:
+        yield (f"\n{format_timestamp(start)} --> {format_timestamp(end)}\n"
+               f"{vtt_markup(text, name, style_classes)}\n\n")
+
+
+SRT_TAGS = {'bold': 'b', 'italic': 'i'}
+
+
+@register('srt', 'application/x-subrip; charset=utf-8')
+def write_srt(cues):
+    for index, (start, end, text, name, style_classes) in enumerate(cues, 1):
+        # SRT понимает только <b>, <i> и <u>, остальные классы теряются
+        for style in (style_classes or '').split():
+            if style in SRT_TAGS:
+                tag = SRT_TAGS[style]
+                text = f"<{tag}>{text}</{tag}>"
+        if name:
+            text = f"{name}: {text}"
+        yield (f"{index}\n{format_timestamp(start, ',')} --> "
+               f"{format_timestamp(end, ',')}\n{text}\n\n")
+
+
+@register('json', 'application/json')
+def write_json(cues):
+    yield "["
+    separator = ""
+    for start, end, text, name, style_classes in cues:
+        yield separator + json.dumps(
+            {"start": start, "end": end, "text": text, "name": name,
+             "style": style_classes}, ensure_ascii=False)
+        separator = ","
+    yield "]"
+
+
+@register('cues.json', 'application/json')
+def write_cue_index(cues):
+    """
+    Компактный индекс для плеера: параллельные массивы начала и конца в
+    миллисекундах (по возрастанию начала) и номер строки в таблице текстов,
+    где одинаковые тексты хранятся один раз. Клиент ищет реплику двоичным
+    поиском по start, без разбора VTT.
+    """
+    starts, ends, texts, table = [], [], [], {}
+    for start, end, text, name, style_classes in cues:
+        starts.append(round((start or 0) * 1000))
+        ends.append(round((end or 0) * 1000))
+        texts.append(table.setdefault(vtt_markup(text, name, style_classes),
+                                      len(table)))
+    yield json.dumps({"version": 1, "start": starts, "end": ends,
+                      "text": texts, "table": list(table)},
+                     ensure_ascii=False, separators=(",", ":"))
+
+
+def cue_stats(cues):
+    """
+    (число реплик, конец последней в секундах, sha256 VTT) за один проход.
+    Хеш совпадает с хешем ответа get_subtitles в формате vtt.
+    """
+    count = 0
+    duration = 0.0
+
+    def counted():
+        nonlocal count, duration
+        for cue in cues:
+            count += 1
+            duration = max(duration, cue[1] or 0.0)
+            yield cue
+    digest = hashlib.sha256()
+    for chunk in write_vtt(counted()):
+        digest.update(chunk.encode())
+    return count, duration, digest.hexdigest()
+
+
+# Реплики, которые перекрываются меньше чем на столько секунд, считаются
+# соседними, а не одновременными (неточные тайминги на стыке)
+MIN_OVERLAP = 0.05
+
+
+def align(first, second, min_overlap=MIN_OVERLAP):
+    """
+    Сопоставляет два потока реплик (по возрастанию начала) по пересечению
+    во времени. Выдаёт группы [start, end, [тексты first], [тексты second]]:
+    реплики обеих дорожек, цепочкой перекрывающие друг друга, попадают в
+    одну группу. Один проход по слиянию потоков — O(n + m) вместо
+    сравнения всех пар.
+    """
+    merged = heapq.merge(((0, cue) for cue in first),
+                         ((1, cue) for cue in second),
+                         key=lambda item: item[1][0])
+    group = None
+    for track, (start, end, text, name, style_classes) in merged:
+        if group is not None and start < group[1] - min_overlap:
+            group[1] = max(group[1], end)
+        else:
+            if group is not None:
+                yield group
+            group = [start, end, [], []]
+        group[2 + track].append(vtt_markup(text, name, style_classes))
+    if group is not None:
+        yield group
+
+
+def serialize_pair(first, second):
+    """JSON двух дорожек, выровненных по времени (миллисекунды)."""
+    cues = [{"start": round(start * 1000), "end": round(end * 1000),
+             "first": first_texts, "second": second_texts}
+            for start, end, first_texts, second_texts
+            in align(iter_cues(first), iter_cues(second))]
+    return json.dumps({"version": 1,
+                       "languages": [first.language, second.language],
+                       "cues": cues},
+                      ensure_ascii=False, separators=(",", ":"))
+
+
+def cached_pair(first, second):
+    """
+    serialize_pair() из кэша. Ключ включает id и updated_at обоих наборов:
+    любая правка строк (SubtitleSet.touch) даёт новый ключ.
+    """
+    key = "subtitles:pair:" + ":".join(
+        f"{s.pk}@{s.updated_at.timestamp()}" for s in (first, second))
+    content = cache.get(key)
+    if content is None:
+        content = serialize_pair(first, second)
+        cache.set(key, content, PAIR_CACHE_TIMEOUT)
+    return content
+
+
+def parse_anchors(value):
+    """'10=12.5, 60=61.2' -> [(10.0, 12.5), (60.0, 61.2)]"""
+    anchors = []
+    for pair in value.replace(";", ",").split(","):
+        if not pair.strip():
+            continue
+        try:
+            old, new = pair.split("=")
+            anchors.append((float(old), float(new)))
+        except ValueError:
+            raise ValueError(f"Неверная опорная точка: {pair.strip()!r}")
+    return anchors
+
+
+def serialize(subtitle_set, fmt):
+    writer, _ = SERIALIZERS[fmt]
+    return "".join(writer(iter_cues(subtitle_set)))
+
+
+def content_type(fmt):
+    return SERIALIZERS[fmt][1]
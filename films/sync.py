@@ -0,0 +1,115 @@
+"""
+Инкрементальная синхронизация с poiskkino: хэши содержимого записей и
+время последней синхронизации.
+"""
+import hashlib
+import json
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import Film, Person, SyncRecord, SyncState
+
+SOURCE = 'poiskkino'
+MODELS = {'film': Film, 'person': Person}
+# Хэшируются только поля, которые сохраняет импорт: в записи персоны из
+# film.persons есть и поля роли в фильме (profession, description), с
+# ними одна персона из двух фильмов всегда выглядела бы изменённой
+HASHED_FIELDS = {'person': ('id', 'name', 'enName', 'birthday', 'photo')}
+
+
+def content_hash(data):
+    return hashlib.sha256(json.dumps(
+        data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def record_hash(kind, data):
+    fields = HASHED_FIELDS.get(kind)
+    if fields is not None:
+        data = {field: data.get(field) for field in fields}
+    return content_hash(data)
+
+
+def last_synced_at(key=SOURCE):
+    return SyncState.objects.filter(key=key).values_list(
+        'last_synced_at', flat=True).first()
+
+
+def mark_synced(moment, key=SOURCE):
+    SyncState.objects.update_or_create(key=key,
+                                       defaults={'last_synced_at': moment})
+
+
+class SyncTracker:
+    """
+    Сравнивает записи из API с сохранёнными хэшами. Всё нужное для решения
+    читается заранее (по запросу на тип), новые хэши пишутся пачкой в flush().
+    """
+
+    def __init__(self, delta=True):
+        self.delta = delta
+        self.records = {
+            (kind, kp_id): (digest, image_url)
+            for kind, kp_id, digest, image_url in SyncRecord.objects
+            .values_list('kind', 'kinopoisk_id', 'content_hash', 'image_url')
+        }
+        self.existing = {
+            kind: dict(model.objects.filter(kinopoisk_id__isnull=False)
+                       .values_list('kinopoisk_id', 'id'))
+            for kind, model in MODELS.items()
+        }
+        self.seen = set()
+        self.pending = {}
+        self.stats = {kind: {'added': 0, 'changed': 0, 'unchanged': 0}
+                      for kind in MODELS}
+
+    def check(self, kind, data):
+        """'added', 'changed' или 'unchanged' (если режим delta)."""
+        key = (kind, data['id'])
+        digest = record_hash(kind, data)
+        if data['id'] not in self.existing[kind]:
+            status = 'added'
+        elif not self.delta or self.records.get(key, (None,))[0] != digest:
+            status = 'changed'
+        else:
+            status = 'unchanged'
+        if key not in self.seen:
+            self.seen.add(key)
+            self.stats[kind][status] += 1
+        return status, digest
+
+    def unchanged_instance(self, kind, data):
+        """Экземпляр без запроса к базе (достаточно для связей M2M/FK)."""
+        return MODELS[kind].from_db(
+            DEFAULT_DB_ALIAS, ['id', 'kinopoisk_id'],
+            [self.existing[kind][data['id']], data['id']])
+
+    def need_image(self, kind, kp_id, url):
+        if not url:
+            return False
+        if not self.delta or kp_id not in self.existing[kind]:
+            return True
+        return self.records.get((kind, kp_id), (None, None))[1] != url
+
+    def remember(self, kind, instance, digest, image_url):
+        key = (kind, instance.kinopoisk_id)
+        self.records[key] = (digest, image_url or '')
+        self.existing[kind][instance.kinopoisk_id] = instance.pk
+        self.pending[key] = (digest, image_url or '')
+
+    def flush(self):
+        now = timezone.now()
+        SyncRecord.objects.bulk_create(
+            [SyncRecord(kind=kind, kinopoisk_id=kp_id, content_hash=digest,
+                        image_url=image_url, created_at=now, updated_at=now)
+             for (kind, kp_id), (digest, image_url) in self.pending.items()],
+            update_conflicts=True, unique_fields=['kind', 'kinopoisk_id'],
+            update_fields=['content_hash', 'image_url', 'updated_at'],
+            batch_size=500)
+        self.pending = {}
+
+    def summary(self):
+        return "; ".join(
+            f"{kind}: " + ", ".join(f"{n} {status}"
+                                    for status, n in counts.items())
+            for kind, counts in self.stats.items())
@@ -0,0 +1,235 @@
+"""
+Лёгкая очередь задач на базе данных, без внешнего брокера.
+
+Задача — функция ``f(task, **kwargs)``, зарегистрированная декоратором
+``@register``. ``enqueue()`` ставит её в очередь, команда ``run_worker``
+забирает и выполняет с ограничением параллельности, повторами и
+прогрессом (``task.set_progress``).
+"""
+import datetime
+import logging
+import os
+import socket
+import threading
+import traceback
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, F, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+
+from . import deletion
+from .models import Film, Task
+from .sync import SyncTracker
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+# Как часто выполняющаяся задача отмечается живой (updated_at), секунд.
+# Должно быть заметно меньше run_worker --stale-after.
+HEARTBEAT_INTERVAL = 60
+
+
+class TaskType:
+    def __init__(self, func, name, max_attempts, concurrency, retry_delay):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+        self.retry_delay = retry_delay
+
+
+def register(name=None, max_attempts=3, concurrency=None, retry_delay=30):
+    """
+    concurrency — сколько задач этого типа может выполняться одновременно
+    (None — без ограничения, кроме числа потоков обработчика).
+    """
+    def decorator(func):
+        task_name = name or func.__name__
+        REGISTRY[task_name] = TaskType(func, task_name, max_attempts,
+                                       concurrency, retry_delay)
+        return func
+    return decorator
+
+
+def enqueue(name, run_after=None, **kwargs):
+    if name not in REGISTRY:
+        raise KeyError(f"Неизвестная задача: {name}")
+    task = Task(name=name, kwargs=kwargs,
+                max_attempts=REGISTRY[name].max_attempts)
+    if run_after:
+        task.run_after = run_after
+    task.save()
+    return task
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def running_count(name):
+    """Подзапрос: сколько задач name выполняется сейчас."""
+    return Coalesce(Subquery(
+        Task.objects.filter(name=name, status=Task.RUNNING).order_by()
+        .values('name').annotate(count=Count('pk')).values('count')),
+        Value(0))
+
+
+def claim(worker, names=None):
+    """
+    Забирает первую готовую задачу. Захват — условный UPDATE по статусу
+    и числу выполняющихся задач того же типа, поэтому одну задачу не
+    получат два обработчика и лимит concurrency не превысить.
+    """
+    now = timezone.now()
+    candidates = Task.objects.filter(status=Task.PENDING, run_after__lte=now)
+    if names:
+        candidates = candidates.filter(name__in=names)
+    for task in candidates.order_by('run_after', 'id')[:20]:
+        task_type = REGISTRY.get(task.name)
+        if task_type is None:
+            continue
+        target = Task.objects.filter(pk=task.pk, status=Task.PENDING)
+        if task_type.concurrency is not None:
+            # Проверка в том же UPDATE: отдельный COUNT перед ним
+            # пропустил бы два обработчика разом
+            target = target.filter(LessThan(running_count(task.name),
+                                            task_type.concurrency))
+        claimed = target.update(status=Task.RUNNING, worker=worker,
+                                started_at=now, finished_at=None,
+                                attempts=F('attempts') + 1, updated_at=now)
+        if claimed:
+            task.refresh_from_db()
+            return task
+    return None
+
+
+def beat(task):
+    """Отметка «задача жива»: requeue_stale смотрит на updated_at."""
+    Task.objects.filter(pk=task.pk, status=Task.RUNNING,
+                        worker=task.worker).update(updated_at=timezone.now())
+
+
+class Heartbeat(threading.Thread):
+    """Поток, который раз в HEARTBEAT_INTERVAL вызывает beat(task):
+    команды импорта подолгу не сообщают о прогрессе."""
+
+    def __init__(self, task):
+        super().__init__(name=f"heartbeat-{task.pk}", daemon=True)
+        self.task = task
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(HEARTBEAT_INTERVAL):
+                beat(self.task)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run(task):
+    """Выполняет задачу и записывает результат; при ошибке — повтор."""
+    task_type = REGISTRY[task.name]
+    heartbeat = Heartbeat(task)
+    heartbeat.start()
+    try:
+        task_type.func(task, **task.kwargs)
+    except Exception:
+        logger.exception("Task %s failed", task)
+        now = timezone.now()
+        fields = {"error": traceback.format_exc(), "finished_at": now,
+                  "updated_at": now}
+        if task.attempts < task.max_attempts:
+            # Экспоненциальная задержка перед повтором
+            delay = task_type.retry_delay * 2 ** (task.attempts - 1)
+            fields.update(status=Task.PENDING,
+                          run_after=now + datetime.timedelta(seconds=delay))
+        else:
+            fields["status"] = Task.FAILED
+        Task.objects.filter(pk=task.pk).update(**fields)
+        return False
+    finally:
+        heartbeat.stop()
+    now = timezone.now()
+    Task.objects.filter(pk=task.pk).update(
+        status=Task.DONE, finished_at=now, updated_at=now, error="")
+    return True
+
+
+def requeue_stale(older_than):
+    """
+    Возвращает в очередь задачи, обработчик которых пропал: живой
+    обработчик обновляет updated_at не реже HEARTBEAT_INTERVAL.
+    """
+    return Task.objects.filter(
+        status=Task.RUNNING,
+        updated_at__lt=timezone.now() - older_than,
+    ).update(status=Task.PENDING, worker="")
+
+
+# ------------------------------------------------------------------ задачи
+
+
+@register(concurrency=1)
+def get_films(task, delta=False):
+    task.set_progress(0, 1, "Загрузка списка фильмов")
+    call_command('get_films', delta=delta)
+    task.set_progress(1, 1, "Готово")
+
+
+@register(concurrency=1)
+def import_films(task, delta=False):
+    from .management.commands.import_films import Command
+    command = Command()
+    command.tracker = SyncTracker(delta=delta)
+    docs = command.load_films()
+    task.set_progress(0, len(docs))
+    for i, film_data in enumerate(docs, 1):
+        command.create_film(film_data)
+        task.set_progress(i, message=film_data['name'])
+    command.tracker.flush()
+    task.set_progress(len(docs), message=command.tracker.summary())
+
+
+@register(concurrency=1)
+def import_vtt(task, kinopoisk_id, language_code, vtt_file):
+    call_command('import_vtt', kinopoisk_id, language_code, vtt_file)
+
+
+@register(concurrency=1)
+def bulk_delete(task, model, ids):
+    """Фоновое удаление (см. deletion.py); model — 'film', 'person', ..."""
+    task.set_progress(0, 1, "Удаление")
+    counts = deletion.bulk_delete(deletion.MODELS[model], ids)
+    task.set_progress(1, 1, ", ".join(
+        f"{deletion.label(m)}: {n}" for m, n in counts.items()))
+
+
+COVER_MAX_SIZE = (1000, 1500)
+
+
+@register(concurrency=2)
+def process_cover(task, film_id):
+    """Уменьшает загруженный постер и пересохраняет его оптимизированным."""
+    from PIL import Image
+
+    film = Film.objects.filter(pk=film_id).first()
+    if film is None or not film.cover:
+        return
+    with film.cover.open('rb') as f:
+        image = Image.open(f)
+        image.load()
+    fmt = image.format or 'JPEG'
+    if image.width <= COVER_MAX_SIZE[0] and \
+            image.height <= COVER_MAX_SIZE[1]:
+        return
+    image.thumbnail(COVER_MAX_SIZE)
+    with film.cover.open('wb') as f:
+        image.save(f, format=fmt, optimize=True)
@@ -1,24 +1,47 @@
+from functools import lru_cache
+
 from django import template
 from django.apps import apps
+from films.staticfiles import vendor_url
 
 register = template.Library()
 
 
+@lru_cache(maxsize=None)
+def model_meta(cls_name):
+    """Мета модели по строке 'app:model'; навбар спрашивает её на каждой
+    странице, поэтому поиск в реестре приложений запоминается."""
+    return apps.get_model(*cls_name.split(":"))._meta
+
+
+@lru_cache(maxsize=None)
+def field_verbose_name(meta, field):
+    return meta.get_field(field).verbose_name
+
+
 @register.filter
 def model_verbose_name(cls_name):
-    Model = apps.get_model(*cls_name.split(":"))
-    return Model._meta.verbose_name
+    return model_meta(cls_name).verbose_name
 
 
 @register.filter
 def model_verbose_name_plural(cls_name):
-    Model = apps.get_model(*cls_name.split(":"))
-    return Model._meta.verbose_name_plural
+    return model_meta(cls_name).verbose_name_plural
+
+
+@register.simple_tag
+def vendor_static(name):
+    return vendor_url(name)
 
 
 @register.simple_tag
 def verbose_name(obj, field):
-    return obj._meta.get_field(field).verbose_name
+    return field_verbose_name(obj._meta, field)
+
+
+@register.simple_tag
+def model_field_verbose_name(cls_name, field):
+    return field_verbose_name(model_meta(cls_name), field)
 
 
 @register.filter
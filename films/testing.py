@@ -0,0 +1,215 @@
+"""
+Снимок заполненного каталога для тестов с большим объёмом данных.
+
+Каталог из тысяч фильмов через ORM (или loaddata) создаётся секунды, а
+тестам списка фильмов, форматов субтитров и импорта он нужен целиком.
+Поэтому seed_catalog запускается один раз, результат сохраняется в файл
+SQLite (TEST_SNAPSHOT_DIR), а тестовые классы ``SnapshotTestCase``
+копируют его в тестовую базу через backup API SQLite — это быстрее любой
+вставки строк. После класса база возвращается к пустому состоянию, так
+что остальные тесты снимка не видят.
+
+Имя файла содержит отпечаток миграций всех приложений, параметров и кода
+seed_catalog: после новой миграции снимок пересобирается сам. Ключ
+``manage.py test --rebuild-snapshot`` пересобирает его принудительно.
+"""
+import functools
+import hashlib
+import inspect
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase
+from django.test.runner import DiscoverRunner
+from django.test.utils import iter_test_cases
+
+from . import facets
+
+# Параметры seed_catalog для снимка
+SEED = {"films": 2000, "people": 4000, "genres": 20, "countries": 30,
+        "cast": 6, "genres_per_film": 2, "subtitle_sets": 10,
+        "languages": "ru,en", "cues": 500, "seed": 0}
+PREFIX = 'catalog-'
+
+
+def snapshot_dir():
+    return Path(getattr(settings, 'TEST_SNAPSHOT_DIR',
+                        settings.BASE_DIR / '.test_snapshots'))
+
+
+@functools.cache
+def fingerprint():
+    """Хэш файлов миграций, параметров и кода генератора каталога."""
+    from .management.commands import seed_catalog
+
+    digest = hashlib.sha256(repr(sorted(SEED.items())).encode())
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    for key in sorted(loader.disk_migrations):
+        module = sys.modules[loader.disk_migrations[key].__module__]
+        digest.update(repr(key).encode())
+        digest.update(Path(module.__file__).read_bytes())
+    digest.update(inspect.getsource(seed_catalog).encode())
+    return digest.hexdigest()[:16]
+
+
+def snapshot_path():
+    return snapshot_dir() / f"{PREFIX}{fingerprint()}.sqlite3"
+
+
+def supported():
+    return connections[DEFAULT_DB_ALIAS].vendor == 'sqlite'
+
+
+def raw_connection():
+    connection = connections[DEFAULT_DB_ALIAS]
+    if not supported():
+        raise ImproperlyConfigured("Снимки поддерживаются только для "
+                                   f"SQLite, не {connection.vendor}")
+    connection.ensure_connection()
+    return connection.connection
+
+
+def reset_caches():
+    """
+    После подмены базы кэши (подборки, карта сайта, пользователи, лимиты)
+    описывают уже другие данные — сбрасываются все.
+    """
+    for cache in caches.all():
+        cache.clear()
+    facets.invalidate()
+
+
+def copy_database(source, target):
+    """Копия базы целиком (схема, строки, sqlite_sequence) backup API."""
+    source.backup(target)
+
+
+def build(path=None):
+    """
+    Заполняет тестовую базу (уже с миграциями) каталогом и сохраняет её
+    в файл снимка; затем возвращает базу к исходному виду.
+    """
+    path = Path(path or snapshot_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    database = raw_connection()
+    clean = sqlite3.connect(':memory:')
+    copy_database(database, clean)
+    try:
+        call_command('seed_catalog', stdout=io.StringIO(), **SEED)
+        # Пишем во временный файл и переименовываем: параллельные
+        # процессы никогда не увидят недописанный снимок
+        fd, temporary = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        os.close(fd)
+        try:
+            target = sqlite3.connect(temporary)
+            try:
+                copy_database(database, target)
+            finally:
+                target.close()
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    finally:
+        copy_database(clean, database)
+        clean.close()
+        reset_caches()
+    for stale in path.parent.glob(f"{PREFIX}*.sqlite3"):
+        if stale != path:
+            stale.unlink()
+    return path
+
+
+def ensure(rebuild=False):
+    """Путь к актуальному снимку; собирает его, если файла нет."""
+    path = snapshot_path()
+    if rebuild or not path.exists():
+        build(path)
+    return path
+
+
+class SnapshotTestCase(TestCase):
+    """
+    TestCase, база которого на время класса — копия снимка каталога.
+    Тесты и setUpTestData работают поверх неё как обычно: изменения
+    откатываются транзакциями TestCase. Не на SQLite класс пропускается.
+    """
+    @classmethod
+    def setUpClass(cls):
+        if not supported():
+            raise unittest.SkipTest("Снимок каталога требует SQLite")
+        # Копировать в базу можно только вне транзакции, поэтому до
+        # atomic-блока класса в TestCase.setUpClass
+        path = ensure()
+        database = raw_connection()
+        cls._clean_database = sqlite3.connect(':memory:')
+        copy_database(database, cls._clean_database)
+        snapshot = sqlite3.connect(path)
+        try:
+            copy_database(snapshot, database)
+        finally:
+            snapshot.close()
+        reset_caches()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._restore_clean()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls._restore_clean()
+
+    @classmethod
+    def _restore_clean(cls):
+        copy_database(cls._clean_database, raw_connection())
+        cls._clean_database.close()
+        reset_caches()
+
+
+class SnapshotRunner(DiscoverRunner):
+    """DiscoverRunner, который заранее собирает снимок каталога."""
+
+    def __init__(self, rebuild_snapshot=False, **kwargs):
+        super().__init__(**kwargs)
+        self.rebuild_snapshot = rebuild_snapshot
+        self.needs_snapshot = False
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--rebuild-snapshot', action='store_true',
+            help='Rebuild the seeded catalog snapshot used by '
+                 'SnapshotTestCase even if migrations did not change.')
+
+    def build_suite(self, *args, **kwargs):
+        suite = super().build_suite(*args, **kwargs)
+        self.needs_snapshot = any(isinstance(test, SnapshotTestCase)
+                                  for test in iter_test_cases(suite))
+        return suite
+
+    def setup_databases(self, **kwargs):
+        old_config = super().setup_databases(**kwargs)
+        # Собираем здесь, а не в первом классе: при --parallel процессы
+        # получат готовый файл вместо одновременной сборки
+        if supported() and (self.rebuild_snapshot or (
+                self.needs_snapshot and not snapshot_path().exists())):
+            if self.verbosity >= 1:
+                self.log("Building test catalog snapshot...")
+            ensure(rebuild=True)
+        return old_config
@@ -1,3 +1,1168 @@
-from django.test import TestCase
+import contextlib
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (anniversaries, facets, profiling, ratelimit,
+               recommendations, sitemaps, tasks, testing)
+from .models import (Country, DataVersion, Film, FilmRecommendation, Genre,
+                     Person, PersonFilmography, SubtitleLine, SubtitleSet,
+                     Task)
+
+
+def make_film(name, director, country=None, genres=(), people=(), **attrs):
+    country = country or Country.objects.get_or_create(name="Страна")[0]
+    film = Film.objects.create(name=name, director=director, country=country,
+                               **attrs)
+    film.genres.set(genres)
+    film.people.set(people)
+    return film
+
+
+def seed(**options):
+    defaults = {"films": 30, "people": 60, "genres": 5, "countries": 4,
+                "cast": 3, "subtitle_sets": 2, "languages": "ru",
+                "cues": 20}
+    defaults.update(options)
+    call_command('seed_catalog', stdout=io.StringIO(), **defaults)
+
+
+class SeedCatalogTests(TestCase):
+    def test_generates_requested_scale(self):
+        seed(films=25, people=40, cast=4, subtitle_sets=3, languages='ru,en',
+             cues=15)
+        self.assertEqual(Film.objects.count(), 25)
+        self.assertEqual(Person.objects.count(), 40)
+        self.assertEqual(Film.people.through.objects.count(), 25 * 4)
+        self.assertEqual(SubtitleSet.objects.count(), 6)
+        self.assertEqual(SubtitleLine.objects.count(), 6 * 15)
+
+    def test_can_run_twice(self):
+        seed()
+        seed()
+        self.assertEqual(Film.objects.count(), 60)
+
+
+class CatalogSnapshotTests(testing.SnapshotTestCase):
+    def test_catalog_is_restored_from_snapshot(self):
+        self.assertEqual(Film.objects.count(), testing.SEED["films"])
+        self.assertEqual(Person.objects.count(), testing.SEED["people"])
+        self.assertEqual(SubtitleLine.objects.count(),
+                         testing.SEED["subtitle_sets"] * 2
+                         * testing.SEED["cues"])
+
+    def test_film_list_on_full_catalog(self):
+        response = self.client.get(reverse('films:film_list'),
+                                   {'page': 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['films']), 12)
+
+    def test_vtt_matches_stored_stats(self):
+        for subtitle_set in SubtitleSet.objects.all():
+            vtt = subtitle_set.generate_vtt()
+            self.assertEqual(subtitle_set.cue_count, testing.SEED["cues"])
+            self.assertEqual(subtitle_set.content_hash,
+                             hashlib.sha256(vtt.encode()).hexdigest())
+
+    # Тесты выполняются по алфавиту: сначала правка, затем проверка отката
+    def test_rollback_1_edit(self):
+        Film.objects.update(name="Проверка отката")
+        cache.set("snapshot-test", 1)
+
+    def test_rollback_2_check(self):
+        self.assertFalse(Film.objects.filter(name="Проверка отката").exists())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        # После класса база снова пустая, а кэш сброшен
+        if Film.objects.exists() or cache.get("snapshot-test"):
+            raise AssertionError("Снимок каталога остался после класса")
+
+
+class BenchmarkTests(TestCase):
+    def test_writes_machine_readable_results(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "bench.json")
+            call_command('benchmark', scales='10', repeat=1, cues=10,
+                         output=output, stdout=io.StringIO())
+            with open(output, encoding="utf-8") as f:
+                report = json.load(f)
+        names = {result["name"] for result in report["results"]}
+        self.assertIn("view.film_list", names)
+        self.assertIn("subtitles.parse_vtt", names)
+        self.assertIn("import.import_films", names)
+        self.assertIn("wire.film_page", names)
+        # Синтетический каталог откатывается после замеров
+        self.assertEqual(Film.objects.count(), 0)
+
+    def test_compare_with_value_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "bench.json")
+            options = {"scales": "10", "repeat": 1, "cues": 10,
+                       "only": "wire,views"}
+            call_command('benchmark', output=output, stdout=io.StringIO(),
+                         **options)
+            out = io.StringIO()
+            call_command('benchmark', compare=output, stdout=out,
+                         output=os.path.join(tmp, "after.json"), **options)
+        self.assertRegex(out.getvalue(), r"view\.film_list +[\d.]+ +[\d.]+")
+        self.assertRegex(out.getvalue(), r"wire\.film_page\.\w+ ")
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(films=12, cues=5)
+
+    def test_command_writes_every_format(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for fmt in ('csv', 'jsonl', 'columns'):
+                call_command('export_catalog', 'film', 'film_people',
+                             format=fmt, output_dir=tmp, chunk_size=5,
+                             stdout=io.StringIO(), stderr=io.StringIO())
+            with open(os.path.join(tmp, 'film.csv'), encoding='utf-8') as f:
+                self.assertEqual(len(f.readlines()), 1 + 12)
+            with open(os.path.join(tmp, 'film_people.jsonl'),
+                      encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f]
+            self.assertEqual(len(rows), Film.people.through.objects.count())
+            self.assertEqual(set(rows[0]), {'id', 'film_id', 'person_id'})
+            with open(os.path.join(tmp, 'film.columns'),
+                      encoding='utf-8') as f:
+                header, *groups = [json.loads(line) for line in f]
+            self.assertIn('name', header['columns'])
+            self.assertEqual([g['rows'] for g in groups], [5, 5, 2])
+
+    def test_endpoint_is_staff_only_and_streams(self):
+        url = reverse('films:export_model', args=['person', 'jsonl'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user('staff', password='x',
+                                         is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), Person.objects.count())
+        self.assertEqual(self.client.get(
+            reverse('films:export_model', args=['user', 'csv'])
+        ).status_code, 404)
+
+
+class SubtitleAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(films=3, subtitle_sets=1, cues=250)
+        cls.subtitle_set = SubtitleSet.objects.get()
+        cls.admin = User.objects.create_superuser('admin', password='x')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_film_change_page_does_not_render_cues(self):
+        film = self.subtitle_set.film
+        response = self.client.get(
+            reverse('admin:films_film_change', args=[film.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'start_time')
+
+    def test_cue_editor_is_paginated_and_saves_only_changes(self):
+        url = reverse('admin:films_subtitleset_cues',
+                      args=[self.subtitle_set.pk])
+        response = self.client.get(url + '?p=2')
+        formset = response.context['formset']
+        self.assertEqual(len(formset.forms), 100)
+
+        data = {}
+        for name, field in formset.management_form.fields.items():
+            data[f'form-{name}'] = formset.management_form[name].value()
+        for i, form in enumerate(formset.forms):
+            for name in form.fields:
+                value = form[name].value()
+                data[f'form-{i}-{name}'] = '' if value is None else value
+        data['form-0-text'] = 'Исправленная строка'
+        data['form-1-DELETE'] = 'on'
+        edited, removed = formset.forms[0].instance, formset.forms[1].instance
+        untouched = formset.forms[2].instance
+
+        response = self.client.post(url + '?p=2', data)
+        self.assertEqual(response.status_code, 302)
+        edited.refresh_from_db()
+        self.assertEqual(edited.text, 'Исправленная строка')
+        self.assertFalse(SubtitleLine.objects.filter(pk=removed.pk).exists())
+        self.assertEqual(
+            SubtitleLine.objects.get(pk=untouched.pk).updated_at,
+            untouched.updated_at)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.drama, self.comedy = (Genre.objects.create(name="драма"),
+                                   Genre.objects.create(name="комедия"))
+        self.director, self.actor, self.other = (
+            Person.objects.create(name=name) for name in "ABC")
+        self.a = make_film("A", self.director, genres=[self.drama],
+                           people=[self.actor])
+        self.b = make_film("B", self.director, genres=[self.drama],
+                           people=[self.actor])
+        self.c = make_film("C", self.other, genres=[self.comedy])
+
+    def test_rebuild_stores_top_neighbours(self):
+        self.assertEqual(recommendations.rebuild(full=True), 3)
+        top = FilmRecommendation.objects.filter(film=self.a).first()
+        self.assertEqual(top.recommended, self.b)
+        self.assertFalse(FilmRecommendation.objects.filter(film=self.c))
+
+        response = self.client.get(
+            reverse('films:film_detail', args=[self.a.id]))
+        self.assertContains(response, 'Похожие фильмы')
+
+    def test_incremental_rebuild_only_touches_affected_films(self):
+        recommendations.rebuild(full=True)
+        self.assertEqual(recommendations.rebuild(), 0)
+        self.c.genres.add(self.drama)
+        # C изменён, A и B делят с ним жанр
+        self.assertEqual(recommendations.rebuild(), 3)
+        self.assertEqual(recommendations.rebuild(), 0)
+        self.assertTrue(FilmRecommendation.objects.filter(
+            film=self.c, recommended=self.a).exists())
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        self.drama, self.comedy = (Genre.objects.create(name="драма"),
+                                   Genre.objects.create(name="комедия"))
+        self.ru, self.fr = (Country.objects.create(name="Россия"),
+                            Country.objects.create(name="Франция"))
+        director = Person.objects.create(name="Режиссер")
+        make_film("Альфа", director, self.ru, [self.drama], year=1975,
+                  length=80)
+        make_film("Бета", director, self.ru, [self.drama, self.comedy],
+                  year=1999, length=100)
+        make_film("Гамма", director, self.fr, [self.comedy], year=2005,
+                  length=130)
+        self.delta = make_film("Дельта", director, self.fr, [self.drama],
+                               year=2015, length=170)
+
+    def search(self, **params):
+        response = self.client.get(reverse('films:film_list'), params)
+        return ([film.name for film in response.context['films']],
+                response.context['facets'])
+
+    def counts(self, values):
+        return {value[1]: value[2] for value in values}
+
+    def test_filters_and_counts(self):
+        names, result = self.search(genre=self.drama.id)
+        self.assertEqual(names, ["Альфа", "Бета", "Дельта"])
+        # Счётчики жанров не зависят от выбранного жанра
+        self.assertEqual(self.counts(result.genres),
+                         {"драма": 3, "комедия": 2})
+        self.assertEqual(self.counts(result.countries),
+                         {"Россия": 2, "Франция": 1})
+
+        names, result = self.search(genre=[self.drama.id, self.comedy.id],
+                                    country=self.fr.id, year_from=2000,
+                                    year_to=2010)
+        self.assertEqual(names, ["Гамма"])
+        names, _ = self.search(length=["short", "epic"], query="а")
+        self.assertEqual(names, ["Альфа", "Дельта"])
+        names, _ = self.search(genre="x", year_from="y")
+        self.assertEqual(len(names), 4)
+
+    def test_index_follows_changes(self):
+        self.search()
+        self.delta.genres.set([self.comedy])
+        names, result = self.search(genre=self.comedy.id)
+        self.assertEqual(names, ["Бета", "Гамма", "Дельта"])
+        self.delta.delete()
+        names, _ = self.search(genre=self.comedy.id)
+        self.assertEqual(names, ["Бета", "Гамма"])
+
+    def test_version_is_shared_through_database(self):
+        self.search()
+        # Другой процесс добавил фильм: сигнал сработал там, а здесь
+        # виден только новый номер версии в базе (кэш процесса не общий)
+        Film.objects.bulk_create([Film(name="Эпсилон", director=self.delta
+                                       .director, country=self.ru)])
+        cache.clear()
+        names, _ = self.search()
+        self.assertEqual(len(names), 4)
+        DataVersion.objects.filter(key=facets.VERSION_KEY) \
+            .update(version="другой процесс")
+        names, _ = self.search()
+        self.assertIn("Эпсилон", names)
+
+    def test_pages_come_from_bitset(self):
+        bits = facets.to_bits(range(0, 3000, 3), 3000)
+        self.assertEqual(list(facets.iter_positions(bits, 995, 1002)),
+                         [2985, 2988, 2991, 2994, 2997])
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        make_film("Дракон", Person.objects.create(name="Режиссер"))
+
+    def search(self, address, **params):
+        return self.client.get(reverse('films:film_list'), params,
+                               REMOTE_ADDR=address)
+
+    @override_settings(FILMS_RATE_LIMITS={'search': (0.5, 2, 4)})
+    def test_search_is_throttled_per_client(self):
+        for _ in range(2):
+            self.assertEqual(
+                self.search('192.0.2.10', query="Дра").status_code, 200)
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.search('192.0.2.10', query="Дра")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        # Без строки поиска токены не тратятся; у другого IP своё ведро
+        self.assertEqual(self.search('192.0.2.10').status_code, 200)
+        self.assertEqual(
+            self.search('192.0.2.11', query="Дра").status_code, 200)
+
+    @override_settings(FILMS_RATE_LIMITS={'search': (2.0, 1, 4)})
+    def test_bucket_refills(self):
+        self.assertEqual(ratelimit.take('search', 'refill', now=100), 0)
+        self.assertEqual(ratelimit.take('search', 'refill', now=100.25),
+                         0.25)
+        self.assertEqual(ratelimit.take('search', 'refill', now=100.5), 0)
+
+    @override_settings(FILMS_RATE_LIMITS={'search': (100.0, 100, 1)})
+    def test_overload_is_shed(self):
+        gate = ratelimit.semaphore('search', 1)
+        gate.acquire()
+        try:
+            with self.assertLogs('films.ratelimit', 'WARNING'), \
+                    self.assertLogs('django.request', 'WARNING'):
+                response = self.search('192.0.2.12', query="Дра")
+        finally:
+            gate.release()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(
+            self.search('192.0.2.12', query="Дра").status_code, 200)
+
+    def test_autocomplete_ignores_short_terms(self):
+        url = reverse('films:person_autocomplete')
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'q': "Р"})
+        self.assertEqual(response.json()['results'], [])
+        response = self.client.get(url, {'q': "Реж"})
+        self.assertEqual([r['text'] for r in response.json()['results']],
+                         ["Режиссер"])
+        response = self.client.get(reverse('films:country_autocomplete'),
+                                   {'q': "Стр"})
+        self.assertEqual([r['text'] for r in response.json()['results']],
+                         ["Страна"])
+
+    def test_widgets_wait_for_minimum_length(self):
+        from .forms import FilmForm
+        self.assertIn('data-minimum-input-length="2"',
+                      str(FilmForm()['director']))
+
+
+class AnniversaryTests(TestCase):
+    day = datetime.date(2025, 2, 28)
+
+    def setUp(self):
+        # Подборки прошлых тестов за любые даты
+        cache.clear()
+        self.director = Person.objects.create(
+            name="Режиссер", birthday=datetime.date(1960, 2, 28))
+        Person.objects.create(name="Високосный", birthday="1976-02-29")
+        Person.objects.create(name="Весенний",
+                              birthday=datetime.date(1980, 3, 1))
+        make_film("Юбилейный", self.director, year=2000)
+        make_film("Обычный", self.director, year=2001)
+
+    def test_save_fills_birthday_key(self):
+        self.assertEqual(
+            Person.objects.get(name="Високосный").birthday_key, 229)
+        person = Person.objects.get(name="Весенний")
+        person.birthday = datetime.date(1980, 12, 31)
+        person.save(update_fields=['birthday'])
+        person.refresh_from_db()
+        self.assertEqual(person.birthday_key, 1231)
+
+    def test_born_on_uses_index_and_computes_age(self):
+        people = anniversaries.born_on(self.day)
+        self.assertRegex(people.explain(), r"USING INDEX \w*birthday_key")
+        # 29 февраля в невисокосный год отмечается 28-го
+        self.assertEqual([(p.name, p.turning) for p in people],
+                         [("Високосный", 49), ("Режиссер", 65)])
+        self.assertEqual(
+            [p.name for p in anniversaries.born_on(
+                datetime.date(2024, 2, 28))], ["Режиссер"])
+
+    def test_film_anniversaries(self):
+        self.assertEqual([(f.name, f.anniversary) for f in
+                          anniversaries.film_anniversaries(self.day)],
+                         [("Юбилейный", 25)])
+
+    def test_selection_is_cached_until_midnight(self):
+        now = datetime.datetime(2025, 2, 28, 23, 59, 30,
+                                tzinfo=timezone.get_current_timezone())
+        self.assertEqual(anniversaries.seconds_to_midnight(now), 30)
+        with self.assertNumQueries(2):
+            selection = anniversaries.today(now)
+        with self.assertNumQueries(0):
+            self.assertEqual(anniversaries.today(now), selection)
+        self.assertEqual(len(selection['people']), 2)
+        # Метод Person.age() не закрыт аннотацией
+        self.assertIsInstance(selection['people'][0].age(), int)
+
+    def test_today_page(self):
+        day = timezone.localdate()
+        Person.objects.create(name="Именинник",
+                              birthday=day.replace(year=day.year - 28))
+        response = self.client.get(reverse('films:today'))
+        self.assertContains(response, "Именинник")
+        self.assertContains(response, "28 лет")
+        # Правка персоны сбрасывает подборку дня
+        Person.objects.filter(name="Именинник").get().delete()
+        self.assertNotContains(self.client.get(reverse('films:today')),
+                               "Именинник")
+
+
+class FilmBatchAPITests(TestCase):
+    def setUp(self):
+        self.drama = Genre.objects.create(name="драма")
+        director = Person.objects.create(name="Режиссер")
+        actor = Person.objects.create(name="Актёр")
+        self.films = [make_film(f"Фильм {i}", director, genres=[self.drama],
+                                people=[actor], year=2000 + i)
+                      for i in range(5)]
+        self.url = reverse('films:film_batch')
+
+    def test_fixed_queries_and_sparse_fields(self):
+        ids = [film.id for film in reversed(self.films)] + [999999]
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {
+                'ids': ",".join(map(str, ids)),
+                'fields': 'name,year,director,genres,people'})
+        data = response.json()
+        self.assertEqual([f['id'] for f in data['films']], ids[:-1])
+        self.assertEqual(data['missing'], [999999])
+        self.assertEqual(set(data['films'][0]),
+                         {'id', 'name', 'year', 'director', 'genres',
+                          'people'})
+        self.assertEqual(data['films'][0]['genres'],
+                         [{'id': self.drama.id, 'name': "драма"}])
+
+        self.assertEqual(self.client.get(self.url, {'ids': 'x'}).status_code,
+                         400)
+        self.assertEqual(self.client.get(self.url, {
+            'ids': self.films[0].id, 'fields': 'secret'}).status_code, 400)
+
+    def test_etag_revalidation(self):
+        params = {'ids': f"{self.films[0].id},{self.films[1].id}",
+                  'fields': 'name,genres'}
+        etag = self.client.get(self.url, params)['ETag']
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.drama.name = "трагедия"
+        self.drama.save()
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.drama = Genre.objects.create(name="драма")
+        self.director = Person.objects.create(name="Режиссер")
+        self.film = make_film("Фильм", self.director, genres=[self.drama])
+        self.url = reverse('films:film_detail', args=[self.film.id])
+
+    def test_revalidation(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        # Связанная строка поменялась — страница тоже
+        self.drama.name = "трагедия"
+        self.drama.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "трагедия")
+
+        url = reverse('films:genre_detail', args=[self.drama.id])
+        etag = self.client.get(url)['ETag']
+        make_film("Второй", self.director, genres=[self.drama])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_per_user_and_missing(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(User.objects.create_superuser("admin"))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get(
+            reverse('films:person_detail', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_new_login_gets_fresh_page(self):
+        user = User.objects.create_user("viewer")
+        self.client.force_login(user)
+        # Первый ответ ставит CSRF-куку, с ней и считается ETag
+        self.client.get(self.url)
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # После выхода и входа токен формы выхода другой
+        self.client.logout()
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_person_page_changes_with_date(self):
+        url = reverse('films:person_detail', args=[self.director.id])
+        etag = self.client.get(url)['ETag']
+        tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        with mock.patch.object(timezone, 'localdate',
+                               return_value=tomorrow):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_pages_change_with_subtitle_badges(self):
+        urls = [reverse('films:country_detail', args=[self.film.country_id]),
+                reverse('films:genre_detail', args=[self.drama.id])]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        subtitle_set = SubtitleSet.objects.create(film=self.film,
+                                                  language='en')
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "Субтитры: 0 реплик")
+
+        # Удалённый набор тоже меняет страницу
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        subtitle_set.delete()
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+
+class SitemapTests(TestCase):
+    def setUp(self):
+        director = Person.objects.create(name="Режиссер")
+        self.films = [make_film(f"Фильм {i}", director) for i in range(5)]
+        patcher = mock.patch.object(sitemaps, 'SHARD_SIZE', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_index_lists_id_range_shards(self):
+        content = self.client.get(reverse('films:sitemap_index')) \
+            .content.decode()
+        shards = {film.id // 2 for film in self.films}
+        for shard in shards:
+            self.assertIn(f"http://testserver/sitemap-films-{shard}.xml",
+                          content)
+        self.assertIn("sitemap-people-", content)
+        self.assertIn("Sitemap: http://testserver/sitemap.xml",
+                      self.client.get('/robots.txt').content.decode())
+
+    def test_shard_is_streamed_then_cached(self):
+        film = self.films[0]
+        url = reverse('films:sitemap_shard', args=['films', film.id // 2])
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn(f"<loc>http://testserver/films/{film.id}/</loc>",
+                      content)
+        self.assertLessEqual(content.count("<url>"), 2)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content).decode(), content)
+
+        film.save()
+        self.assertTrue(self.client.get(url).streaming)
+        self.assertEqual(self.client.get(
+            reverse('films:sitemap_shard', args=['films', 999])).status_code,
+            404)
+
+
+class TemplateCacheTests(TestCase):
+    def test_cards_are_cached_per_version(self):
+        director = Person.objects.create(name="Режиссер")
+        film = make_film("Первое название", director)
+        response = self.client.get(reverse('films:film_list'))
+        self.assertContains(response, "Первое название")
+        self.assertContains(response, "Жанры")
+        # Кэшированная карточка не зависит от данных в обход save() ...
+        Film.objects.filter(id=film.id).update(name="Скрытое")
+        self.assertContains(self.client.get(reverse('films:film_list')),
+                            "Первое название")
+        # ... а save() меняет updated_at и с ним ключ фрагмента
+        film.name = "Второе название"
+        film.save()
+        self.assertContains(self.client.get(reverse('films:film_list')),
+                            "Второе название")
+
+
+class FilmographyTests(TestCase):
+    def setUp(self):
+        self.director = Person.objects.create(name="Режиссер")
+        self.actor = Person.objects.create(name="Актёр")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.old = make_film("Старый", self.director, year=1990,
+                                 people=[self.actor])
+            self.new = make_film("Новый", self.director, year=2010)
+
+    def test_kept_in_sync_by_signals(self):
+        filmography = PersonFilmography.objects.get(person=self.director)
+        self.assertEqual(filmography.directed_count, 2)
+        self.assertEqual((filmography.first_year, filmography.last_year),
+                         (1990, 2010))
+        self.assertEqual([f[1] for f in filmography.directed_films],
+                         ["Старый", "Новый"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.new.people.add(self.actor)
+            self.old.director = self.actor
+            self.old.save()
+        self.actor.filmography.refresh_from_db()
+        self.assertEqual(self.actor.filmography.acted_count, 2)
+        self.assertEqual(self.actor.filmography.directed_count, 1)
+        self.director.filmography.refresh_from_db()
+        self.assertEqual(self.director.filmography.directed_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.new.delete()
+        self.actor.filmography.refresh_from_db()
+        self.assertEqual(self.actor.filmography.acted_count, 1)
+
+    def test_detail_and_json_render_from_one_row(self):
+        # Плюс запрос валидатора для условного GET (films/conditional.py)
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('films:person_detail', args=[self.director.id]))
+        self.assertContains(response, "1990–2010")
+        data = self.client.get(reverse('films:person_filmography',
+                                       args=[self.director.id])).json()
+        self.assertEqual([f["name"] for f in data["directed_films"]],
+                         ["Старый", "Новый"])
+
+    def test_missing_row_is_built_on_demand(self):
+        PersonFilmography.objects.all().delete()
+        data = self.client.get(reverse('films:person_filmography',
+                                       args=[self.actor.id])).json()
+        self.assertEqual(data["acted_count"], 1)
+
+
+class StartupTests(TestCase):
+    WEB_PACKAGES = ('requests', 'dal', 'dal_select2', 'django_bootstrap5')
+
+    def test_batch_settings_skip_web_stack(self):
+        argv = ['import_vtt', '1', 'ru', 'missing.vtt']
+        lean, _ = profiling.import_times(argv, 'filmbase.settings_batch')
+        # Модули из importlib.import_module() в -X importtime не попадают,
+        # поэтому проверяется импорт из самой команды
+        self.assertIn('films.profiling', lean)
+        self.assertEqual(self.web_modules(lean), [])
+
+        full, _ = profiling.import_times(argv, 'filmbase.settings')
+        self.assertIn('django.contrib.admin.sites', self.web_modules(full))
+        self.assertNotIn('requests', full)
+        self.assertLess(len(lean), len(full))
+
+    def web_modules(self, modules):
+        return [name for name in modules
+                if name.split('.')[0] in self.WEB_PACKAGES
+                or name.startswith('django.contrib.admin')]
+
+
+class StaticDeliveryTests(TestCase):
+    def test_subtitles_are_gzipped_on_request(self):
+        seed(films=1, subtitle_sets=1, cues=200)
+        subtitle_set = SubtitleSet.objects.get()
+        url = reverse('films:get_subtitles', kwargs={
+            'film_id': subtitle_set.film_id,
+            'language_code': subtitle_set.language, 'format': 'vtt'})
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertLess(len(compressed.content), len(plain.content))
+
+    def test_collectstatic_precompresses_and_serves_with_cache_headers(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                self.settings(STATIC_ROOT=tmp):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            with open(os.path.join(tmp, 'staticfiles.json')) as f:
+                hashed = json.load(f)['paths']['films/js/subtitle_sync.js']
+            self.assertTrue(os.path.exists(os.path.join(tmp, hashed + '.gz')))
+
+            response = self.client.get('/static/' + hashed,
+                                       HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('immutable', response['Cache-Control'])
+            response.close()
+
+
+class SubtitleFormatTests(TestCase):
+    def setUp(self):
+        film = make_film("Дракон", Person.objects.create(name="Режиссер"),
+                         kinopoisk_id=5267432)
+        self.subtitle_set = SubtitleSet.objects.create(film=film,
+                                                       language="ru")
+        SubtitleLine.objects.bulk_create([
+            SubtitleLine(subtitle_set=self.subtitle_set, start_time=3.5,
+                         end_time=7.1, text="Это Олух.", name="РАССКАЗЧИК"),
+            SubtitleLine(subtitle_set=self.subtitle_set, start_time=3661.25,
+                         end_time=3662.0, text="ЗЕМЛЯ!",
+                         style_classes="loud"),
+        ])
+
+    def url(self, fmt):
+        return reverse('films:get_subtitles', kwargs={
+            'film_id': self.subtitle_set.film_id, 'language_code': 'ru',
+            'format': fmt})
+
+    def test_vtt_output_is_unchanged(self):
+        self.assertEqual(
+            self.subtitle_set.generate_vtt(),
+            "WEBVTT\n\n"
+            "00:00:03.500 --> 00:00:07.100\n"
+            "<c.speaker>РАССКАЗЧИК:</c> Это Олух.\n\n\n"
+            "01:01:01.250 --> 01:01:02.000\n"
+            "<c.loud>ЗЕМЛЯ!</c>\n\n")
+
+    def test_srt_and_json_by_extension(self):
+        srt = self.client.get(self.url('srt'))
+        self.assertEqual(srt['Content-Type'],
+                         'application/x-subrip; charset=utf-8')
+        self.assertEqual(srt.content.decode(),
+                         "1\n00:00:03,500 --> 00:00:07,100\n"
+                         "РАССКАЗЧИК: Это Олух.\n\n"
+                         "2\n01:01:01,250 --> 01:01:02,000\nЗЕМЛЯ!\n\n")
+        cues = self.client.get(self.url('json')).json()
+        self.assertEqual(cues[1], {"start": 3661.25, "end": 3662.0,
+                                   "text": "ЗЕМЛЯ!", "name": None,
+                                   "style": "loud"})
+        self.assertEqual(self.client.get(self.url('ass')).status_code, 404)
+
+    def test_cue_index_for_player(self):
+        SubtitleLine.objects.create(subtitle_set=self.subtitle_set,
+                                    start_time=10, end_time=11.5,
+                                    text="Это Олух.", name="РАССКАЗЧИК")
+        response = self.client.get(self.url('cues.json'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json(), {
+            "version": 1,
+            "start": [3500, 10000, 3661250],
+            "end": [7100, 11500, 3662000],
+            "text": [0, 0, 1],
+            "table": ["<c.speaker>РАССКАЗЧИК:</c> Это Олух.",
+                      "<c.loud>ЗЕМЛЯ!</c>"],
+        })
+
+    def test_dual_subtitles_aligned_and_cached(self):
+        english = SubtitleSet.objects.create(film=self.subtitle_set.film,
+                                             language="en")
+        SubtitleLine.objects.bulk_create([
+            SubtitleLine(subtitle_set=english, start_time=3.0, end_time=5.0,
+                         text="This is Hiccup."),
+            SubtitleLine(subtitle_set=english, start_time=5.0, end_time=7.0,
+                         text="Berk."),
+            SubtitleLine(subtitle_set=english, start_time=100.0,
+                         end_time=101.0, text="Dragon!"),
+        ])
+        url = reverse('films:get_dual_subtitles', kwargs={
+            'film_id': english.film_id, 'first': 'ru', 'second': 'EN'})
+        data = self.client.get(url).json()
+        self.assertEqual(data["languages"], ["ru", "en"])
+        self.assertEqual(data["cues"][0], {
+            "start": 3000, "end": 7100,
+            "first": ["<c.speaker>РАССКАЗЧИК:</c> Это Олух."],
+            "second": ["This is Hiccup.", "Berk."]})
+        self.assertEqual([(c["first"], c["second"]) for c in data["cues"][1:]],
+                         [([], ["Dragon!"]), (["<c.loud>ЗЕМЛЯ!</c>"], [])])
+
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        english.shift(5)
+        data = self.client.get(url).json()
+        self.assertEqual(data["cues"][1]["start"], 8000)
+        self.assertEqual(self.client.get(reverse(
+            'films:get_dual_subtitles', kwargs={
+                'film_id': english.film_id, 'first': 'ru',
+                'second': 'de'})).status_code, 404)
+
+    def test_manifest_and_badges_use_stored_stats(self):
+        call_command('import_vtt', 5267432, 'en',
+                     'films/data/subtitles/subtitles_1.vtt',
+                     stdout=io.StringIO())
+        english = SubtitleSet.objects.get(language='en')
+        response = self.client.get(reverse('films:subtitle_manifest',
+                                           args=[english.film_id]))
+        tracks = {track['language']: track for track in response.json()[
+            'tracks']}
+        self.assertEqual(set(tracks), {'en', 'ru'})
+        self.assertEqual(tracks['en']['cues'], 6)
+        self.assertEqual(tracks['en']['hash'], hashlib.sha256(
+            english.generate_vtt().encode()).hexdigest())
+        self.assertEqual(tracks['en']['formats']['vtt'],
+                         f"/films/{english.film_id}/subtitles/en.vtt")
+        # Набор из setUp создан в обход touch(): сводка пустая
+        self.assertEqual(tracks['ru']['cues'], 0)
+        self.assertEqual(self.client.get(reverse(
+            'films:subtitle_manifest', args=[999999])).status_code, 404)
+
+        film = english.film
+        badge = ('<span class="badge text-bg-secondary" '
+                 'title="Субтитры: 6 реплик">EN</span>')
+        # Карточки фильмов с бейджами на всех страницах-списках
+        for url in (reverse('films:film_list'),
+                    reverse('films:country_detail', args=[film.country_id]),
+                    reverse('films:genre_detail',
+                            args=[film.genres.create(name="драма").id])):
+            self.assertContains(self.client.get(url), badge, html=True)
+
+    def test_vtt_round_trips_through_import(self):
+        from .management.commands.import_vtt import Command
+        fd, path = tempfile.mkstemp(suffix='.vtt')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self.subtitle_set.generate_vtt())
+        try:
+            cues = Command().parse_vtt(path)
+        finally:
+            os.remove(path)
+        self.assertEqual([(c['start'], c['name'], c['style_classes'])
+                          for c in cues],
+                         [(3.5, 'РАССКАЗЧИК', None), (3661.25, None, 'loud')])
+
+
+class RetimeTests(TestCase):
+    def setUp(self):
+        film = make_film("Фильм", Person.objects.create(name="Режиссер"),
+                         kinopoisk_id=42)
+        self.subtitle_set = SubtitleSet.objects.create(film=film,
+                                                       language="ru")
+        SubtitleLine.objects.bulk_create([
+            SubtitleLine(subtitle_set=self.subtitle_set, start_time=start,
+                         end_time=start + 2, text=str(start))
+            for start in (1.0, 10.0, 50.0, 100.0)])
+
+    def times(self):
+        return [(round(a, 3), round(b, 3)) for a, b in
+                self.subtitle_set.lines.values_list('start_time', 'end_time')]
+
+    def test_shift_is_a_single_update_and_clamps_at_zero(self):
+        # UPDATE строк, затем сводка набора: чтение строк и UPDATE набора
+        with self.assertNumQueries(3):
+            self.assertEqual(self.subtitle_set.shift(-2), 4)
+        self.assertEqual(self.times()[:2], [(0.0, 1.0), (8.0, 10.0)])
+
+    def test_stretch(self):
+        self.subtitle_set.stretch(2, origin=1)
+        self.assertEqual(self.times(), [(1.0, 5.0), (19.0, 23.0),
+                                        (99.0, 103.0), (199.0, 203.0)])
+
+    def test_piecewise_resync(self):
+        # 0..10 без изменений, 10..50 растягивается до 10..90
+        self.subtitle_set.resync([(0, 0), (10, 10), (50, 90)])
+        self.assertEqual(self.times(), [(1.0, 3.0), (10.0, 14.0),
+                                        (90.0, 94.0), (190.0, 194.0)])
+        with self.assertRaises(ValueError):
+            self.subtitle_set.resync([(0, 10), (10, 5)])
+
+    def test_command_and_admin_action(self):
+        call_command('shift_subtitles', 42, 'ru', offset=1.5,
+                     stdout=io.StringIO())
+        self.assertEqual(self.times()[0], (2.5, 4.5))
+
+        self.client.force_login(
+            User.objects.create_superuser('admin', password='x'))
+        self.client.post(reverse('admin:films_subtitleset_changelist'), {
+            'action': 'resync_lines', 'anchors': '2.5=0, 12.5=10',
+            '_selected_action': [self.subtitle_set.pk]})
+        self.assertEqual(self.times()[:2], [(0.0, 2.0), (9.0, 11.0)])
+
+
+class BulkDeleteTests(TestCase):
+    def setUp(self):
+        self.director = Person.objects.create(name="Режиссер")
+        self.actor = Person.objects.create(name="Актёр")
+        self.country = Country.objects.create(name="Франция")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gone = make_film("Удаляемый", self.director, self.country,
+                                  people=[self.actor])
+            self.kept = make_film("Оставшийся", self.actor,
+                                  people=[self.director])
+        subtitle_set = SubtitleSet.objects.create(film=self.gone,
+                                                  language="ru")
+        SubtitleLine.objects.create(subtitle_set=subtitle_set, start_time=1,
+                                    end_time=2, text="Текст")
+        FilmRecommendation.objects.create(film=self.kept,
+                                          recommended=self.gone, score=1,
+                                          rank=1)
+        Film.objects.update(
+            recommendations_updated_at=self.kept.updated_at)
+        self.client.force_login(User.objects.create_superuser(
+            'admin', password='x'))
+
+    def test_country_delete_previews_and_cleans_up(self):
+        url = reverse('films:country_delete', args=[self.country.id])
+        response = self.client.get(url)
+        self.assertIn(("Строки субтитров", 1), response.context['preview'])
+        self.assertIn(("Фильмы", 1), response.context['preview'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+        self.assertFalse(Country.objects.filter(id=self.country.id).exists())
+        self.assertEqual(list(Film.objects.all()), [self.kept])
+        self.assertFalse(SubtitleLine.objects.exists())
+        self.assertFalse(FilmRecommendation.objects.exists())
+        self.kept.refresh_from_db()
+        self.assertIsNone(self.kept.recommendations_updated_at)
+        self.actor.filmography.refresh_from_db()
+        self.assertEqual(self.actor.filmography.acted_count, 0)
+
+    def test_person_delete_in_background_and_admin(self):
+        self.client.post(reverse('films:person_delete',
+                                 args=[self.director.id]),
+                         {'background': '1'})
+        self.assertTrue(Person.objects.filter(id=self.director.id).exists())
+        task = Task.objects.get(name='bulk_delete')
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.run(tasks.claim('test'))
+        self.assertEqual(list(Film.objects.all()), [self.kept])
+        self.assertFalse(self.kept.people.exists())
+        task.refresh_from_db()
+        self.assertIn("Фильмы: 1", task.message)
+
+        url = reverse('admin:films_person_delete', args=[self.actor.id])
+        self.assertContains(self.client.get(url), "Фильмы: 1")
+        self.client.post(url, {'post': 'yes'})
+        self.assertFalse(Film.objects.exists())
+
+
+@tasks.register(name='test_flaky', max_attempts=2, retry_delay=0)
+def flaky_task(task, fail):
+    task.set_progress(1, 2)
+    if fail:
+        raise RuntimeError("boom")
+
+
+class TaskQueueTests(TestCase):
+    def test_claim_run_and_retry(self):
+        ok = tasks.enqueue('test_flaky', fail=False)
+        bad = tasks.enqueue('test_flaky', fail=True)
+        for _ in range(3):
+            task = tasks.claim('test')
+            if task:
+                tasks.run(task)
+        ok.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual((ok.status, ok.progress, ok.total),
+                         (Task.DONE, 1, 2))
+        self.assertEqual((bad.status, bad.attempts), (Task.FAILED, 2))
+        self.assertIn("boom", bad.error)
+        self.assertIsNone(tasks.claim('test'))
+
+    def test_concurrency_limit(self):
+        tasks.enqueue('import_vtt', kinopoisk_id=1, language_code='ru',
+                      vtt_file='a.vtt')
+        tasks.enqueue('import_vtt', kinopoisk_id=2, language_code='ru',
+                      vtt_file='b.vtt')
+        self.assertIsNotNone(tasks.claim('one'))
+        self.assertIsNone(tasks.claim('two'))
+        # Выборка кандидатов и условный UPDATE, без отдельного COUNT
+        with self.assertNumQueries(2):
+            self.assertIsNone(tasks.claim('two'))
+
+    def test_heartbeat_keeps_long_task_alive(self):
+        task = tasks.enqueue('test_flaky', fail=False)
+        task = tasks.claim('test')
+        beats = []
+        with mock.patch.object(tasks, 'HEARTBEAT_INTERVAL', 0.01), \
+                mock.patch.object(tasks, 'beat', beats.append), \
+                mock.patch.object(tasks.REGISTRY['test_flaky'], 'func',
+                                  lambda task, **kwargs: time.sleep(0.1)):
+            self.assertTrue(tasks.run(task))
+        self.assertGreater(len(beats), 1)
+
+        stale = tasks.enqueue('test_flaky', fail=False)
+        stale = tasks.claim('test')
+        Task.objects.filter(pk=stale.pk).update(
+            updated_at=timezone.now() - datetime.timedelta(minutes=20))
+        tasks.beat(stale)
+        self.assertEqual(
+            tasks.requeue_stale(datetime.timedelta(minutes=10)), 0)
+
+    def test_worker_command_and_staff_page(self):
+        film = make_film("Фильм", Person.objects.create(name="Режиссер"),
+                         kinopoisk_id=5267432)
+        tasks.enqueue('import_vtt', kinopoisk_id=5267432, language_code='ru',
+                      vtt_file='films/data/subtitles/subtitles_1.vtt')
+        call_command('run_worker', burst=True, concurrency=1,
+                     stdout=io.StringIO())
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+        self.assertTrue(film.subtitle_sets.get(language='ru').lines.exists())
+
+        self.client.force_login(User.objects.create_user(
+            'staff', password='x', is_staff=True))
+        response = self.client.get(reverse('films:task_list'))
+        self.assertContains(response, 'import_vtt')
+
+
+class FakePoiskkino(BaseHTTPRequestHandler):
+    """Локальная замена api.poiskkino.dev для тестов синхронизации."""
+    movies = []
+    requests = []
+    # Минимальный PNG 1x1
+    image = bytes.fromhex(
+        "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+        "1f15c4890000000d49444154789c6360000002000005d0e5b5d70000"
+        "000049454e44ae426082")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.requests.append((url.path, parse_qs(url.query)))
+        if url.path.startswith("/images/"):
+            body, content_type = self.image, "image/png"
+        elif url.path == "/v1.4/movie":
+            body = json.dumps({"docs": self.movies, "total": len(self.movies),
+                               "pages": 1}).encode()
+            content_type = "application/json"
+        else:
+            body = json.dumps({"docs": [], "pages": 1}).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DeltaSyncTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakePoiskkino)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = self.settings(POISKKINO_API_URL=self.base_url,
+                                 FILMS_JSON_PATH=os.path.join(tmp.name, "f.json"),
+                                 MEDIA_ROOT=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        FakePoiskkino.requests = []
+        FakePoiskkino.movies = [self.movie(1, "Первый"),
+                                self.movie(2, "Второй")]
+
+    def movie(self, kp_id, name, role="Герой"):
+        return {
+            "id": kp_id, "name": name, "enName": None, "year": 2000,
+            "description": "", "movieLength": 100, "slogan": "",
+            "countries": [{"name": "США"}], "genres": [{"name": "драма"}],
+            "poster": {"url": f"{self.base_url}/images/{kp_id}.png"},
+            "videos": {"trailers": []},
+            "persons": [
+                {"id": 100 + kp_id, "name": f"Режиссер {kp_id}",
+                 "enName": None, "profession": "режиссеры"},
+                {"id": 500, "name": "Актёр", "enName": None,
+                 "profession": "актеры", "description": role,
+                 "photo": f"{self.base_url}/images/p500.png"},
+            ],
+        }
+
+    def sync(self):
+        FakePoiskkino.requests = []
+        call_command('get_films', delta=True, stdout=io.StringIO())
+        out = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('import_films', delta=True, stdout=out)
+        images = [path for path, _ in FakePoiskkino.requests
+                  if path.startswith("/images/")]
+        return out.getvalue(), images
+
+    def test_only_changed_records_are_written(self):
+        summary, images = self.sync()
+        self.assertIn("film: 2 added, 0 changed, 0 unchanged", summary)
+        self.assertIn("person: 3 added", summary)
+        self.assertEqual(sorted(images),
+                         ["/images/1.png", "/images/2.png", "/images/p500.png"])
+        self.assertEqual(Film.objects.count(), 2)
+
+        # Повторная синхронизация: API отдаёт только изменённое
+        FakePoiskkino.movies = [self.movie(2, "Второй (режиссёрская версия)")]
+        summary, images = self.sync()
+        movie_query = dict(FakePoiskkino.requests)["/v1.4/movie"]
+        self.assertIn("updatedAt", movie_query)
+        self.assertIn("film: 0 added, 1 changed, 1 unchanged", summary)
+        self.assertIn("person: 0 added, 0 changed, 2 unchanged", summary)
+        self.assertEqual(images, [])
+        self.assertTrue(Film.objects.filter(
+            name="Второй (режиссёрская версия)").exists())
+        self.assertEqual(Film.objects.get(kinopoisk_id=2).people.count(), 1)
+
+    def test_recurring_actor_with_other_role_is_unchanged(self):
+        FakePoiskkino.movies = [self.movie(1, "Первый", role="Герой"),
+                                self.movie(2, "Второй", role="Злодей")]
+        self.sync()
+        FakePoiskkino.movies = [self.movie(1, "Первый (новая версия)",
+                                           role="Герой")]
+        summary, _ = self.sync()
+        self.assertIn("person: 0 added, 0 changed, 2 unchanged", summary)
+
+    def test_import_stats(self):
+        call_command('get_films', stdout=io.StringIO())
+        err = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp, \
+                contextlib.redirect_stdout(io.StringIO()):
+            profile = os.path.join(tmp, "import.prof")
+            call_command('import_films', profile=profile,
+                         stdout=io.StringIO(), stderr=err)
+            self.assertTrue(os.path.getsize(profile))
+        report = err.getvalue()
+        for stage in ("http", "image save", "db", "load json", "total"):
+            self.assertIn(stage, report)
+        # два постера и фото актёра из каждого фильма
+        self.assertIn(f"downloaded: {4 * len(FakePoiskkino.image)} B",
+                      report)
+        self.assertIn("peak RSS", report)
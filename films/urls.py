@@ -1,5 +1,8 @@
-from django.urls import path
-from . import views
+from django.urls import path, register_converter
+from . import converters, views
+
+register_converter(converters.LanguageCodeConverter, 'lang')
+register_converter(converters.SubtitleFormatConverter, 'subformat')
 
 app_name = "films"
 urlpatterns = [
@@ -31,7 +34,10 @@ urlpatterns = [
          views.film_delete, name='film_delete'),
 
     path('people/', views.person_list, name='person_list'),
+    path('today/', views.today, name='today'),
     path('people/<int:id>/', views.person_detail, name='person_detail'),
+    path('people/<int:id>/filmography.json',
+         views.person_filmography, name='person_filmography'),
     path('people/create/', views.person_create, name='person_create'),
     path('people/<int:id>/update/',
          views.person_update, name='person_update'),
@@ -40,8 +46,20 @@ urlpatterns = [
     path('people/autocomplete/',
          views.PersonAutocomplete.as_view(), name='person_autocomplete'),
     path(
-        'films/<int:film_id>/subtitles/<str:language_code>.vtt',
+        'films/<int:film_id>/subtitles/<lang:language_code>.<subformat:format>',
         views.get_subtitles,
         name='get_subtitles'
     ),
+    path('films/<int:film_id>/subtitles.json', views.subtitle_manifest,
+         name='subtitle_manifest'),
+    path('films/<int:film_id>/subtitles/<lang:first>+<lang:second>.json',
+         views.get_dual_subtitles, name='get_dual_subtitles'),
+    path('api/films/', views.film_batch, name='film_batch'),
+    path('robots.txt', views.robots_txt, name='robots_txt'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    path('sitemap-<str:section>-<int:shard>.xml', views.sitemap_shard,
+         name='sitemap_shard'),
+    path('tasks/', views.task_list, name='task_list'),
+    path('export/<str:model>.<str:fmt>', views.export_model,
+         name='export_model'),
 ]
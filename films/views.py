@@ -1,27 +1,86 @@
+import gzip
+
 from dal import autocomplete
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import user_passes_test
-from .models import Country, Film, Genre, Person, SubtitleSet
-from .forms import CountryForm, GenreForm, FilmForm, PersonForm
-from .helpers import paginate
+from .models import (Country, Film, FilmRecommendation, Genre, Person,
+                     PersonFilmography, SubtitleSet, Task)
+from .forms import (AUTOCOMPLETE_MIN_LENGTH, CountryForm, GenreForm,
+                    FilmForm, PersonForm)
+from .helpers import add_subtitle_languages, paginate
+from . import anniversaries, facets, sitemaps
+from .api import APIError, FilmBatch, parse_fields, parse_ids
+from .conditional import (conditional_page, country_stamp, film_stamp,
+                          genre_stamp, person_stamp)
+from .deletion import bulk_delete, label as deletion_label, \
+    preview as delete_preview
+from .export import CONTENT_TYPES, EXPORT_MODELS, export
+from .filmography import refresh_filmographies
+from .ratelimit import rate_limited
+from .subtitles import SERIALIZERS, cached_pair, serialize, \
+    content_type as subtitle_content_type
+from .tasks import enqueue
 from django.contrib import messages
-from django.http import HttpResponse, Http404
+from django.db.models import Q
+from django.http import (HttpResponse, Http404, JsonResponse,
+                         StreamingHttpResponse)
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
 
 
 def check_admin(user):
     return user.is_superuser
 
 
+def check_staff(user):
+    return user.is_staff
+
+
+def has_query(request):
+    return bool(request.GET.get('query'))
+
+
+def has_autocomplete_term(request):
+    return len(request.GET.get('q', '').strip()) >= AUTOCOMPLETE_MIN_LENGTH
+
+
+def delete_with_dependents(request, obj, template, context, message,
+                           success_url):
+    """
+    Подтверждение удаления с числом затрагиваемых строк. Удаление идёт
+    набором DELETE (deletion.py), по флажку «в фоне» — через очередь задач.
+    """
+    model = obj._meta.model_name
+    if request.method == 'POST':
+        if request.POST.get('background'):
+            enqueue('bulk_delete', model=model, ids=[obj.pk])
+            messages.success(request, f'{message}: удаление в очереди')
+        else:
+            bulk_delete(type(obj), [obj.pk])
+            messages.success(request, message)
+        return redirect(success_url)
+    context['preview'] = [
+        (deletion_label(m), count)
+        for m, count in delete_preview(type(obj), [obj.pk])
+        if count and m is not type(obj)]
+    return render(request, template, context)
+
+
 def country_list(request):
     countries = Country.objects.all()
     return render(request, 'films/country/list.html', {'countries': countries})
 
 
+@conditional_page(country_stamp)
 def country_detail(request, id):
     country = get_object_or_404(Country, id=id)
     films = Film.objects.filter(country=country)
 
-    films = paginate(request, films)
+    films = add_subtitle_languages(paginate(request, films))
     return render(request, 'films/country/detail.html',
                   {'country': country, 'films': films})
 
@@ -57,12 +116,10 @@ def country_update(request, id):
 @user_passes_test(check_admin)
 def country_delete(request, id):
     country = get_object_or_404(Country, id=id)
-    if request.method == 'POST':
-        country.delete()
-        messages.success(request, 'Страна удалена')
-        return redirect('films:country_list')
-    return render(request, 'films/country/delete.html',
-                  {'country': country})
+    return delete_with_dependents(request, country,
+                                  'films/country/delete.html',
+                                  {'country': country}, 'Страна удалена',
+                                  'films:country_list')
 
 
 def genre_list(request):
@@ -70,11 +127,12 @@ def genre_list(request):
     return render(request, 'films/genre/list.html', {'genres': genres})
 
 
+@conditional_page(genre_stamp)
 def genre_detail(request, id):
     genre = get_object_or_404(Genre, id=id)
     films = Film.objects.filter(genres=genre)
 
-    films = paginate(request, films)
+    films = add_subtitle_languages(paginate(request, films))
     return render(request, 'films/genre/detail.html',
                   {'genre': genre, 'films': films})
 
@@ -118,22 +176,52 @@ def genre_delete(request, id):
                   {'genre': genre})
 
 
+@rate_limited('search', when=has_query)
 def film_list(request):
-    films = Film.objects.all()
     query = request.GET.get('query', '')
-    if query:
-        films = films.filter(name__icontains=query)
-    films = paginate(request, films)
-    return render(request, 'films/film/list.html', {'films': films,
-                                                    'query': query})
+    selection = facets.parse_selection(request.GET)
+    result = facets.search(selection, query)
+    films = add_subtitle_languages(paginate(request, result.films))
+    params = request.GET.copy()
+    params.pop('page', None)
+    return render(request, 'films/film/list.html',
+                  {'films': films, 'query': query, 'facets': result,
+                   'selection': selection, 'querystring': params.urlencode()})
 
 
+@conditional_page(film_stamp)
 def film_detail(request, id):
     queryset = Film.objects.prefetch_related("country", "genres", "director",
                                              "people")
     film = get_object_or_404(queryset, id=id)
+    recommendations = FilmRecommendation.objects.filter(film=film) \
+        .select_related("recommended").order_by("rank")
     return render(request, 'films/film/detail.html',
-                  {'film': film})
+                  {'film': film, 'recommendations': recommendations})
+
+
+@require_safe
+def film_batch(request):
+    """
+    JSON по списку фильмов: /api/films/?ids=1,2,3&fields=name,year,genres
+    Запросов к базе — не больше трёх при любом числе id. Клиент может
+    перепроверить ответ по ETag (If-None-Match) и получить 304.
+    """
+    try:
+        batch = FilmBatch(parse_ids(request.GET.get('ids', '')),
+                          parse_fields(request.GET.get('fields', '')))
+    except APIError as e:
+        return JsonResponse({'error': str(e)}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+    etag = quote_etag(batch.etag)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        response = JsonResponse(batch.as_dict(),
+                                json_dumps_params={'ensure_ascii': False})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
 
 
 @user_passes_test(check_admin)
@@ -142,6 +230,8 @@ def film_create(request):
         form = FilmForm(request.POST, request.FILES)
         if form.is_valid():
             film = form.save()
+            if 'cover' in form.changed_data and film.cover:
+                enqueue('process_cover', film_id=film.id)
             messages.success(request, 'Фильм добавлен')
             return redirect('films:film_detail', id=film.id)
     else:
@@ -156,6 +246,8 @@ def film_update(request, id):
         form = FilmForm(request.POST, request.FILES, instance=film)
         if form.is_valid():
             form.save()
+            if 'cover' in form.changed_data and film.cover:
+                enqueue('process_cover', film_id=film.id)
             messages.success(request, 'Фильм изменён')
             return redirect('films:film_detail', id=film.id)
     else:
@@ -167,14 +259,19 @@ def film_update(request, id):
 @user_passes_test(check_admin)
 def film_delete(request, id):
     film = get_object_or_404(Film, id=id)
-    if request.method == 'POST':
-        film.delete()
-        messages.success(request, 'Фильм удалён')
-        return redirect('films:film_list')
-    return render(request, 'films/film/delete.html',
-                  {'film': film})
+    return delete_with_dependents(request, film, 'films/film/delete.html',
+                                  {'film': film}, 'Фильм удалён',
+                                  'films:film_list')
 
 
+def today(request):
+    """Родившиеся сегодня и юбилеи фильмов (подборка кэшируется на день)."""
+    selection = anniversaries.today()
+    add_subtitle_languages(selection['films'])
+    return render(request, 'films/today.html', selection)
+
+
+@rate_limited('search', when=has_query)
 def person_list(request):
     people = Person.objects.all()
     query = request.GET.get('query', '')
@@ -185,11 +282,46 @@ def person_list(request):
                                                       'query': query})
 
 
-def person_detail(request, id):
-    queryset = Person.objects.prefetch_related("film_set", "directed_films")
+def get_person_with_filmography(id):
+    """Персона вместе с фильмографией одним запросом."""
+    queryset = Person.objects.select_related("filmography")
     person = get_object_or_404(queryset, id=id)
+    try:
+        person.filmography
+    except PersonFilmography.DoesNotExist:
+        # Персоны, созданные в обход сигналов (bulk_create)
+        refresh_filmographies([person.id])
+        person = queryset.get(id=id)
+    return person
+
+
+@conditional_page(person_stamp)
+def person_detail(request, id):
+    person = get_person_with_filmography(id)
     return render(request, 'films/person/detail.html',
-                  {'person': person})
+                  {'person': person, 'filmography': person.filmography})
+
+
+def person_filmography(request, id):
+    person = get_person_with_filmography(id)
+    filmography = person.filmography
+
+    def films(rows):
+        return [{'id': film_id, 'name': name, 'year': year}
+                for film_id, name, year in rows]
+
+    return JsonResponse({
+        'id': person.id,
+        'name': person.name,
+        'birthday': person.birthday,
+        'age': person.age(),
+        'acted_count': filmography.acted_count,
+        'directed_count': filmography.directed_count,
+        'first_year': filmography.first_year,
+        'last_year': filmography.last_year,
+        'acted_films': films(filmography.acted_films),
+        'directed_films': films(filmography.directed_films),
+    }, json_dumps_params={'ensure_ascii': False})
 
 
 @user_passes_test(check_admin)
@@ -223,34 +355,39 @@ def person_update(request, id):
 @user_passes_test(check_admin)
 def person_delete(request, id):
     person = get_object_or_404(Person, id=id)
-    if request.method == 'POST':
-        person.delete()
-        messages.success(request, 'Персона удалена')
-        return redirect('films:person_list')
-    return render(request, 'films/person/delete.html',
-                  {'person': person})
+    return delete_with_dependents(request, person,
+                                  'films/person/delete.html',
+                                  {'person': person}, 'Персона удалена',
+                                  'films:person_list')
 
 
+@method_decorator(rate_limited('autocomplete', when=has_autocomplete_term),
+                  name='dispatch')
 class PersonAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
-        people = Person.objects.all()
-        if self.q:
-            people = people.filter(name__istartswith=self.q)
-        return people
+        if len(self.q.strip()) < AUTOCOMPLETE_MIN_LENGTH:
+            return Person.objects.none()
+        return Person.objects.filter(name__istartswith=self.q.strip())
 
 
+@method_decorator(rate_limited('autocomplete', when=has_autocomplete_term),
+                  name='dispatch')
 class CountryAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
-        countries = Country.objects.all()
-        if self.q:
-            countries = countries.filter(name__istartswith=self.q)
-        return countries
+        if len(self.q.strip()) < AUTOCOMPLETE_MIN_LENGTH:
+            return Country.objects.none()
+        return Country.objects.filter(name__istartswith=self.q.strip())
 
-def get_subtitles(request, film_id, language_code):
+
+@gzip_page
+def get_subtitles(request, film_id, language_code, format='vtt'):
     """
-    Отдает WebVTT файл по запросу клиента.
+    Отдает субтитры в формате по расширению: vtt, srt или json (сжатые
+    gzip, если клиент его принимает).
     URL: /films/123/subtitles/ru.vtt
     """
+    if format not in SERIALIZERS:
+        raise Http404("Неизвестный формат субтитров.")
     try:
         subtitle_set = SubtitleSet.objects.get(
             film_id=film_id,
@@ -259,7 +396,127 @@ def get_subtitles(request, film_id, language_code):
     except SubtitleSet.DoesNotExist:
         raise Http404("Набор субтитров не найден для указанного фильма и языка.")
 
-    vtt_content = subtitle_set.generate_vtt()
+    return HttpResponse(serialize(subtitle_set, format),
+                        content_type=subtitle_content_type(format))
+
+
+@require_safe
+def subtitle_manifest(request, film_id):
+    """
+    Доступные дорожки субтитров фильма: язык, число реплик, длительность,
+    хеш содержимого (sha256 VTT) и ссылки на все форматы.
+    URL: /films/123/subtitles.json
+    """
+    tracks = []
+    for language, cue_count, duration, content_hash in SubtitleSet.objects \
+            .filter(film_id=film_id).order_by('language') \
+            .values_list('language', 'cue_count', 'duration',
+                         'content_hash'):
+        tracks.append({
+            'language': language,
+            'cues': cue_count,
+            'duration': duration,
+            'hash': content_hash,
+            'formats': {fmt: reverse('films:get_subtitles', kwargs={
+                'film_id': film_id, 'language_code': language,
+                'format': fmt}) for fmt in SERIALIZERS},
+        })
+    if not tracks and not Film.objects.filter(id=film_id).exists():
+        raise Http404("Фильм не найден.")
+    return JsonResponse({'film': film_id, 'tracks': tracks},
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@gzip_page
+def get_dual_subtitles(request, film_id, first, second):
+    """
+    Две дорожки, выровненные по времени, для изучающих язык.
+    URL: /films/123/subtitles/ru+en.json
+    Ответ кэшируется до изменения любого из наборов (см. cached_pair).
+    """
+    sets = {subtitle_set.language.lower(): subtitle_set
+            for subtitle_set in SubtitleSet.objects.filter(
+                Q(language__iexact=first) | Q(language__iexact=second),
+                film_id=film_id)}
+    try:
+        pair = sets[first.lower()], sets[second.lower()]
+    except KeyError:
+        raise Http404("Набор субтитров не найден для указанного фильма и языка.")
+    return HttpResponse(cached_pair(*pair), content_type='application/json')
+
 
-    response = HttpResponse(vtt_content, content_type='text/vtt')
-    return response
\ No newline at end of file
+@user_passes_test(check_staff)
+def export_model(request, model, fmt):
+    """
+    Потоковая выгрузка таблицы целиком (только для персонала).
+    URL: /export/film.csv
+    """
+    if model not in EXPORT_MODELS or fmt not in CONTENT_TYPES:
+        raise Http404("Неизвестная модель или формат выгрузки.")
+    response = StreamingHttpResponse(export(model, fmt),
+                                     content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = \
+        f'attachment; filename="{model}.{fmt}"'
+    return response
+
+
+@require_safe
+def robots_txt(request):
+    sitemap = request.build_absolute_uri(reverse('films:sitemap_index'))
+    lines = [
+        "User-agent: *",
+        "Disallow: /admin/",
+        # Постраничные списки роботу не нужны: все адреса есть в карте
+        "Disallow: /*page=",
+        f"Sitemap: {sitemap}",
+    ]
+    return HttpResponse("\n".join(lines) + "\n",
+                        content_type='text/plain; charset=utf-8')
+
+
+@require_safe
+def sitemap_index(request):
+    return HttpResponse(sitemaps.render_index(request),
+                        content_type=sitemaps.CONTENT_TYPE)
+
+
+@require_safe
+def sitemap_shard(request, section, shard):
+    """
+    Шард карты сайта. Готовый шард берётся из кэша (сжатым, если клиент
+    принимает gzip), иначе строится потоком и по ходу кэшируется.
+    """
+    if section not in sitemaps.SECTIONS:
+        raise Http404("Неизвестный раздел карты сайта.")
+    stamp = sitemaps.shard_stamp(section, shard)
+    if not stamp['count']:
+        raise Http404("Пустой шард карты сайта.")
+    prefix, suffix = sitemaps.url_parts(request, section)
+    key = sitemaps.cache_key(section, shard, prefix, stamp)
+    blob = sitemaps.cached_shard(key)
+    if blob is None:
+        response = StreamingHttpResponse(
+            sitemaps.stream_to_cache(sitemaps.render_shard(
+                section, shard, prefix, suffix), key),
+            content_type=sitemaps.CONTENT_TYPE)
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(blob, content_type=sitemaps.CONTENT_TYPE)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(blob),
+                                content_type=sitemaps.CONTENT_TYPE)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    response['Last-Modified'] = http_date(stamp['lastmod'].timestamp())
+    return response
+
+
+@user_passes_test(check_staff)
+def task_list(request):
+    tasks = Task.objects.all()
+    status = request.GET.get('status', '')
+    if status:
+        tasks = tasks.filter(status=status)
+    tasks = paginate(request, tasks, per=50)
+    return render(request, 'films/task/list.html',
+                  {'tasks': tasks, 'status': status,
+                   'statuses': Task.STATUSES})
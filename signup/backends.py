@@ -0,0 +1,48 @@
+"""
+Бэкенд аутентификации с кэшем пользователя.
+
+AuthenticationMiddleware на каждом запросе вошедшего пользователя читает
+строку auth_user (ModelBackend.get_user). Если AUTH_USER_CACHE указывает
+алиас кэша, пользователь берётся оттуда по id; запись сбрасывается при
+сохранении и удалении пользователя (см. signup/signals.py).
+
+Сброс виден всем процессам, только если этот кэш у них общий (Redis,
+Memcached). Правки в обход save() (update(), другая база) видны лишь по
+истечении USER_TIMEOUT. Без AUTH_USER_CACHE пользователь читается из
+базы, как в ModelBackend, и кэшируется только на время запроса.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+# Страховка на случай правок в обход save()
+USER_TIMEOUT = 60
+
+
+def cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def user_cache():
+    alias = getattr(settings, 'AUTH_USER_CACHE', None)
+    return caches[alias] if alias else None
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        cache = user_cache()
+        if cache is None:
+            return super().get_user(user_id)
+        key = cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, USER_TIMEOUT)
+        return user
+
+
+def invalidate_user(user_id):
+    cache = user_cache()
+    if cache is not None:
+        cache.delete(cache_key(user_id))
@@ -0,0 +1,15 @@
+"""
+Сброс закэшированного пользователя (backends.CachedModelBackend).
+Подключаются в SignupConfig.ready().
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import invalidate_user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
@@ -1,3 +1,68 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+class SignupTests(TestCase):
+    def test_signup_hashes_password_once(self):
+        with mock.patch.object(PBKDF2PasswordHasher, 'encode',
+                               autospec=True,
+                               side_effect=PBKDF2PasswordHasher.encode) \
+                as encode:
+            response = self.client.post(reverse('signup:signup'), {
+                'username': 'newbie', 'password1': 'Sup3r-secret-pass',
+                'password2': 'Sup3r-secret-pass'})
+        self.assertRedirects(response, reverse('films:home'))
+        self.assertEqual(encode.call_count, 1)
+        user = User.objects.get(username='newbie')
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        # В тестах один процесс, и locmem для него общий
+        self.enterContext(override_settings(
+            AUTH_USER_CACHE='default', SESSION_CACHE_ALIAS='default',
+            SESSION_ENGINE='django.contrib.sessions.backends.cached_db'))
+        self.user = User.objects.create_user('viewer')
+        self.client.force_login(self.user)
+        self.url = reverse('films:genre_list')
+
+    def test_user_and_session_come_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):  # список жанров
+            response = self.client.get(self.url)
+        self.assertContains(response, 'viewer')
+
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertContains(self.client.get(self.url), 'renamed')
+
+        self.client.post(reverse('logout'))
+        self.assertNotContains(self.client.get(self.url), 'renamed')
+
+
+class UncachedUserTests(TestCase):
+    def test_update_bypassing_save_is_seen_on_next_request(self):
+        user = User.objects.create_user('viewer', password='old-pass')
+        self.client.force_login(user)
+        url = reverse('films:genre_list')
+        self.assertContains(self.client.get(url), 'viewer')
+        # Без AUTH_USER_CACHE пользователь читается заново: новый хеш
+        # пароля не совпадает с сохранённым в сессии — сессия сброшена
+        user.set_password('new-pass')
+        User.objects.filter(pk=user.pk).update(password=user.password)
+        self.assertNotContains(self.client.get(url), 'viewer')
+
+    def test_logout_elsewhere_ends_session(self):
+        self.client.force_login(User.objects.create_user('viewer'))
+        url = reverse('films:genre_list')
+        self.assertContains(self.client.get(url), 'viewer')
+        # Выход в другом процессе удаляет строку сессии; без
+        # SESSION_CACHE_ALIAS сессия не держится в кэше этого процесса
+        Session.objects.all().delete()
+        self.assertNotContains(self.client.get(url), 'viewer')